@@ -1,7 +1,11 @@
-from django.test import TestCase, RequestFactory
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.urls import reverse
 
-from blog.models import Post
+from blog.models import Category, Post
 from authentication.models import Profile
 from authentication.forms import ProfileForm, UserForm
 from services.authentication_services import (
@@ -15,6 +19,7 @@ from services.authentication_services import (
     check_user_subscription,
     filter_user_posts,
 )
+from subscriptions.models import Subscription
 
 
 class AuthenticationServicesTestCase(TestCase):
@@ -85,7 +90,7 @@ class AuthenticationServicesTestCase(TestCase):
         post3 = Post.objects.create(author=self.user, title="Post 3", body="Content 3")
 
         user_posts = get_user_posts(self.user)
-        filtered_posts = filter_user_posts(user_posts, self.user, [])
+        filtered_posts = filter_user_posts(user_posts, self.user)
 
         self.assertIn(post1, filtered_posts)
         self.assertIn(post2, filtered_posts)
@@ -100,6 +105,63 @@ class AuthenticationServicesTestCase(TestCase):
         )
 
         other_user_posts = get_user_posts(other_user)
-        filtered_other_user_posts = filter_user_posts(other_user_posts, self.user, [])
+        filtered_other_user_posts = filter_user_posts(other_user_posts, self.user)
 
         self.assertNotIn(other_post, filtered_other_user_posts)
+
+
+@override_settings(COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False)
+class ProfilePageCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="password")
+        Profile.objects.create(user=self.author)
+        self.subscriber = User.objects.create_user(
+            username="subscriber", password="password"
+        )
+        self.reader = User.objects.create_user(username="reader", password="password")
+        Subscription.objects.create(subscriber=self.subscriber, author=self.author)
+        Post.objects.create(author=self.author, title="Public post", body="Body")
+        Post.objects.create(
+            author=self.author, title="Private post", body="Body", for_subscribers=True
+        )
+        self.url = reverse("user_profile", args=[self.author.username])
+
+    def get_as(self, user):
+        self.client.force_login(user)
+        return self.client.get(self.url)
+
+    def test_subscriber_posts_are_not_shown_to_other_viewers(self):
+        self.assertContains(self.get_as(self.subscriber), "Private post")
+        response = self.get_as(self.reader)
+        self.assertNotContains(response, "Private post")
+        self.assertContains(response, "Public post")
+        self.assertFalse(response.context["is_subscribed"])
+
+    def test_posts_fragment_is_shared_within_viewer_class(self):
+        self.get_as(self.reader)
+        other = User.objects.create_user(username="other", password="password")
+        self.client.force_login(other)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertContains(response, "Public post")
+        self.assertFalse(
+            any('FROM "blog_post"' in query["sql"] for query in ctx.captured_queries)
+        )
+
+    def test_new_post_invalidates_posts_fragment(self):
+        self.get_as(self.reader)
+        Post.objects.create(author=self.author, title="Fresh post", body="Body")
+        self.assertContains(self.get_as(self.reader), "Fresh post")
+
+    def test_category_change_invalidates_posts_fragment(self):
+        post = Post.objects.get(title="Public post")
+        old = Category.objects.create(name="Старая", description="")
+        new = Category.objects.create(name="Новая", description="")
+        post.categories.add(old)
+        self.assertContains(self.get_as(self.reader), "Старая*")
+
+        post.categories.set([new])
+        response = self.get_as(self.reader)
+        self.assertContains(response, "Новая*")
+        self.assertNotContains(response, "Старая*")
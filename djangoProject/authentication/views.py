@@ -4,7 +4,6 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 from django.views.generic import ListView
-from django.views.decorators.cache import cache_page
 
 from authentication.models import Profile
 from services.authentication_services import (
@@ -15,10 +14,10 @@ from services.authentication_services import (
     create_user,
     get_user_by_username,
     get_user_posts,
-    get_user_subscriptions,
-    check_user_subscription,
     get_profile_form,
 )
+from services.cache_tags import CATEGORIES_TAG, author_tag, get_tags_version
+from services.page_cache import SUBSCRIBER_VIEWER, get_viewer_class
 from .forms import ProfileForm, UserForm
 
 
@@ -93,26 +92,22 @@ def edit_profile(request, user_name):
     return render(request, "profile/edit_profile.html", {"form": form})
 
 
-@cache_page(60 * 15)
 @login_required
 def user_profile_view(request, user_name):
     user = get_user_by_username(user_name)
-    user_posts = get_user_posts(user)
-    is_subscribed = False
+    user_posts = filter_user_posts(get_user_posts(user), request.user)
+    viewer_class = get_viewer_class(request.user, user)
     subscriber_count = user.subscribers.count()
 
-    if request.user.is_authenticated:
-        subscribed_authors = get_user_subscriptions(request.user)
-        user_posts = filter_user_posts(user_posts, request.user, subscribed_authors)
-        is_subscribed = check_user_subscription(request.user, user)
-
     return render(
         request,
         "profile/profile.html",
         {
             "user": user,
             "user_posts": user_posts,
-            "is_subscribed": is_subscribed,
+            "viewer_class": viewer_class,
+            "posts_version": get_tags_version([author_tag(user.pk), CATEGORIES_TAG]),
+            "is_subscribed": viewer_class == SUBSCRIBER_VIEWER,
             "subscriber_count": subscriber_count,
         },
     )
@@ -1,10 +1,18 @@
 from django.contrib import admin
-from .models import Category, Favorite, Like, Post, Comment
+from .models import Category, Favorite, Like, Post, Comment, TimelineEntry
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ("title", "author", "publish_date")
+    list_display = (
+        "title",
+        "author",
+        "publish_date",
+        "like_count",
+        "comment_count",
+        "favorite_count",
+        "view_count",
+    )
     list_filter = ("author", "publish_date", "categories")
     search_fields = ("title", "body")
     ordering = ("-publish_date",)
@@ -37,6 +45,13 @@ class FavoriteAdmin(admin.ModelAdmin):
     search_fields = ("user__username", "post__title")
 
 
+@admin.register(TimelineEntry)
+class TimelineEntryAdmin(admin.ModelAdmin):
+    list_display = ("user", "post", "publish_date")
+    search_fields = ("user__username", "post__title")
+    raw_id_fields = ("user", "post")
+
+
 admin.site.site_header = "Управление блогом"
 admin.site.site_title = "Администрирование"
 admin.site.index_title = "Главная страница административной панели"
@@ -1,15 +1,20 @@
-from notifications.models import Notification
+from services.cache_tags import CATEGORIES_TAG, get_or_set_tagged
+from services.notifications_services import get_unread_count
 from .models import Category
 
+CATEGORIES_CACHE_KEY = "context:categories"
+
 
 def notifications_count(request):
     if request.user.is_authenticated:
-        count = Notification.objects.filter(user=request.user, viewed=False).count()
+        count = get_unread_count(request.user.pk)
     else:
         count = 0
     return {"notifications_count": count}
 
 
 def categories(request):
-    categories = Category.objects.all()
+    categories = get_or_set_tagged(
+        CATEGORIES_CACHE_KEY, [CATEGORIES_TAG], lambda: list(Category.objects.all())
+    )
     return {"categories": categories}
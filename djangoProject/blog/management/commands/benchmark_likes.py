@@ -0,0 +1,61 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.models import Post
+from services.blog_services import toggle_post_like
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время переключения лайка на посте с большим числом лайков "
+        "для проверки через post.likes.all() и через промежуточную таблицу. "
+        "Тестовые данные создаются в транзакции и откатываются после замера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--likes", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        likes = options["likes"]
+        repeat = options["repeat"]
+
+        with transaction.atomic():
+            post, clicker = self._seed(likes)
+
+            materialized_ms = self._measure(lambda: clicker in post.likes.all(), repeat)
+            toggle_ms = self._measure(
+                lambda: toggle_post_like(post.pk, clicker), repeat
+            )
+            self.stdout.write(f"Лайков у поста: {likes}")
+            self.stdout.write(f"user in post.likes.all(), мс: {materialized_ms:.2f}")
+            self.stdout.write(f"toggle_post_like, мс: {toggle_ms:.2f}")
+
+            transaction.set_rollback(True)
+
+    def _seed(self, likes):
+        author = User.objects.create_user(username="benchmark_likes_author")
+        clicker = User.objects.create_user(username="benchmark_likes_clicker")
+        post = Post.objects.create(title="Пост", body="Текст", author=author)
+        users = User.objects.bulk_create(
+            (User(username=f"benchmark_likes_{i}") for i in range(likes)),
+            batch_size=1000,
+        )
+        Post.likes.through.objects.bulk_create(
+            (Post.likes.through(post_id=post.pk, user_id=user.pk) for user in users),
+            batch_size=1000,
+        )
+        Post.objects.filter(pk=post.pk).update(like_count=likes)
+        return post, clicker
+
+    @staticmethod
+    def _measure(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
@@ -0,0 +1,82 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blog.models import Post
+from services.paginators import CursorPaginator, GeneralPaginator
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает время получения страниц ленты при постраничной (OFFSET) "
+        "и курсорной пагинации. Тестовые данные создаются в транзакции и "
+        "откатываются после замера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", type=int, default=10000)
+        parser.add_argument("--per-page", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        pages = options["pages"]
+        per_page = options["per_page"]
+        repeat = options["repeat"]
+
+        with transaction.atomic():
+            self._seed(pages * per_page)
+            queryset = Post.objects.order_by("-publish_date", "-id")
+            checkpoints = sorted({1, 10, 100, 1000, pages} & set(range(1, pages + 1)))
+
+            self.stdout.write(f"{'страница':>10} {'offset, мс':>12} {'cursor, мс':>12}")
+            for page in checkpoints:
+                offset_ms = self._measure(
+                    lambda: list(GeneralPaginator(queryset, per_page).get_page(page)),
+                    repeat,
+                )
+                cursor = self._cursor_for_page(queryset, page, per_page)
+                cursor_ms = self._measure(
+                    lambda: list(CursorPaginator(queryset, per_page).get_page(cursor)),
+                    repeat,
+                )
+                self.stdout.write(f"{page:>10} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+
+            transaction.set_rollback(True)
+
+    def _seed(self, total):
+        author = User.objects.create_user(username="benchmark_pagination_author")
+        now = timezone.now()
+        Post.objects.bulk_create(
+            (
+                Post(
+                    title=f"Пост {i}",
+                    body="Текст",
+                    author=author,
+                    publish_date=now - timedelta(seconds=i),
+                )
+                for i in range(total)
+            ),
+            batch_size=1000,
+        )
+
+    @staticmethod
+    def _cursor_for_page(queryset, page, per_page):
+        if page == 1:
+            return None
+        boundary = queryset[(page - 1) * per_page - 1]
+        return CursorPaginator(queryset, per_page).encode_cursor(
+            boundary, backwards=False
+        )
+
+    @staticmethod
+    def _measure(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
@@ -0,0 +1,116 @@
+import os
+import random
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from blog.models import Post
+from services.search_index import InvertedIndex, tokenize_post
+
+WORDS = [
+    "django",
+    "python",
+    "postgres",
+    "индекс",
+    "запрос",
+    "кэш",
+    "лента",
+    "подписка",
+    "шаблон",
+    "миграция",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает поиск постов через icontains и через инвертированный "
+        "индекс services.search_index. Тестовые посты создаются в транзакции "
+        "и откатываются после замера."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        posts = options["posts"]
+        repeat = options["repeat"]
+        vocabulary = WORDS + [f"слово{i}" for i in range(20000)]
+        queries = ["django", "django postgres", "миграция кэш", "слово123", "подпис*"]
+
+        with transaction.atomic():
+            self._seed(posts, vocabulary)
+
+            start = time.perf_counter()
+            index = InvertedIndex()
+            rows = Post.objects.values_list(
+                "pk", "title", "body_text", "author__username"
+            ).iterator(chunk_size=1000)
+            for pk, title, body, username in rows:
+                index.add(pk, tokenize_post(title, body, username))
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "posts.idx")
+                index.save(path)
+                build_s = time.perf_counter() - start
+                size_mb = os.path.getsize(path) / 2**20
+                index = InvertedIndex(path)
+
+                self.stdout.write(f"Постов: {posts}")
+                self.stdout.write(
+                    f"Построение индекса, с: {build_s:.1f}; размер, МБ: {size_mb:.1f}"
+                )
+                for query in queries:
+                    icontains_ms = self._measure(
+                        lambda: self._icontains(query.rstrip("*")), repeat
+                    )
+                    index_ms = self._measure(lambda: index.search(query, 20), repeat)
+                    self.stdout.write(
+                        f"{query!r}: icontains, мс: {icontains_ms:.2f}; "
+                        f"индекс, мс: {index_ms:.2f}"
+                    )
+                index.base.close()
+
+            transaction.set_rollback(True)
+
+    def _seed(self, posts, vocabulary):
+        random.seed(0)
+        author = User.objects.create_user(username="benchmark_search_author")
+        bodies = (" ".join(random.choices(vocabulary, k=80)) for _ in range(posts))
+        Post.objects.bulk_create(
+            (
+                Post(
+                    title=" ".join(random.choices(vocabulary, k=5)),
+                    body=f"<p>{body}</p>",
+                    body_text=body,
+                    author=author,
+                )
+                for body in bodies
+            ),
+            batch_size=1000,
+        )
+
+    @staticmethod
+    def _icontains(query):
+        return list(
+            Post.objects.filter(
+                Q(title__icontains=query)
+                | Q(body__icontains=query)
+                | Q(author__username__icontains=query)
+            )
+            .distinct()
+            .order_by("-publish_date")
+            .values_list("pk", flat=True)[:20]
+        )
+
+    @staticmethod
+    def _measure(func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from services.write_buffer import flush_write_buffer
+
+
+class Command(BaseCommand):
+    help = (
+        "Сбрасывает накопленные в буфере лайки и просмотры в базу. "
+        "Периодически то же делает задача Celery beat flush_write_buffer_task."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        stats = flush_write_buffer(options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Ссылок журнала: {stats['events']}, "
+                f"изменено лайков: {stats['likes']}, "
+                f"постов с просмотрами: {stats['views']}"
+            )
+        )
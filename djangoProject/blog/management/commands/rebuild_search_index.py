@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from services.search_backends import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый поисковый индекс постов."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        count = backend.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{type(backend).__name__}: проиндексировано постов: {count}"
+            )
+        )
@@ -0,0 +1,36 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from blog.models import TimelineEntry
+from subscriptions.models import Subscription
+
+from services.timeline_services import rebuild_timeline
+
+
+class Command(BaseCommand):
+    help = "Перестраивает материализованные ленты подписок пользователей."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "usernames",
+            nargs="*",
+            help="Имена пользователей. По умолчанию перестраиваются все ленты.",
+        )
+
+    def handle(self, *args, **options):
+        # Ленты пользователей, отписавшихся от всех авторов, тоже
+        # перестраиваются, чтобы в них не остались старые записи.
+        users = User.objects.filter(
+            Q(id__in=Subscription.objects.values("subscriber_id"))
+            | Q(id__in=TimelineEntry.objects.values("user_id"))
+        )
+        if options["usernames"]:
+            users = User.objects.filter(username__in=options["usernames"])
+
+        rebuilt = 0
+        for user in users.iterator():
+            entries = rebuild_timeline(user)
+            rebuilt += 1
+            self.stdout.write(f"{user.username}: {entries}")
+        self.stdout.write(self.style.SUCCESS(f"Перестроено лент: {rebuilt}"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from blog.models import Post
+from services.blog_services import reconcile_post_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счетчики лайков, комментариев и избранного у постов "
+        "и исправляет расхождения. Посты обрабатываются диапазонами id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        max_id = Post.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+
+        fixed = 0
+        for start_id in range(1, max_id + 1, chunk_size):
+            fixed += reconcile_post_counters(start_id, start_id + chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"Исправлено постов: {fixed}"))
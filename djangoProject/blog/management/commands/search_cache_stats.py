@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from services.search_cache import get_search_cache_stats, reset_search_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает счетчики попаданий и промахов кэша результатов поиска."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Обнулить счетчики после вывода."
+        )
+
+    def handle(self, *args, **options):
+        stats = get_search_cache_stats()
+        total = stats["hits"] + stats["misses"] + stats["coalesced"]
+        hit_rate = (stats["hits"] + stats["coalesced"]) / total * 100 if total else 0
+        self.stdout.write(
+            f"Попаданий: {stats['hits']}, промахов: {stats['misses']}, "
+            f"дождались чужого результата: {stats['coalesced']}, "
+            f"доля попаданий: {hit_rate:.1f}%"
+        )
+        if options["reset"]:
+            reset_search_cache_stats()
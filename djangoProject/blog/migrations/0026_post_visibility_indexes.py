@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:14
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0025_timelineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-publish_date', 'for_subscribers', 'author'], name='blog_post_visibility_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-publish_date'], name='blog_post_author_date_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.3 on 2026-10-18 10:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(model, **filters):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(post_id=OuterRef('pk'), **filters)
+            .order_by()
+            .values('post_id')
+            .annotate(total=Count('*'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    Comment = apps.get_model('blog', 'Comment')
+    Favorite = apps.get_model('blog', 'Favorite')
+    Post.objects.update(
+        like_count=_count(Post.likes.through),
+        comment_count=_count(Comment, approved_comment=True),
+        favorite_count=_count(Favorite),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0026_post_visibility_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Комментарии'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Лайки'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-like_count', '-publish_date'], name='blog_post_popularity_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
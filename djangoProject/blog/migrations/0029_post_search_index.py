@@ -0,0 +1,69 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:05
+
+from django.conf import settings
+from django.db import migrations
+from django.utils.html import strip_tags
+
+
+POSTGRES_VECTOR_SQL = (
+    "setweight(to_tsvector(%(config)s::regconfig, coalesce(title, '')), 'A')"
+    " || setweight(to_tsvector(%(config)s::regconfig, coalesce(body, '')), 'B')"
+    " || setweight(to_tsvector('simple', coalesce((SELECT username FROM auth_user"
+    " WHERE auth_user.id = blog_post.author_id), '')), 'C')"
+)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE blog_post ADD COLUMN search_vector tsvector'
+        )
+        schema_editor.execute(
+            'CREATE INDEX blog_post_search_vector_idx '
+            'ON blog_post USING gin (search_vector)'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE blog_post SET search_vector = {POSTGRES_VECTOR_SQL}',
+                {'config': settings.SEARCH_CONFIG},
+            )
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE blog_post_fts USING fts5('
+            'title, body, username, tokenize="unicode61 remove_diacritics 2")'
+        )
+        Post = apps.get_model('blog', 'Post')
+        rows = [
+            (pk, title, strip_tags(body), username)
+            for pk, title, body, username in Post.objects.values_list(
+                'pk', 'title', 'body', 'author__username'
+            )
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO blog_post_fts (rowid, title, body, username) '
+                'VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX blog_post_search_vector_idx')
+        schema_editor.execute('ALTER TABLE blog_post DROP COLUMN search_vector')
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE blog_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0028_post_view_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
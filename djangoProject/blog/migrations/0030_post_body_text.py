@@ -0,0 +1,33 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+from services.search_snippets import html_to_text
+
+
+def fill_body_text(apps, schema_editor):
+    Post = apps.get_model('blog', 'Post')
+    posts = []
+    for post in Post.objects.only('pk', 'body').iterator(chunk_size=1000):
+        post.body_text = html_to_text(post.body)
+        posts.append(post)
+        if len(posts) == 1000:
+            Post.objects.bulk_update(posts, ['body_text'])
+            posts = []
+    Post.objects.bulk_update(posts, ['body_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0029_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='body_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='Текст без разметки'),
+        ),
+        migrations.RunPython(fill_body_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0030_post_body_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('approved_comment', True)), fields=['post', '-created_date'], name='blog_comment_post_date_idx'),
+        ),
+    ]
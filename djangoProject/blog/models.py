@@ -1,9 +1,14 @@
 from autoslug import AutoSlugField
 from django.db import models
+from django.db.models import Exists, OuterRef, Q
 from django.utils import timezone
 from django.contrib.auth.models import User
 from ckeditor.fields import RichTextField
 
+from services.search_snippets import html_to_text
+from subscriptions.models import Subscription
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name="Название")
     description = models.TextField(verbose_name="Описание")
@@ -19,6 +24,66 @@ class Category(models.Model):
         return self.name
 
 
+class PostQuerySet(models.QuerySet):
+    FEED_FIELDS = (
+        "title",
+        "body",
+        "publish_date",
+        "for_subscribers",
+        "like_count",
+        "comment_count",
+        "favorite_count",
+        "author",
+        "author__username",
+        "author__profile__avatar",
+        "author__profile__user",
+    )
+
+    def for_feed(self):
+        """
+        Загружает вместе с постами всё, что нужно карточке ленты: автора,
+        его профиль и категории, чтобы число запросов не зависело от
+        количества постов на странице.
+        """
+        return (
+            self.select_related("author__profile")
+            .only(*self.FEED_FIELDS)
+            .prefetch_related("categories")
+        )
+
+    def for_search(self):
+        """
+        Как for_feed, но вместо HTML тела загружает его простой текст
+        body_text, из которого строятся сниппеты результатов поиска.
+        """
+        fields = [field for field in self.FEED_FIELDS if field != "body"]
+        return (
+            self.select_related("author__profile")
+            .only(*fields, "body_text")
+            .prefetch_related("categories")
+        )
+
+    def visible_to(self, user):
+        """
+        Оставляет посты, доступные пользователю: публичные, собственные и посты
+        для подписчиков от авторов, на которых он подписан.
+
+        Подписка проверяется коррелированным EXISTS по индексу
+        (subscriber, author) таблицы подписок.
+        """
+        if not user.is_authenticated:
+            return self.filter(for_subscribers=False)
+        return self.filter(
+            Q(for_subscribers=False)
+            | Q(author=user)
+            | Exists(
+                Subscription.objects.filter(
+                    subscriber=user, author_id=OuterRef("author_id")
+                )
+            )
+        )
+
+
 class Post(models.Model):
     title = models.CharField(max_length=450, verbose_name="Заголовок")
     author = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Автор")
@@ -31,14 +96,49 @@ class Post(models.Model):
     for_subscribers = models.BooleanField(
         default=False, verbose_name="Только для подписчиков"
     )
+    like_count = models.PositiveIntegerField(default=0, verbose_name="Лайки")
+    comment_count = models.PositiveIntegerField(
+        default=0, verbose_name="Комментарии"
+    )
+    favorite_count = models.PositiveIntegerField(
+        default=0, verbose_name="В избранном"
+    )
+    view_count = models.PositiveIntegerField(default=0, verbose_name="Просмотры")
+    body_text = models.TextField(
+        blank=True, default="", editable=False, verbose_name="Текст без разметки"
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
+        indexes = [
+            models.Index(
+                fields=["-publish_date", "for_subscribers", "author"],
+                name="blog_post_visibility_date_idx",
+            ),
+            models.Index(
+                fields=["author", "-publish_date"],
+                name="blog_post_author_date_idx",
+            ),
+            models.Index(
+                fields=["-like_count", "-publish_date"],
+                name="blog_post_popularity_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "body" in update_fields:
+            self.body_text = html_to_text(self.body)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "body_text"}
+        super().save(*args, **kwargs)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -65,6 +165,13 @@ class Comment(models.Model):
     class Meta:
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = [
+            models.Index(
+                fields=["post", "-created_date"],
+                name="blog_comment_post_date_idx",
+                condition=models.Q(approved_comment=True),
+            ),
+        ]
 
     def __str__(self):
         return self.text
@@ -98,3 +205,33 @@ class Favorite(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.post.title}"
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пользователь",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name="Пост",
+    )
+    publish_date = models.DateTimeField(verbose_name="Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Записи ленты"
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(
+                fields=["user", "-publish_date", "-post"],
+                name="blog_timeline_user_date_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.post.title}"
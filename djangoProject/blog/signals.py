@@ -0,0 +1,94 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from authentication.models import Profile
+from services.cache_tags import (
+    CATEGORIES_TAG,
+    FEED_TAG,
+    author_tag,
+    bump_tags,
+    category_tag,
+    post_tag,
+    subscriber_tag,
+)
+from services.search_backends import get_search_backend
+from services.timeline_services import (
+    add_author_to_timeline,
+    fan_out_post,
+    remove_author_from_timeline,
+)
+from subscriptions.models import Subscription
+from .models import Category, Comment, Post
+
+
+@receiver(post_save, sender=Post)
+def add_post_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def index_post_for_search(sender, instance, **kwargs):
+    get_search_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_search(sender, instance, **kwargs):
+    get_search_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_tags(sender, instance, **kwargs):
+    bump_tags([post_tag(instance.pk), author_tag(instance.author_id), FEED_TAG])
+
+
+@receiver(m2m_changed, sender=Post.categories.through)
+def bump_post_category_tags(sender, instance, action, pk_set, **kwargs):
+    if not isinstance(instance, Post):
+        return
+    if action in ("post_add", "post_remove"):
+        slugs = Category.objects.filter(pk__in=pk_set).values_list("slug", flat=True)
+    elif action == "pre_clear":
+        slugs = instance.categories.values_list("slug", flat=True)
+    else:
+        return
+    bump_tags(
+        [post_tag(instance.pk), author_tag(instance.author_id), FEED_TAG]
+        + [category_tag(slug) for slug in slugs]
+    )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_tags(sender, instance, **kwargs):
+    bump_tags([post_tag(instance.post_id)])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def bump_category_tags(sender, instance, **kwargs):
+    bump_tags([category_tag(instance.slug), CATEGORIES_TAG])
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def bump_profile_tags(sender, instance, **kwargs):
+    bump_tags([author_tag(instance.user_id)])
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def bump_subscription_tags(sender, instance, **kwargs):
+    bump_tags([author_tag(instance.author_id), subscriber_tag(instance.subscriber_id)])
+
+
+@receiver(post_save, sender=Subscription)
+def add_subscription_to_timeline(sender, instance, created, **kwargs):
+    if created:
+        add_author_to_timeline(instance.subscriber, instance.author)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_subscription_from_timeline(sender, instance, **kwargs):
+    remove_author_from_timeline(instance.subscriber, instance.author)
@@ -0,0 +1,28 @@
+from typing import Dict
+
+from celery import shared_task
+
+from services.search_backends import InvertedIndexSearchBackend, get_search_backend
+from services.search_index import merge_post_index
+from services.write_buffer import flush_write_buffer
+
+
+@shared_task(ignore_result=True)
+def flush_write_buffer_task() -> Dict[str, int]:
+    """
+    Периодический сброс буфера лайков и просмотров в базу.
+
+    Запускается Celery beat по расписанию CELERY_BEAT_SCHEDULE.
+    """
+    return flush_write_buffer()
+
+
+@shared_task(ignore_result=True)
+def merge_search_index_task() -> bool:
+    """
+    Периодическое объединение журнала изменений инвертированного индекса
+    постов с файлом индекса. Для остальных поисковых бэкендов ничего не делает.
+    """
+    if not isinstance(get_search_backend(), InvertedIndexSearchBackend):
+        return False
+    return merge_post_index()
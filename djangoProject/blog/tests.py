@@ -1,9 +1,30 @@
+import os
+import tempfile
+import threading
+import time
+import warnings
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection
 from django.http import Http404
-from django.test import RequestFactory, TestCase
-from django.contrib.auth.models import User
+from django.db.models import Q
+from django.utils import timezone
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import AnonymousUser, User
 from django.urls import reverse
-from blog.models import Post, Category, Comment, Favorite
-from services.paginators import GeneralPaginator
+from blog.models import Post, Category, Comment, Favorite, TimelineEntry
+from services.paginators import CursorPaginator, GeneralPaginator
+from blog import views
+from blog.tasks import flush_write_buffer_task, merge_search_index_task
+from blog.tests_support import QueryBudgetTestMixin, QueryPlanTestMixin
+from authentication.models import Profile
+from messaging.models import Message
+from notifications.models import Notification
 from subscriptions.models import Subscription
 from services.blog_services import (
     toggle_post_like,
@@ -25,6 +46,62 @@ from services.blog_services import (
     get_posts_by_category,
     get_posts_by_query,
     get_paginated_posts,
+    get_viewer_relations,
+    handle_comment_form,
+    _create_notifications,
+    register_post_view,
+)
+from services.messaging_services import (
+    get_messages_for_user,
+    get_sent_messages_for_user,
+)
+from services.notifications_services import (
+    compact_notifications,
+    fan_out_post_notifications,
+    get_notifications_page,
+    get_unread_count,
+)
+from services.cache_tags import (
+    bump_tags,
+    get_or_set_tagged,
+    get_tag_versions,
+    post_tag,
+)
+from services.search_cache import (
+    get_cached_search_results,
+    get_search_cache_key,
+    get_search_cache_stats,
+    get_visibility_class,
+    normalize_query,
+)
+from services.search_facets import apply_search_filters, parse_search_filters
+from services.search_snippets import (
+    build_snippet,
+    compile_highlight_pattern,
+    html_to_text,
+)
+from services.search_index import (
+    InvertedIndex,
+    decode_postings,
+    encode_postings,
+    get_log_position,
+    pack_uint32,
+    tokenize,
+    unpack_uint32,
+)
+from services.search_backends import (
+    IcontainsSearchBackend,
+    InvertedIndexSearchBackend,
+    SqliteFTS5SearchBackend,
+    get_search_backend,
+)
+from services import write_buffer
+from services.write_buffer import (
+    buffer_post_view,
+    flush_write_buffer,
+    get_buffered_like_state,
+    get_pending_like_delta,
+    get_pending_view_delta,
 )
 
 
@@ -71,6 +148,26 @@ class ServiceTests(TestCase):
         context = get_subscribed_posts(self.user1)
         self.assertIn(self.post2, context["page_obj"].object_list)
 
+    def test_get_subscribed_posts_filters_by_query(self):
+        Post.objects.create(title="Other", body="Body", author=self.user2)
+        context = get_subscribed_posts(self.user1, query="Post 2")
+        self.assertEqual(list(context["page_obj"].object_list), [self.post2])
+
+    def test_get_subscribed_posts_excludes_unsubscribed_authors(self):
+        context = get_subscribed_posts(self.user2)
+        self.assertNotIn(self.post1, context["page_obj"].object_list)
+
+    def test_get_subscribed_posts_query_count_does_not_depend_on_subscriptions(self):
+        for i in range(10):
+            author = User.objects.create_user(username=f"author{i}", password="pass")
+            Subscription.objects.create(subscriber=self.user1, author=author)
+        for i in range(10):
+            Post.objects.create(title=f"Feed {i}", body="Body", author=self.user2)
+        with self.assertNumQueries(2):
+            context = get_subscribed_posts(self.user1, cursor="")
+        self.assertEqual(len(context["page_obj"]), 5)
+        self.assertTrue(context["page_obj"].has_next())
+
     def test_toggle_favorite_post(self):
         toggle_favorite_post(self.post1.id, self.user1)
         self.assertTrue(is_favorite_post(self.user1, self.post1))
@@ -91,6 +188,31 @@ class ServiceTests(TestCase):
         context = get_blog_context(self.user1, Post.objects.all(), paginator, 1)
         self.assertIn("posts", context)
 
+    def test_get_viewer_relations(self):
+        self.post2.likes.add(self.user1)
+        with self.assertNumQueries(1):
+            relations = get_viewer_relations(self.user1, [self.post1, self.post2])
+        self.assertEqual(
+            relations[self.post2.pk],
+            {"follows_author": True, "liked": True, "favorited": True},
+        )
+        self.assertEqual(
+            relations[self.post1.pk],
+            {"follows_author": False, "liked": False, "favorited": False},
+        )
+        self.assertTrue(self.post2.viewer_liked)
+
+    def test_get_blog_context_query_count_does_not_depend_on_page_size(self):
+        for i in range(10):
+            author = User.objects.create_user(username=f"author{i}", password="pass")
+            Post.objects.create(title=f"Post {i}", body="Body", author=author)
+        for per_page in (2, 10):
+            posts = Post.objects.order_by("-publish_date")
+            paginator = GeneralPaginator(posts, per_page=per_page)
+            with self.assertNumQueries(2):
+                context = get_blog_context(self.user1, posts, paginator, 1)
+                list(context["posts"])
+
     def test_get_post_comments(self):
         comments = get_post_comments(self.post1)
         self.assertIn(self.comment1, comments)
@@ -157,3 +279,1271 @@ class ServiceTests(TestCase):
             request, Post.objects.all().order_by("-publish_date")
         )
         self.assertIn("page_obj", context)
+
+
+class CursorPaginatorTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="author", password="pass")
+        now = timezone.now()
+        self.posts = [
+            Post.objects.create(
+                title=f"Post {i}",
+                body="Body",
+                author=self.user,
+                publish_date=now - timedelta(minutes=i // 2),
+            )
+            for i in range(12)
+        ]
+        self.queryset = Post.objects.all()
+        self.expected = list(Post.objects.order_by("-publish_date", "-id"))
+
+    def test_walks_all_pages_forward_and_back(self):
+        paginator = CursorPaginator(self.queryset, per_page=5)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        third = paginator.get_page(second.next_cursor)
+
+        self.assertEqual(list(first) + list(second) + list(third), self.expected)
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+        self.assertEqual(list(paginator.get_page(third.previous_cursor)), list(second))
+        self.assertEqual(list(paginator.get_page(second.previous_cursor)), list(first))
+
+    def test_new_posts_do_not_shift_pages(self):
+        paginator = CursorPaginator(self.queryset, per_page=5)
+        first = paginator.get_page(None)
+        Post.objects.create(title="Fresh", body="Body", author=self.user)
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual(list(second), self.expected[5:10])
+
+    def test_does_not_count_or_offset(self):
+        paginator = GeneralPaginator(self.queryset)
+        first = paginator.get_cursor_page(None)
+        with self.assertNumQueries(1) as ctx:
+            paginator.get_cursor_page(first.next_cursor)
+        sql = ctx.captured_queries[0]["sql"].upper()
+        self.assertNotIn("COUNT(", sql)
+        self.assertNotIn("OFFSET", sql)
+
+    def test_cursor_mode_does_not_build_paginator(self):
+        paginator = GeneralPaginator(Post.objects.all())
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            page = paginator.get_cursor_page(None)
+        self.assertEqual(list(page), self.expected[:5])
+        self.assertNotIn("paginator", vars(paginator))
+
+    def test_invalid_cursor_returns_first_page(self):
+        page = CursorPaginator(self.queryset, per_page=5).get_page("garbage")
+        self.assertEqual(list(page), self.expected[:5])
+
+
+class TimelineTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.author = User.objects.create_user(username="author", password="pass")
+        self.other = User.objects.create_user(username="other", password="pass")
+        Subscription.objects.create(subscriber=self.reader, author=self.author)
+
+    def tearDown(self):
+        cache.clear()
+
+    def _timeline(self, user):
+        return list(
+            TimelineEntry.objects.filter(user=user)
+            .order_by("-publish_date", "-post_id")
+            .values_list("post__title", flat=True)
+        )
+
+    def test_new_post_is_fanned_out_to_subscribers(self):
+        Post.objects.create(title="Fresh", body="Body", author=self.author)
+        Post.objects.create(title="Unrelated", body="Body", author=self.other)
+        self.assertEqual(self._timeline(self.reader), ["Fresh"])
+
+    @override_settings(TIMELINE_MAX_LENGTH=3)
+    def test_timeline_is_trimmed(self):
+        now = timezone.now()
+        for i in range(5):
+            Post.objects.create(
+                title=f"Post {i}",
+                body="Body",
+                author=self.author,
+                publish_date=now + timedelta(minutes=i),
+            )
+        self.assertEqual(self._timeline(self.reader), ["Post 4", "Post 3", "Post 2"])
+
+    def test_subscribe_and_unsubscribe_update_timeline(self):
+        Post.objects.create(title="Old", body="Body", author=self.other)
+        subscription = Subscription.objects.create(
+            subscriber=self.reader, author=self.other
+        )
+        self.assertEqual(self._timeline(self.reader), ["Old"])
+        subscription.delete()
+        self.assertEqual(self._timeline(self.reader), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_posts_are_pulled_at_read(self):
+        post = Post.objects.create(title="Celebrity", body="Body", author=self.author)
+        self.assertEqual(self._timeline(self.reader), [])
+        context = get_subscribed_posts(self.reader)
+        self.assertEqual(list(context["page_obj"].object_list), [post])
+
+    def test_rebuild_timelines_command(self):
+        post = Post.objects.create(title="Post", body="Body", author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(self._timeline(self.reader), [post.title])
+
+    def test_pulled_posts_are_merged_with_timeline(self):
+        now = timezone.now()
+        Subscription.objects.create(subscriber=self.reader, author=self.other)
+        for i in range(6):
+            Post.objects.create(
+                title=f"Post {i}",
+                body="Body",
+                author=self.author if i % 2 else self.other,
+                publish_date=now - timedelta(minutes=i),
+            )
+        with override_settings(TIMELINE_FANOUT_LIMIT=0):
+            cache.clear()
+            Post.objects.create(
+                title="Pulled", body="Body", author=self.author, publish_date=now
+            )
+            context = get_subscribed_posts(self.reader)
+            page = context["page_obj"]
+            self.assertEqual(page.paginator.count, 7)
+            self.assertEqual(
+                [post.title for post in page],
+                ["Pulled", "Post 0", "Post 1", "Post 2", "Post 3"],
+            )
+            titles = []
+            cursor = ""
+            while cursor is not None:
+                page = get_subscribed_posts(self.reader, cursor=cursor)["page_obj"]
+                titles += [post.title for post in page]
+                cursor = page.next_cursor
+            found = get_subscribed_posts(self.reader, query="pulled")["page_obj"]
+            self.assertEqual([post.title for post in found], ["Pulled"])
+        self.assertEqual(titles, ["Pulled"] + [f"Post {i}" for i in range(6)])
+
+    def test_rebuild_timelines_clears_users_without_subscriptions(self):
+        Post.objects.create(title="Post", body="Body", author=self.author)
+        Subscription.objects.filter(subscriber=self.reader).delete()
+        TimelineEntry.objects.create(
+            user=self.reader,
+            post=Post.objects.get(title="Post"),
+            publish_date=timezone.now(),
+        )
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(self._timeline(self.reader), [])
+
+
+class VisibilityQueryPlanTests(TestCase):
+
+    def setUp(self):
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        authors = [
+            User.objects.create_user(username=f"author{i}", password="pass")
+            for i in range(20)
+        ]
+        Subscription.objects.bulk_create(
+            Subscription(subscriber=self.reader, author=author)
+            for author in authors[::2]
+        )
+        Post.objects.bulk_create(
+            Post(
+                title=f"Post {i}",
+                body="Body",
+                author=authors[i % len(authors)],
+                for_subscribers=i % 3 == 0,
+            )
+            for i in range(200)
+        )
+
+    def _explain(self, queryset):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def test_visible_to_uses_single_exists(self):
+        sql = str(Post.objects.visible_to(self.reader).query).upper()
+        self.assertEqual(sql.count("EXISTS"), 1)
+        self.assertNotIn(" IN (SELECT", sql)
+
+    def test_visible_to_uses_indexes(self):
+        plan = self._explain(
+            Post.objects.visible_to(self.reader).order_by("-publish_date")[:6]
+        )
+        self.assertIn("blog_post_visibility_date_idx", plan)
+        self.assertIn("subscriptions_subscription_subscriber_id_author_id", plan)
+
+    def test_visible_to_matches_previous_filter(self):
+        subscribed = self.reader.subscriptions.values_list("author__id", flat=True)
+        expected = Post.objects.filter(
+            Q(for_subscribers=False)
+            | Q(author__id__in=subscribed)
+            | Q(author=self.reader)
+        )
+        self.assertQuerySetEqual(
+            Post.objects.visible_to(self.reader).order_by("id"),
+            expected.order_by("id"),
+        )
+
+
+class FeedQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username="viewer", password="pass")
+        Profile.objects.create(user=self.viewer)
+        self.client.force_login(self.viewer)
+
+    def _seed(self, own=False):
+        return lambda count: self.seed_feed_posts(self.viewer, count, own=own)
+
+    def test_home(self):
+        self.assertQueryCountIndependentOfPageSize(reverse("home"), self._seed())
+
+    def test_category_posts(self):
+        self._seed()(0)
+        url = reverse("category_posts", args=["budget"])
+        self.assertQueryCountIndependentOfPageSize(url, self._seed())
+
+    def test_search_posts(self):
+        url = reverse("search_posts") + "?query=Budget"
+        self.assertQueryCountIndependentOfPageSize(url, self._seed())
+
+    def test_subscribed_posts(self):
+        url = reverse("subscribed_posts")
+        self.assertQueryCountIndependentOfPageSize(url, self._seed())
+
+    def test_favorite_posts(self):
+        url = reverse("favorite_posts")
+        self.assertQueryCountIndependentOfPageSize(url, self._seed())
+
+    def test_my_posts(self):
+        url = reverse("my_posts")
+        self.assertQueryCountIndependentOfPageSize(url, self._seed(own=True))
+
+
+class PostCounterTests(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.author = User.objects.create_user(username="author", password="pass")
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.post = Post.objects.create(title="Post", body="Body", author=self.author)
+
+    def test_toggle_post_like_updates_like_count(self):
+        toggle_post_like(self.post.id, self.reader)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        toggle_post_like(self.post.id, self.reader)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_toggle_post_like_returns_state_and_count(self):
+        self.post.likes.add(self.author)
+        Post.objects.filter(pk=self.post.pk).update(like_count=1)
+        self.assertEqual(toggle_post_like(self.post.id, self.reader), (True, 2))
+        self.assertEqual(toggle_post_like(self.post.id, self.reader), (False, 1))
+
+    def test_toggle_post_like_does_not_load_likers(self):
+        for i in range(10):
+            liker = User.objects.create_user(username=f"liker{i}", password="pass")
+            self.post.likes.add(liker)
+        with CaptureQueriesContext(connection) as ctx:
+            toggle_post_like(self.post.id, self.reader)
+        selects = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+        self.assertFalse(any('"auth_user"' in sql for sql in selects))
+        self.assertFalse(any('FROM "blog_post_likes"' in sql for sql in selects))
+
+    def test_toggle_post_like_missing_post(self):
+        with self.assertRaises(Http404):
+            toggle_post_like(0, self.reader)
+
+    def test_post_detail_marks_liked_post(self):
+        self.post.likes.add(self.reader)
+        self.client.force_login(self.reader)
+        with override_settings(COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False):
+            response = self.client.get(reverse("post_detail", args=[self.post.pk]))
+        self.assertTrue(response.context["is_liked"])
+        self.assertFalse(response.context["is_favorite"])
+
+    def test_toggle_favorite_post_updates_favorite_count(self):
+        toggle_favorite_post(self.post.id, self.reader)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.favorite_count, 1)
+        toggle_favorite_post(self.post.id, self.reader)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.favorite_count, 0)
+
+    def test_toggle_favorite_post_counts_only_affected_rows(self):
+        def assert_count_matches_rows():
+            self.post.refresh_from_db()
+            self.assertEqual(
+                self.post.favorite_count,
+                Favorite.objects.filter(post=self.post).count(),
+            )
+
+        toggle_favorite_post(self.post.id, self.reader)
+        # Параллельный запрос уже удалил строку и уменьшил счетчик
+        Favorite.objects.filter(user=self.reader).delete()
+        Post.objects.filter(pk=self.post.pk).update(favorite_count=0)
+        toggle_favorite_post(self.post.id, self.reader)
+        assert_count_matches_rows()
+
+        # Параллельный запрос успел вставить строку
+        Favorite.objects.filter(user=self.reader).delete()
+        with mock.patch.object(Favorite.objects, "create", side_effect=IntegrityError):
+            toggle_favorite_post(self.post.id, self.reader)
+        Favorite.objects.create(user=self.reader, post=self.post)
+        assert_count_matches_rows()
+
+        with self.assertRaises(Http404):
+            toggle_favorite_post(0, self.reader)
+
+    def test_handle_comment_form_updates_comment_count(self):
+        request = self.factory.post("/", {"text": "Nice"})
+        request.user = self.reader
+        handle_comment_form(request, self.post)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_comment_notification_costs_constant_queries(self):
+        def comment(text):
+            request = self.factory.post("/", {"text": text})
+            request.user = self.reader
+            with CaptureQueriesContext(connection) as queries:
+                handle_comment_form(request, self.post)
+            return len(queries)
+
+        comment("Warm up")
+        first = comment("First")
+        for number in range(5):
+            comment(f"Comment {number}")
+        self.assertEqual(comment("Last"), first)
+        notification = Notification.objects.get(user=self.author)
+        self.assertEqual(notification.count, 8)
+        self.assertEqual(notification.message, "Новый комментарий: Last")
+        self.assertEqual(notification.actors, [self.reader.username])
+
+    def test_comment_notification_is_not_duplicated_or_sent_to_self(self):
+        comment = Comment.objects.create(post=self.post, author=self.reader, text="Hi")
+        _create_notifications(self.post, self.reader, comment)
+        _create_notifications(self.post, self.reader, comment)
+        self.assertEqual(Notification.objects.filter(user=self.author).count(), 1)
+        own = Comment.objects.create(post=self.post, author=self.author, text="Mine")
+        _create_notifications(self.post, self.author, own)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_reconcile_post_counters_command(self):
+        self.post.likes.add(self.reader)
+        Favorite.objects.create(user=self.reader, post=self.post)
+        Comment.objects.create(post=self.post, author=self.reader, text="Text")
+        Post.objects.filter(pk=self.post.pk).update(comment_count=7)
+
+        out = StringIO()
+        call_command("reconcile_post_counters", chunk_size=1, stdout=out)
+
+        self.post.refresh_from_db()
+        self.assertEqual(
+            (self.post.like_count, self.post.comment_count, self.post.favorite_count),
+            (1, 1, 1),
+        )
+        self.assertIn("1", out.getvalue())
+
+    def test_get_blog_queryset_orders_by_popularity(self):
+        popular = Post.objects.create(
+            title="Popular", body="Body", author=self.author, like_count=10
+        )
+        queryset = get_blog_queryset(self.reader, "-like_count")
+        self.assertEqual(queryset.first(), popular)
+
+
+@override_settings(
+    WRITE_BUFFER_ENABLED=True,
+    CACHES={
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    },
+)
+class WriteBufferTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass")
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.post = Post.objects.create(title="Post", body="Body", author=self.author)
+
+    def test_buffered_like_is_visible_before_flush(self):
+        self.assertEqual(toggle_post_like(self.post.id, self.reader), (True, 1))
+        self.assertFalse(self.post.likes.exists())
+        self.assertTrue(get_buffered_like_state(self.post.id, self.reader.id))
+        relations = get_viewer_relations(self.reader, [self.post])
+        self.assertTrue(relations[self.post.pk]["liked"])
+
+    def test_flush_applies_final_toggle_state(self):
+        other = User.objects.create_user(username="other", password="pass")
+        self.post.likes.add(other)
+        Post.objects.filter(pk=self.post.pk).update(like_count=1)
+
+        toggle_post_like(self.post.id, self.reader)
+        toggle_post_like(self.post.id, self.reader)
+        toggle_post_like(self.post.id, self.reader)
+        self.assertEqual(toggle_post_like(self.post.id, other), (False, 1))
+
+        stats = flush_write_buffer(batch_size=2)
+        self.assertEqual(stats["likes"], 2)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(list(self.post.likes.all()), [self.reader])
+        self.assertEqual(toggle_post_like(self.post.id, self.reader), (False, 0))
+
+    def test_flush_is_idempotent(self):
+        toggle_post_like(self.post.id, self.reader)
+        flush_write_buffer()
+        self.assertEqual(flush_write_buffer()["events"], 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_flush_clears_like_state(self):
+        toggle_post_like(self.post.id, self.reader)
+        flush_write_buffer()
+        self.assertIsNone(get_buffered_like_state(self.post.id, self.reader.id))
+        self.assertEqual(toggle_post_like(self.post.id, self.reader), (False, 0))
+        flush_write_buffer()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(self.post.likes.exists())
+
+    def test_flush_skips_like_locked_by_toggle(self):
+        toggle_post_like(self.post.id, self.reader)
+        lock_key = f"wbuf:like:lock:{self.post.id}:{self.reader.id}"
+        cache.add(lock_key, 1)
+        self.assertEqual(flush_write_buffer()["likes"], 0)
+        self.assertFalse(self.post.likes.exists())
+
+        cache.delete(lock_key)
+        self.assertEqual(flush_write_buffer()["likes"], 1)
+        self.assertEqual(list(self.post.likes.all()), [self.reader])
+
+    def test_flush_runs_once_at_a_time(self):
+        buffer_post_view(self.post.id)
+        cache.add("wbuf:flush:lock", 1)
+        self.assertEqual(flush_write_buffer()["views"], 0)
+        cache.delete("wbuf:flush:lock")
+        self.assertEqual(
+            flush_write_buffer_task(), {"events": 1, "likes": 0, "views": 1}
+        )
+
+    def test_failed_flush_keeps_buffered_counts(self):
+        buffer_post_view(self.post.id)
+        toggle_post_like(self.post.id, self.reader)
+        apply_deltas = write_buffer._apply_deltas
+
+        def flush_failing_on(failing_field):
+            def fail(field, deltas):
+                if field == failing_field:
+                    raise DatabaseError
+                apply_deltas(field, deltas)
+
+            with mock.patch("services.write_buffer._apply_deltas", fail):
+                with self.assertRaises(DatabaseError):
+                    flush_write_buffer()
+
+        flush_failing_on("like_count")
+        self.assertFalse(self.post.likes.exists())
+        self.assertEqual(get_pending_like_delta(self.post.id), 1)
+        self.assertEqual(get_pending_view_delta(self.post.id), 1)
+
+        flush_failing_on("view_count")
+        self.assertTrue(self.post.likes.exists())
+        self.assertEqual(get_pending_like_delta(self.post.id), 0)
+        self.assertEqual(get_pending_view_delta(self.post.id), 1)
+
+        flush_write_buffer()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.view_count, self.post.like_count), (1, 1))
+        self.assertEqual(get_pending_view_delta(self.post.id), 0)
+
+    def test_views_are_flushed_in_one_update(self):
+        second = Post.objects.create(title="Second", body="Body", author=self.author)
+        for _ in range(3):
+            buffer_post_view(self.post.id)
+        buffer_post_view(second.id)
+
+        with CaptureQueriesContext(connection) as ctx:
+            stats = flush_write_buffer()
+        updates = [q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(stats["views"], 2)
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            dict(Post.objects.values_list("id", "view_count")),
+            {self.post.id: 3, second.id: 1},
+        )
+
+        buffer_post_view(self.post.id)
+        flush_write_buffer()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 4)
+
+    def test_register_post_view_shows_pending_counters(self):
+        toggle_post_like(self.post.id, self.reader)
+        buffer_post_view(self.post.id)
+        register_post_view(self.post)
+        self.assertEqual((self.post.view_count, self.post.like_count), (2, 1))
+
+    def test_flush_command(self):
+        buffer_post_view(self.post.id)
+        out = StringIO()
+        call_command("flush_write_buffer", stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 1)
+
+    @override_settings(WRITE_BUFFER_ENABLED=False)
+    def test_register_post_view_without_buffer(self):
+        register_post_view(self.post)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.view_count, 1)
+
+
+@override_settings(COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False)
+class PageCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass")
+        self.subscriber = User.objects.create_user(
+            username="subscriber", password="pass"
+        )
+        Profile.objects.create(user=self.author)
+        Subscription.objects.create(subscriber=self.subscriber, author=self.author)
+        self.post = Post.objects.create(title="Public", body="Body", author=self.author)
+        Post.objects.create(
+            title="Private", body="Body", author=self.author, for_subscribers=True
+        )
+
+    def test_anonymous_page_is_shared_across_cookies(self):
+        self.client.get(reverse("home"))
+        self.client.cookies["tracking"] = "abc"
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("home"))
+        self.assertContains(response, "Public")
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_personalized_page_is_not_served_to_anonymous(self):
+        self.client.force_login(self.subscriber)
+        self.assertContains(self.client.get(reverse("home")), "Private")
+        self.client.logout()
+        self.assertNotContains(self.client.get(reverse("home")), "Private")
+
+    def test_anonymous_page_is_not_served_to_subscriber(self):
+        self.assertNotContains(self.client.get(reverse("home")), "Private")
+        self.client.force_login(self.subscriber)
+        response = self.client.get(reverse("home"))
+        self.assertContains(response, "Private")
+        self.assertContains(response, self.subscriber.username)
+
+    def test_popular_page_is_invalidated_by_like_on_other_page(self):
+        now = timezone.now()
+        for i in range(6):
+            Post.objects.create(
+                title=f"Filler {i}",
+                body="Body",
+                author=self.author,
+                publish_date=now + timedelta(minutes=i),
+            )
+        hidden = Post.objects.create(
+            title="Hidden", body="Body", author=self.author, publish_date=now
+        )
+        url = reverse("home") + "?sort=popular"
+        self.assertNotContains(self.client.get(url), "Hidden")
+        toggle_post_like(hidden.pk, self.subscriber)
+        self.assertContains(self.client.get(url), "Hidden")
+
+    def test_edit_during_render_does_not_outlive_page(self):
+        get_blog_context = views.get_blog_context
+
+        def edit_after_read(*args, **kwargs):
+            # Пост меняется после выборки страницы, но до ее сохранения в кэш
+            Post.objects.filter(pk=self.post.pk).update(title="Edited")
+            Post.objects.get(pk=self.post.pk).save()
+            return get_blog_context(*args, **kwargs)
+
+        with mock.patch("blog.views.get_blog_context", edit_after_read):
+            self.assertContains(self.client.get(reverse("home")), "Public")
+        self.assertContains(self.client.get(reverse("home")), "Edited")
+
+    def test_post_card_fragment_is_invalidated_on_edit(self):
+        self.client.force_login(self.subscriber)
+        self.client.get(reverse("home"))
+        self.post.title = "Edited"
+        self.post.save()
+        self.assertContains(self.client.get(reverse("home")), "Edited")
+
+
+@override_settings(COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False)
+class TaggedCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author", password="pass")
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.category = Category.objects.create(name="Django", description="Django")
+        self.post = Post.objects.create(title="Post", body="Body", author=self.author)
+
+    def test_bump_tags_invalidates_tagged_value(self):
+        tags = [post_tag(self.post.pk)]
+        self.assertEqual(get_or_set_tagged("key", tags, lambda: 1), 1)
+        self.assertEqual(get_or_set_tagged("key", tags, lambda: 2), 1)
+        bump_tags(tags)
+        self.assertEqual(get_or_set_tagged("key", tags, lambda: 3), 3)
+
+    def test_evicted_tag_version_does_not_revive_old_entries(self):
+        tags = [post_tag(self.post.pk)]
+        get_or_set_tagged("key", tags, lambda: 1)
+        bump_tags(tags)
+        cache.delete("tagver:" + tags[0])
+        self.assertEqual(get_or_set_tagged("key", tags, lambda: 2), 2)
+
+    def test_post_save_bumps_post_author_and_feed_tags(self):
+        tags = [post_tag(self.post.pk), f"author:{self.author.pk}", "feed"]
+        before = get_tag_versions(tags)
+        self.post.save()
+        after = get_tag_versions(tags)
+        self.assertTrue(all(after[tag] != before[tag] for tag in tags))
+
+    def test_categories_context_is_cached_until_category_changes(self):
+        self.client.get(reverse("about"))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse("about"))
+        self.assertFalse(
+            any("blog_category" in query["sql"] for query in ctx.captured_queries)
+        )
+        Category.objects.create(name="Python", description="Python")
+        self.assertContains(self.client.get(reverse("about")), "Python")
+
+    def test_anonymous_feed_is_refreshed_after_new_post_and_like(self):
+        self.client.get(reverse("home"))
+        Post.objects.create(title="Fresh", body="Body", author=self.author)
+        self.assertContains(self.client.get(reverse("home")), "Fresh")
+
+        toggle_post_like(self.post.pk, self.reader)
+        response = self.client.get(reverse("home"))
+        post = next(p for p in response.context["posts"] if p.pk == self.post.pk)
+        self.assertEqual(post.like_count, 1)
+
+    def test_post_detail_fragments_are_refreshed_after_edits(self):
+        url = reverse("post_detail", args=[self.post.pk])
+        self.client.get(url)
+        self.post.body = "Edited body"
+        self.post.save()
+        Comment.objects.create(post=self.post, author=self.reader, text="New comment")
+        response = self.client.get(url)
+        self.assertContains(response, "Edited body")
+        self.assertContains(response, "New comment")
+
+    def test_post_card_shows_new_category(self):
+        self.client.force_login(self.reader)
+        self.client.get(reverse("home"))
+        self.post.categories.add(self.category)
+        self.assertContains(self.client.get(reverse("home")), "Django*")
+
+
+class SearchBackendTests(TestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer", password="pass")
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.title_match = Post.objects.create(
+            title="Django signals", body="<p>Body text</p>", author=self.author
+        )
+        self.body_match = Post.objects.create(
+            title="Other",
+            body="<p>About <strong>django</strong> views</p>",
+            author=self.author,
+        )
+
+    def search(self, query, user=None):
+        return list(get_posts_by_query(query, user or self.reader))
+
+    def test_sqlite_uses_fts5_backend(self):
+        self.assertIsInstance(get_search_backend(), SqliteFTS5SearchBackend)
+
+    def test_results_are_ranked_by_relevance(self):
+        self.assertEqual(self.search("django"), [self.title_match, self.body_match])
+
+    def test_html_markup_is_not_indexed(self):
+        self.assertEqual(self.search("strong"), [])
+
+    def test_search_by_author_username(self):
+        self.assertEqual(len(self.search("writer")), 2)
+
+    def test_fts_operators_in_query_are_escaped(self):
+        self.assertEqual(self.search('django" OR NOT *'), [])
+        self.assertEqual(self.search("!!!"), [])
+
+    def test_index_follows_post_edit_and_delete(self):
+        self.body_match.body = "Celery tasks"
+        self.body_match.save()
+        self.assertEqual(self.search("django"), [self.title_match])
+        self.assertEqual(self.search("celery"), [self.body_match])
+        self.title_match.delete()
+        self.assertEqual(self.search("django"), [])
+
+    def test_subscriber_only_posts_stay_hidden(self):
+        private = Post.objects.create(
+            title="Django secrets",
+            body="Body",
+            author=self.author,
+            for_subscribers=True,
+        )
+        self.assertNotIn(private, self.search("secrets"))
+        Subscription.objects.create(subscriber=self.reader, author=self.author)
+        self.assertIn(private, self.search("secrets"))
+
+    def test_rebuild_search_index_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM blog_post_fts")
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+        self.assertEqual(len(self.search("django")), 2)
+        self.assertIn("2", out.getvalue())
+
+    @override_settings(SEARCH_BACKEND="services.search_backends.IcontainsSearchBackend")
+    def test_backend_can_be_configured(self):
+        self.assertIsInstance(get_search_backend(), IcontainsSearchBackend)
+        self.assertEqual(len(self.search("jang")), 2)
+
+
+class InvertedIndexTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "posts.idx")
+        self.index = InvertedIndex(self.path)
+        self.index.add(1, tokenize("Django signals and django views"))
+        self.index.add(2, tokenize("Celery tasks for django"))
+        self.index.add(3, tokenize("Postgres full text search"))
+
+    def tearDown(self):
+        if self.index.base is not None:
+            self.index.base.close()
+
+    def test_postings_round_trip(self):
+        doc_ids, freqs = decode_postings(encode_postings([3, 10, 100000], [1, 2, 300]))
+        self.assertEqual(list(doc_ids), [3, 10, 100000])
+        self.assertEqual(list(freqs), [1, 2, 300])
+
+    def test_bm25_ranks_frequent_term_higher(self):
+        self.assertEqual([pk for pk, _ in self.index.search("django")], [1, 2])
+
+    def test_all_query_terms_are_required(self):
+        self.assertEqual([pk for pk, _ in self.index.search("django celery")], [2])
+        self.assertEqual(self.index.search("django postgres"), [])
+
+    def test_prefix_query(self):
+        self.assertEqual([pk for pk, _ in self.index.search("post*")], [3])
+        self.assertEqual(
+            [pk for pk, _ in self.index.search("full tex", prefix_last=True)], [3]
+        )
+
+    def test_incremental_updates_over_saved_file(self):
+        self.index.save()
+        self.index.add(2, tokenize("Celery only"))
+        self.index.delete(3)
+        self.index.add(4, tokenize("Django channels"))
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual({pk for pk, _ in self.index.search("django")}, {1, 4})
+        self.assertEqual(self.index.search("postgres"), [])
+
+        self.index.save()
+        reopened = InvertedIndex(self.path)
+        self.addCleanup(reopened.base.close)
+        self.assertEqual({pk for pk, _ in reopened.search("django")}, {1, 4})
+
+    def test_refresh_picks_up_file_written_by_other_process(self):
+        self.index.save()
+        reader = InvertedIndex(self.path)
+        self.addCleanup(lambda: reader.base.close())
+        self.index.add(5, tokenize("Redis cache"))
+        self.index.save()
+        os.utime(self.path, ns=(0, reader.base.mtime + 1))
+        self.assertTrue(reader.refresh())
+        self.assertEqual([pk for pk, _ in reader.search("redis")], [5])
+
+    def _open(self):
+        index = InvertedIndex(self.path)
+        self.addCleanup(lambda: index.base and index.base.close())
+        return index
+
+    def test_changes_are_shared_through_log(self):
+        self.index.save()
+        reader = self._open()
+        self.index.add(4, tokenize("Django channels"))
+        self.index.delete(1)
+        self.assertTrue(reader.refresh())
+        self.assertEqual({pk for pk, _ in reader.search("django")}, {2, 4})
+        self.assertFalse(reader.refresh())
+
+        restarted = self._open()
+        self.assertEqual({pk for pk, _ in restarted.search("django")}, {2, 4})
+
+    def test_save_moves_unmerged_records_to_new_log(self):
+        self.index.save()
+        self.assertEqual(get_log_position(self.path)[1], 0)
+        position = get_log_position(self.path)
+        self.index.add(4, tokenize("Django channels"))
+
+        rebuilt = InvertedIndex()
+        rebuilt.add(1, tokenize("Django signals"))
+        rebuilt.save(self.path, position)
+        self.addCleanup(rebuilt.base.close)
+        self.assertEqual({pk for pk, _ in rebuilt.search("django")}, {1, 4})
+        self.assertTrue(self.index.refresh())
+        self.assertEqual({pk for pk, _ in self.index.search("django")}, {1, 4})
+
+    def test_document_arrays_are_little_endian(self):
+        packed = pack_uint32([1, 2**32 - 1])
+        self.assertEqual(packed, b"\x01\x00\x00\x00\xff\xff\xff\xff")
+        self.assertEqual(list(unpack_uint32(memoryview(packed))), [1, 2**32 - 1])
+
+
+class InvertedIndexSearchBackendTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "posts.idx")
+        settings_override = override_settings(
+            SEARCH_BACKEND="services.search_backends.InvertedIndexSearchBackend",
+            SEARCH_INDEX_PATH=self.path,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.author = User.objects.create_user(username="writer", password="pass")
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.public = Post.objects.create(
+            title="Django tips", body="<p>Body</p>", author=self.author
+        )
+        self.private = Post.objects.create(
+            title="Django secrets",
+            body="Body",
+            author=self.author,
+            for_subscribers=True,
+        )
+
+    def test_search_uses_index_and_respects_visibility(self):
+        self.assertIsInstance(get_search_backend(), InvertedIndexSearchBackend)
+        self.assertEqual(list(get_posts_by_query("djan", self.reader)), [self.public])
+        self.assertEqual(len(get_posts_by_query("django", self.author)), 2)
+
+    def test_changes_reach_other_processes_and_survive_restart(self):
+        get_search_backend().rebuild()
+        post = Post.objects.create(
+            title="Channels guide", body="Body", author=self.author
+        )
+        index = InvertedIndex(self.path)
+        self.addCleanup(index.base.close)
+        self.assertEqual([pk for pk, _ in index.search("channels")], [post.pk])
+
+        self.assertTrue(merge_search_index_task())
+        self.assertFalse(merge_search_index_task())
+        self.assertEqual(get_log_position(self.path)[1], 0)
+        index.refresh()
+        self.assertEqual([pk for pk, _ in index.search("channels")], [post.pk])
+
+    def test_rebuild_writes_index_file(self):
+        self.assertEqual(get_search_backend().rebuild(), 2)
+        self.assertTrue(os.path.exists(self.path))
+        self.public.delete()
+        self.assertEqual(
+            list(get_posts_by_query("django", self.author)), [self.private]
+        )
+
+
+class SearchSnippetTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="writer", password="pass")
+        filler = " ".join(["слово"] * 60)
+        self.post = Post.objects.create(
+            title="Django & signals",
+            body=f"<p>{filler}</p><p>About <strong>django</strong>&nbsp;views</p>",
+            author=self.author,
+        )
+
+    def test_body_text_is_derived_on_save(self):
+        self.assertTrue(self.post.body_text.endswith("слово About django views"))
+        self.post.body = "<p>New&amp;body</p>"
+        self.post.save(update_fields=["body"])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.body_text, "New&body")
+
+    def test_html_to_text_separates_blocks(self):
+        self.assertEqual(html_to_text("<p>one</p><p>two<br>three</p>"), "one two three")
+
+    def test_snippet_is_cut_around_match_and_escaped(self):
+        pattern = compile_highlight_pattern("Django")
+        snippet = build_snippet(self.post.body_text, pattern, length=40, context=10)
+        self.assertTrue(snippet.startswith("…"))
+        self.assertIn("<mark>django</mark>", snippet)
+        self.assertNotIn("<p>", snippet)
+        text = build_snippet("<b> djangonaut", pattern)
+        self.assertEqual(text, "&lt;b&gt; <mark>djangonaut</mark>")
+
+    def test_snippet_without_match_starts_from_beginning(self):
+        snippet = build_snippet("first words of text", None, length=11)
+        self.assertEqual(snippet, "first words…")
+
+    def test_search_page_highlights_without_loading_body(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("search_posts"), {"query": "django"})
+        self.assertContains(response, "<mark>Django</mark> &amp; signals")
+        self.assertContains(response, "<mark>django</mark> views")
+        self.assertNotContains(response, "<strong>")
+        post_selects = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("SELECT")
+            and '"blog_post"."title"' in query["sql"]
+        ]
+        self.assertTrue(post_selects)
+        for sql in post_selects:
+            self.assertNotIn('"blog_post"."body",', sql)
+
+
+class SearchFacetTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="pass")
+        self.bob = User.objects.create_user(username="bob", password="pass")
+        self.python = Category.objects.create(name="Python", description="")
+        self.web = Category.objects.create(name="Web", description="")
+        self.old = self._post("Django old", self.alice, [self.python], days=40)
+        self.new = self._post("Django new", self.alice, [self.python, self.web])
+        self.other = self._post("Django other", self.bob, [self.web])
+
+    def _post(self, title, author, categories, days=0):
+        post = Post.objects.create(
+            title=title,
+            body="Body",
+            author=author,
+            publish_date=timezone.now() - timedelta(days=days),
+        )
+        post.categories.set(categories)
+        return post
+
+    def search(self, **params):
+        return self.client.get(reverse("search_posts"), {"query": "django", **params})
+
+    def facet_counts(self, response, name):
+        return {
+            facet["value"]: facet["count"] for facet in response.context["facets"][name]
+        }
+
+    def test_parse_search_filters_skips_invalid_values(self):
+        filters = parse_search_filters(
+            {"category": " ", "author": "bob", "date_from": "2024-02-30"}
+        )
+        self.assertEqual(filters, {"author": "bob"})
+
+    def test_filters_narrow_results(self):
+        response = self.search(category=self.web.slug)
+        self.assertEqual(set(response.context["page_obj"]), {self.new, self.other})
+        response = self.search(category=self.web.slug, author="alice")
+        self.assertEqual(list(response.context["page_obj"]), [self.new])
+        since = (timezone.now() - timedelta(days=7)).date().isoformat()
+        response = self.search(author="alice", date_from=since)
+        self.assertEqual(list(response.context["page_obj"]), [self.new])
+
+    def test_date_filters_compare_with_local_day_bounds(self):
+        day = timezone.localdate() - timedelta(days=10)
+        start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+        inside = self._post("Django late", self.bob, [])
+        Post.objects.filter(pk=inside.pk).update(
+            publish_date=start + timedelta(hours=23, minutes=59)
+        )
+        outside = self._post("Django next day", self.bob, [])
+        Post.objects.filter(pk=outside.pk).update(
+            publish_date=start + timedelta(days=1)
+        )
+
+        posts = apply_search_filters(
+            Post.objects.all(), {"date_from": day, "date_to": day}
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(list(posts), [inside])
+        self.assertNotIn("cast_date", ctx.captured_queries[0]["sql"])
+
+    def test_extreme_dates_are_ignored(self):
+        filters = parse_search_filters(
+            {"date_from": "0001-01-01", "date_to": "9999-12-31"}
+        )
+        self.assertEqual(filters, {})
+        response = self.search(date_from="0001-01-01", date_to="9999-12-31")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page_obj"]), 3)
+
+        response = self.search(date_from="0001-01-02", date_to="9999-12-30")
+        self.assertEqual(len(response.context["page_obj"]), 3)
+
+    def test_facet_counts_ignore_own_filter(self):
+        response = self.search(author="alice")
+        self.assertEqual(
+            self.facet_counts(response, "categories"),
+            {self.python.slug: 2, self.web.slug: 1},
+        )
+        self.assertEqual(self.facet_counts(response, "authors"), {"alice": 2, "bob": 1})
+        selected = [
+            facet
+            for facet in response.context["facets"]["authors"]
+            if facet["selected"]
+        ]
+        self.assertEqual([facet["value"] for facet in selected], ["alice"])
+        self.assertNotIn("author=", selected[0]["query_string"])
+
+    def test_facet_query_count_does_not_depend_on_facet_values(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.search()
+        before = len(queries)
+        for number in range(5):
+            author = User.objects.create_user(username=f"author{number}")
+            category = Category.objects.create(
+                name=f"Category {number}", description=""
+            )
+            self._post(f"Django {number}", author, [category])
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.search()
+        self.assertEqual(len(queries), before)
+        self.assertEqual(len(response.context["facets"]["authors"]), 7)
+
+
+class SearchCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="writer", password="pass")
+        self.reader = User.objects.create_user(username="reader", password="pass")
+        self.post = Post.objects.create(
+            title="Django caching", body="Body", author=self.author
+        )
+
+    def search(self, query="django", user=None):
+        return list(get_posts_by_query(query, user or self.reader))
+
+    def test_repeated_search_is_served_from_cache(self):
+        self.assertEqual(self.search(), [self.post])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.search("  DJANGO "), [self.post])
+        self.assertFalse(any("blog_post_fts" in q["sql"] for q in queries))
+        self.assertFalse(any("DISTINCT" in q["sql"] for q in queries))
+        self.assertEqual(
+            get_search_cache_stats(), {"hits": 1, "misses": 1, "coalesced": 0}
+        )
+
+    def test_visibility_class_is_cached_until_subscriptions_change(self):
+        Post.objects.create(
+            title="Private", body="Body", author=self.author, for_subscribers=True
+        )
+        public = get_visibility_class(self.reader)
+        subscription = Subscription.objects.create(
+            subscriber=self.reader, author=self.author
+        )
+        subscribed = get_visibility_class(self.reader)
+        self.assertNotEqual(subscribed, public)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_visibility_class(self.reader), subscribed)
+        subscription.delete()
+        self.assertEqual(get_visibility_class(self.reader), public)
+
+    def test_post_changes_invalidate_results(self):
+        self.search()
+        other = Post.objects.create(
+            title="More django", body="Body", author=self.author
+        )
+        self.assertEqual(set(self.search()), {self.post, other})
+        other.delete()
+        self.assertEqual(self.search(), [self.post])
+
+    def test_visibility_classes(self):
+        anonymous = AnonymousUser()
+        self.assertEqual(
+            get_visibility_class(anonymous), get_visibility_class(self.reader)
+        )
+        private = Post.objects.create(
+            title="Django secrets",
+            body="Body",
+            author=self.author,
+            for_subscribers=True,
+        )
+        self.assertNotIn(private, self.search())
+        Subscription.objects.create(subscriber=self.reader, author=self.author)
+        self.assertNotEqual(
+            get_visibility_class(self.reader), get_visibility_class(anonymous)
+        )
+        self.assertEqual(
+            get_visibility_class(self.reader), get_visibility_class(self.author)
+        )
+        self.assertIn(private, self.search())
+        self.assertNotIn(private, self.search(user=anonymous))
+
+    def test_concurrent_miss_waits_for_computing_request(self):
+        query = normalize_query("django")
+        key = get_search_cache_key(query, None, get_visibility_class(self.reader))
+        cache.add(f"{key}:lock", 1)
+        posts = Post.objects.visible_to(self.reader)
+
+        def finish():
+            time.sleep(0.1)
+            cache.set(key, (get_tag_versions(["feed"]), [(self.post.pk, 1.0)]))
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        with CaptureQueriesContext(connection) as queries:
+            results = get_cached_search_results(posts, "django", self.reader)
+        thread.join()
+        self.assertEqual(results, [(self.post.pk, 1.0)])
+        self.assertFalse(any("blog_post_fts" in q["sql"] for q in queries))
+        self.assertEqual(get_search_cache_stats()["coalesced"], 1)
+
+    @override_settings(SEARCH_CACHE_WAIT=0.1)
+    def test_waiting_request_computes_after_timeout(self):
+        key = get_search_cache_key("django", None, get_visibility_class(self.reader))
+        cache.add(f"{key}:lock", 1)
+        self.assertEqual(self.search(), [self.post])
+        self.assertEqual(get_search_cache_stats()["misses"], 1)
+
+
+class QueryPlanTests(QueryPlanTestMixin, TestCase):
+    USERS = 40
+    POSTS_PER_USER = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(username=f"plan_user_{number}") for number in range(cls.USERS)
+        )
+        cls.user = users[0]
+        now = timezone.now()
+        posts = Post.objects.bulk_create(
+            Post(
+                title=f"Пост {number}",
+                body="Текст",
+                author=users[number % cls.USERS],
+                publish_date=now - timedelta(minutes=number),
+                for_subscribers=number % 3 == 0,
+            )
+            for number in range(cls.USERS * cls.POSTS_PER_USER)
+        )
+        cls.post = posts[0]
+        Comment.objects.bulk_create(
+            Comment(
+                post=post,
+                author=users[number % cls.USERS],
+                text="Комментарий",
+                approved_comment=number % 4 != 0,
+            )
+            for post in posts[:100]
+            for number in range(5)
+        )
+        Subscription.objects.bulk_create(
+            Subscription(subscriber=subscriber, author=author)
+            for author in users[:10]
+            for subscriber in users
+            if subscriber != author
+        )
+        Message.objects.bulk_create(
+            Message(
+                sender=users[number % cls.USERS],
+                recipient=users[(number * 7 + 1) % cls.USERS],
+                subject="Тема",
+                body="Текст",
+            )
+            for number in range(1000)
+        )
+        Notification.objects.bulk_create(
+            Notification(
+                user=users[number % cls.USERS],
+                sender=users[(number + 1) % cls.USERS],
+                message=f"comment:Уведомление {number}",
+                type=Notification.Type.COMMENT,
+                viewed=number % 2 == 0,
+                timestamp=now - timedelta(days=number % 200),
+            )
+            for number in range(2000)
+        )
+        cls.analyze()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_unread_count_uses_partial_index(self):
+        self.assertUsesIndex(
+            lambda: get_unread_count(self.user.pk),
+            "notification_user_unread_idx",
+            "notifications_notification",
+        )
+
+    def test_notifications_page_uses_user_index(self):
+        self.assertUsesIndex(
+            lambda: list(get_notifications_page(self.user)),
+            "notification_user_new_ts_idx",
+            "notifications_notification",
+        )
+
+    def test_retention_uses_viewed_index(self):
+        self.assertUsesIndex(
+            lambda: compact_notifications(timedelta(days=150), batch_size=50),
+            "notification_viewed_ts_idx",
+            "notifications_notification",
+        )
+
+    def test_feed_uses_date_index(self):
+        self.assertUsesIndex(
+            lambda: list(get_blog_queryset(AnonymousUser(), "-publish_date")[:5]),
+            "blog_post_visibility_date_idx",
+            "blog_post",
+        )
+
+    def test_author_posts_use_author_index(self):
+        self.assertUsesIndex(
+            lambda: list(get_user_posts(self.user)[:5]),
+            "blog_post_author_date_idx",
+            "blog_post",
+        )
+
+    def test_post_comments_use_partial_index(self):
+        self.assertUsesIndex(
+            lambda: list(get_post_comments(self.post)),
+            "blog_comment_post_date_idx",
+            "blog_comment",
+        )
+
+    def test_inbox_uses_recipient_index(self):
+        self.assertUsesIndex(
+            lambda: list(get_messages_for_user(self.user)[:5]),
+            "message_recipient_date_idx",
+            "messaging_message",
+        )
+
+    def test_sent_messages_use_sender_index(self):
+        self.assertUsesIndex(
+            lambda: list(get_sent_messages_for_user(self.user)[:5]),
+            "message_sender_date_idx",
+            "messaging_message",
+        )
+
+    def test_fan_out_uses_author_index(self):
+        self.assertUsesIndex(
+            lambda: fan_out_post_notifications(self.post.pk),
+            "subscription_author_idx",
+            "subscriptions_subscription",
+        )
@@ -0,0 +1,188 @@
+import re
+from typing import Callable, Iterable, List
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from authentication.models import Profile
+from blog.models import Category, Favorite, Post
+from subscriptions.models import Subscription
+
+query_budget_settings = override_settings(
+    COMPRESS_ENABLED=False,
+    COMPRESS_OFFLINE=False,
+)
+
+
+class QueryBudgetTestMixin:
+    """
+    Примесь для TestCase, проверяющая, что число SQL-запросов при отрисовке
+    страницы не растёт вместе с количеством объектов на ней.
+
+    Страница отрисовывается несколько раз, между замерами на неё добавляются
+    объекты. Кэш очищается перед каждым замером, чтобы считать запросы
+    холодного рендера.
+    """
+
+    def seed_feed_posts(
+        self, viewer: User, count: int, own: bool = False
+    ) -> List[Post]:
+        """
+        Создает посты разных авторов с профилями и категориями, на авторов
+        которых подписан viewer. Каждый пост лайкнут и добавлен в избранное.
+
+        args:
+            viewer (User): Пользователь, от имени которого открываются страницы.
+            count (int): Количество постов.
+            own (bool, optional): Создавать посты от имени самого viewer.
+
+        return:
+            List[Post]: Созданные посты.
+        """
+        category, _ = Category.objects.get_or_create(
+            name="Budget", defaults={"description": "Budget"}
+        )
+        start = Post.objects.count()
+        posts = []
+        for i in range(start, start + count):
+            author = viewer
+            if not own:
+                author = User.objects.create_user(
+                    username=f"budget_author_{i}", password="password"
+                )
+                Profile.objects.create(user=author)
+                Subscription.objects.create(subscriber=viewer, author=author)
+            post = Post.objects.create(
+                title=f"Budget post {i}", body="Budget body", author=author
+            )
+            post.categories.add(category)
+            post.likes.add(viewer)
+            Favorite.objects.create(user=viewer, post=post)
+            posts.append(post)
+        return posts
+
+    def count_page_queries(self, url: str) -> int:
+        """
+        Отрисовывает страницу тестовым клиентом и возвращает число запросов.
+
+        args:
+            url (str): Адрес страницы.
+
+        return:
+            int: Количество выполненных SQL-запросов.
+        """
+        cache.clear()
+        with query_budget_settings, CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertQueryCountIndependentOfPageSize(
+        self, url: str, seed: Callable[[int], Iterable], sizes=(1, 5)
+    ) -> None:
+        """
+        Проверяет, что число запросов к странице одинаково при разном
+        количестве объектов на ней.
+
+        args:
+            url (str): Адрес страницы.
+            seed (Callable[[int], Iterable]): Функция, добавляющая n объектов.
+            sizes (tuple, optional): Количества объектов на странице для замеров.
+        """
+        counts = {}
+        seeded = 0
+        for size in sizes:
+            seed(size - seeded)
+            seeded = size
+            counts[size] = self.count_page_queries(url)
+        self.assertEqual(
+            len(set(counts.values())),
+            1,
+            f"Число запросов к {url} зависит от размера страницы: {counts}",
+        )
+
+
+class QueryPlanTestMixin:
+    """
+    Примесь для TestCase, проверяющая планы запросов сервисов через EXPLAIN.
+
+    Функция сервиса выполняется целиком, для каждого SELECT, который она
+    отправила в базу, запрашивается план. Проверка падает, если нужный индекс
+    не используется или таблица читается последовательным сканированием,
+    поэтому изменение запроса или удаление индекса не пройдет незаметно.
+    Поддерживаются SQLite и PostgreSQL.
+    """
+
+    FULL_SCAN_PATTERNS = {
+        "sqlite": r"\bSCAN {table}\b(?! USING)",
+        "postgresql": r"\bSeq Scan on {table}\b",
+    }
+
+    @staticmethod
+    def analyze() -> None:
+        """
+        Обновляет статистику планировщика после заполнения таблиц.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    @staticmethod
+    def explain(sql: str) -> str:
+        """
+        Возвращает план запроса в виде текста.
+
+        args:
+            sql (str): SQL-запрос с подставленными параметрами.
+
+        return:
+            str: План запроса, строки плана разделены переводом строки.
+        """
+        prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+    def capture_query_plans(self, func: Callable[[], object]) -> List[str]:
+        """
+        Выполняет функцию и возвращает планы всех ее SELECT-запросов.
+
+        args:
+            func (Callable[[], object]): Функция, вызывающая сервис.
+
+        return:
+            List[str]: Планы запросов в порядке выполнения.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return [
+            self.explain(query["sql"])
+            for query in queries
+            if query["sql"].lstrip().upper().startswith("SELECT")
+        ]
+
+    def assertUsesIndex(
+        self, func: Callable[[], object], index_name: str, table: str
+    ) -> None:
+        """
+        Проверяет, что запросы функции используют индекс index_name и не читают
+        таблицу table последовательным сканированием.
+
+        args:
+            func (Callable[[], object]): Функция, вызывающая сервис.
+            index_name (str): Имя индекса.
+            table (str): Имя таблицы, к которой относится индекс.
+        """
+        plans = self.capture_query_plans(func)
+        report = "\n---\n".join(plans)
+        self.assertTrue(
+            any(index_name in plan for plan in plans),
+            f"Индекс {index_name} не используется:\n{report}",
+        )
+        pattern = self.FULL_SCAN_PATTERNS.get(connection.vendor)
+        if pattern is not None:
+            self.assertIsNone(
+                re.search(pattern.format(table=re.escape(table)), report),
+                f"Таблица {table} читается целиком:\n{report}",
+            )
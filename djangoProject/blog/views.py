@@ -9,17 +9,30 @@ from django.views.generic import (
     TemplateView,
     DeleteView,
 )
-from django.views.decorators.cache import cache_page
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib.auth.mixins import UserPassesTestMixin
 
+from services.page_cache import (
+    POPULAR_ORDERING,
+    POPULAR_SORT,
+    annotate_cache_versions,
+    cache_page_for_anonymous,
+    get_feed_page_tags,
+    get_feed_request_tags,
+)
 from services.paginators import GeneralPaginator
+from services.search_facets import (
+    get_search_facets,
+    get_search_query_string,
+    parse_search_filters,
+)
+from services.search_snippets import annotate_snippets
 from services.blog_services import (
     get_blog_queryset,
     get_blog_context,
     get_post_comments,
-    is_favorite_post,
+    get_viewer_relations,
     handle_comment_form,
     create_post_for_user,
     get_all_categories,
@@ -36,6 +49,7 @@ from services.blog_services import (
     get_subscribed_posts,
     toggle_favorite_post,
     get_favorite_posts,
+    register_post_view,
 )
 from .models import Post
 from .forms import PostForm, CommentForm
@@ -48,11 +62,17 @@ class BlogList(ListView):
     paginate_by = 5
     ordering = "-publish_date"
 
+    def get_ordering(self):
+        if self.request.GET.get("sort") == POPULAR_SORT:
+            return POPULAR_ORDERING
+        return self.ordering
+
     def get_queryset(self):
-        return get_blog_queryset(self.request.user, self.ordering)
+        return get_blog_queryset(self.request.user, self.get_ordering())
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        annotate_cache_versions(context["posts"])
         paginator = GeneralPaginator(context["posts"])
         page_number = self.request.GET.get("page")
         context.update(
@@ -62,7 +82,9 @@ class BlogList(ListView):
         )
         return context
 
-    @method_decorator(cache_page(60 * 15))
+    @method_decorator(
+        cache_page_for_anonymous("blog_list", get_feed_page_tags, get_feed_request_tags)
+    )
     def dispatch(self, *args, **kwargs):
         return super().dispatch(*args, **kwargs)
 
@@ -73,18 +95,23 @@ class BlogDetailView(UserPassesTestMixin, DetailView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        post = self.get_object()
+        post = self.object
+        if self.request.method == "GET":
+            register_post_view(post)
+        annotate_cache_versions([post])
         context["comments"] = get_post_comments(post)
         context["comment_form"] = CommentForm()
 
         user = self.request.user
         if user.is_authenticated:
-            context["is_favorite"] = is_favorite_post(user, post)
+            relations = get_viewer_relations(user, [post])[post.pk]
+            context["is_liked"] = relations["liked"]
+            context["is_favorite"] = relations["favorited"]
 
         return context
 
     def post(self, request, *args, **kwargs):
-        post = self.get_object()
+        self.object = post = self.get_object()
 
         if not request.user.is_authenticated:
             messages.error(
@@ -100,13 +127,9 @@ class BlogDetailView(UserPassesTestMixin, DetailView):
 
     def test_func(self):
         post = self.get_object()
-        user = self.request.user
         if not post.for_subscribers:
             return True
-        return (post.author == user) or (
-            hasattr(user, "subscriptions")
-            and user.subscriptions.filter(author=post.author).exists()
-        )
+        return Post.objects.visible_to(self.request.user).filter(pk=post.pk).exists()
 
     def handle_no_permission(self):
         post = self.get_object()
@@ -198,8 +221,19 @@ def category_posts(request, category_slug):
 
 def search_posts(request):
     query = request.GET.get("query", "")
-    posts = get_posts_by_query(query, request.user)
-    context = get_paginated_posts(request, posts)
+    filters = parse_search_filters(request.GET)
+    posts = get_posts_by_query(query, request.user, filters)
+    context = get_paginated_posts(request, posts, keep_ordering=True)
+    annotate_snippets(context["page_obj"], query)
+    context.update(
+        {
+            "filters": filters,
+            "facets": get_search_facets(
+                get_posts_by_query(query, request.user), filters, request.GET
+            ),
+            "search_query_string": get_search_query_string(request.GET),
+        }
+    )
     return render(request, "search_results.html", context)
 
 
@@ -213,7 +247,8 @@ def like_post(request, pk):
 def subscribed_posts(request):
     query = request.GET.get("query", "")
     page_number = request.GET.get("page")
-    context = get_subscribed_posts(request.user, query, page_number)
+    cursor = request.GET.get("cursor")
+    context = get_subscribed_posts(request.user, query, page_number, cursor)
     return render(request, "post/subscribed_posts.html", context)
 
 
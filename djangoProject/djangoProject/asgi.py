@@ -1,21 +1,32 @@
 import os
 from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangoProject.settings")
+
+# Приложения Django загружаются до импорта consumers, которые используют модели
+django_asgi_app = get_asgi_application()
+
 from django.urls import path
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
+from channels.security.websocket import AllowedHostsOriginValidator
 from chat.consumers import ChatConsumer
-
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
+from notifications.routing import websocket_urlpatterns as notifications_urlpatterns
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
-        # Добавляем WebSocket-маршрутизатор для обработки запросов WebSocket
-        "websocket": AuthMiddlewareStack(
-            URLRouter(
-                [
-                    path("chat/<str:room_name>/", ChatConsumer.as_asgi()),
-                ]
+        "http": django_asgi_app,
+        # Добавляем WebSocket-маршрутизатор для обработки запросов WebSocket.
+        # Соединения с Origin не из ALLOWED_HOSTS отклоняются, чтобы чужой
+        # сайт не открыл сокет с сессионной cookie пользователя.
+        "websocket": AllowedHostsOriginValidator(
+            AuthMiddlewareStack(
+                URLRouter(
+                    [
+                        path("chat/<str:room_name>/", ChatConsumer.as_asgi()),
+                        *notifications_urlpatterns,
+                    ]
+                )
             )
         ),
     }
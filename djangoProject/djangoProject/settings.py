@@ -66,9 +66,6 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "authentication.middleware.RedirectIfLoggedInMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
-    "django.middleware.cache.UpdateCacheMiddleware",
-    "django.middleware.common.CommonMiddleware",
-    "django.middleware.cache.FetchFromCacheMiddleware",
 ]
 
 ROOT_URLCONF = "djangoProject.urls"
@@ -127,9 +124,16 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Слой каналов общий для всех процессов: уведомления публикуются из веб-процессов
+# и воркеров Celery, а WebSocket-соединения держит ASGI-сервер.
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "CONFIG": {
+            "hosts": [
+                config("CHANNEL_LAYER_REDIS_URL", default="redis://127.0.0.1:6379/2")
+            ],
+        },
     },
 }
 
@@ -194,7 +198,7 @@ INTERNAL_IPS = [
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": "redis://127.0.0.1:6379/1",
+        "LOCATION": config("CACHE_REDIS_URL", default="redis://127.0.0.1:6379/1"),
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         },
@@ -202,6 +206,8 @@ CACHES = {
 }
 
 CACHE_TTL = 60 * 15
+# Время жизни записей, инвалидируемых по версиям тегов (services.cache_tags).
+CACHE_TAGGED_TTL = 60 * 60 * 24
 CACHE_MIDDLEWARE_ALIAS = "default"  # имя конфигурации кэша
 CACHE_MIDDLEWARE_SECONDS = 600  # число секунд, на которые кэшируется каждая страница
 CACHE_MIDDLEWARE_KEY_PREFIX = ""  # префикс для ключей кэша
@@ -214,3 +220,91 @@ STATICFILES_FINDERS = [
 
 COMPRESS_ENABLED = True
 COMPRESS_OFFLINE = True
+
+# Лента подписок: максимальная длина ленты пользователя и число подписчиков,
+# начиная с которого посты автора не раскладываются по лентам при публикации,
+# а подтягиваются при чтении.
+TIMELINE_MAX_LENGTH = 800
+TIMELINE_FANOUT_LIMIT = 5000
+
+# Celery: фоновые задачи, например рассылка уведомлений о новых постах.
+# При CELERY_TASK_ALWAYS_EAGER задачи выполняются в процессе без брокера.
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="redis://127.0.0.1:6379/0")
+CELERY_TASK_ALWAYS_EAGER = config("CELERY_TASK_ALWAYS_EAGER", default=False, cast=bool)
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Размер пачки подписчиков при рассылке уведомлений о новом посте и время
+# хранения прогресса рассылки в кэше. Незавершенные рассылки постов старше
+# NOTIFICATION_FANOUT_SWEEP_DELAY секунд заново ставятся в очередь задачей
+# Celery beat каждые NOTIFICATION_FANOUT_SWEEP_INTERVAL секунд.
+NOTIFICATION_FANOUT_BATCH_SIZE = 1000
+NOTIFICATION_FANOUT_PROGRESS_TTL = 60 * 60 * 24
+NOTIFICATION_FANOUT_SWEEP_DELAY = 10 * 60
+NOTIFICATION_FANOUT_SWEEP_INTERVAL = 5 * 60
+
+# Время жизни закэшированного счетчика непросмотренных уведомлений. Счетчик
+# меняется сервисами уведомлений, а после истечения пересчитывается в базе.
+NOTIFICATIONS_UNREAD_TTL = 60 * 60
+
+# Уведомления на странице, число отправителей и ключей дедупликации последних
+# событий, которые хранит объединенное уведомление, и срок, после которого
+# просмотренные уведомления удаляются или архивируются командой
+# compact_notifications.
+NOTIFICATIONS_PER_PAGE = 20
+NOTIFICATION_AGGREGATE_ACTORS = 3
+NOTIFICATION_AGGREGATE_DEDUP_KEYS = 100
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_RETENTION_BATCH_SIZE = 1000
+
+# Буфер лайков и просмотров: при включении изменения копятся в кэше
+# WRITE_BUFFER_CACHE и сбрасываются в базу задачей Celery beat каждые
+# WRITE_BUFFER_FLUSH_INTERVAL секунд или командой flush_write_buffer.
+# Переключение лайка и его сброс выполняются под блокировкой пары
+# (пост, пользователь), которая снимается сама через WRITE_BUFFER_LOCK_TIMEOUT.
+WRITE_BUFFER_ENABLED = False
+WRITE_BUFFER_CACHE = "default"
+WRITE_BUFFER_TTL = 60 * 60 * 24
+WRITE_BUFFER_FLUSH_INTERVAL = 30
+WRITE_BUFFER_FLUSH_LOCK_TIMEOUT = 60 * 5
+WRITE_BUFFER_LOCK_TIMEOUT = 5
+WRITE_BUFFER_LOCK_POLL_INTERVAL = 0.01
+
+# Полнотекстовый поиск постов: путь к классу бэкенда из services.search_backends
+# (по умолчанию выбирается по типу базы данных) и конфигурация PostgreSQL.
+SEARCH_BACKEND = None
+SEARCH_CONFIG = "russian"
+# Файл инвертированного индекса для SEARCH_BACKEND =
+# "services.search_backends.InvertedIndexSearchBackend" и число кандидатов,
+# которые индекс отдает в базу для проверки видимости.
+SEARCH_INDEX_PATH = os.path.join(BASE_DIR, "search_index", "posts.idx")
+SEARCH_INDEX_MAX_RESULTS = 1000
+# Период, с которым журнал изменений индекса объединяется с файлом индекса.
+SEARCH_INDEX_MERGE_INTERVAL = 60 * 10
+# Кэш результатов поиска: время жизни списка ID, их максимальное число,
+# время удержания блокировки вычисляющим запросом и ожидания остальных.
+SEARCH_CACHE_TTL = 60 * 5
+SEARCH_CACHE_MAX_RESULTS = 1000
+SEARCH_CACHE_LOCK_TIMEOUT = 10
+SEARCH_CACHE_WAIT = 3
+SEARCH_CACHE_POLL_INTERVAL = 0.05
+
+# Количество подсказок имен пользователей при вводе получателя сообщения.
+USER_SUGGESTIONS_LIMIT = 5
+
+# Периодические задачи Celery beat.
+CELERY_BEAT_SCHEDULE = {
+    "flush-write-buffer": {
+        "task": "blog.tasks.flush_write_buffer_task",
+        "schedule": WRITE_BUFFER_FLUSH_INTERVAL,
+    },
+    "merge-search-index": {
+        "task": "blog.tasks.merge_search_index_task",
+        "schedule": SEARCH_INDEX_MERGE_INTERVAL,
+    },
+    "sweep-post-notifications": {
+        "task": "notifications.tasks.sweep_post_notifications_task",
+        "schedule": NOTIFICATION_FANOUT_SWEEP_INTERVAL,
+    },
+}
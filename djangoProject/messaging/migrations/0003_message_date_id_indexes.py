@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('messaging', '0002_message_date_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_recipient_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_sender_date_idx',
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['recipient', '-timestamp', '-id'], name='message_recipient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', '-timestamp', '-id'], name='message_sender_date_idx'),
+        ),
+    ]
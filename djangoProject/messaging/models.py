@@ -23,6 +23,16 @@ class Message(models.Model):
     class Meta:
         verbose_name = "Сообщение"
         verbose_name_plural = "Сообщения"
+        indexes = [
+            models.Index(
+                fields=["recipient", "-timestamp", "-id"],
+                name="message_recipient_date_idx",
+            ),
+            models.Index(
+                fields=["sender", "-timestamp", "-id"],
+                name="message_sender_date_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.subject
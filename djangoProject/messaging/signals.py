@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from services.user_suggestions import add_username, invalidate_usernames
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_username(sender, instance, update_fields, **kwargs):
+    # Прежнее имя читается по первичному ключу, а не проверкой по индексу
+    # имен, чтобы сохранение профиля не строило индекс в запросе
+    instance._previous_username = None
+    if instance.pk is not None and (
+        update_fields is None or "username" in update_fields
+    ):
+        instance._previous_username = (
+            User.objects.filter(pk=instance.pk)
+            .values_list("username", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=User)
+def update_username_index(sender, instance, created, **kwargs):
+    # Индексы меняются после фиксации, чтобы откат не оставил в них имя
+    if created:
+        transaction.on_commit(lambda: add_username(instance))
+    elif getattr(instance, "_previous_username", None) not in (
+        None,
+        instance.username,
+    ):
+        transaction.on_commit(invalidate_usernames)
+
+
+@receiver(post_delete, sender=User)
+def remove_from_username_index(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_usernames)
@@ -1,18 +1,27 @@
 import unittest
-from django.test import TestCase
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.urls import reverse
 from notifications.models import Notification
 from messaging.models import Message
 from services.messaging_services import (
+    get_message_for_user,
     get_messages_for_user,
     send_message_from_user_to_user,
     get_user_suggestions_by_text,
     get_sent_messages_for_user,
 )
+from blog.tests_support import QueryBudgetTestMixin
+from services.user_suggestions import UsernameIndex
 
 
 class MessagingServicesTestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.user1 = User.objects.create_user(username="user1", password="password1")
         self.user2 = User.objects.create_user(username="user2", password="password2")
 
@@ -50,6 +59,9 @@ class MessagingServicesTestCase(TestCase):
         notifications = Notification.objects.filter(user=self.user2, sender=self.user1)
         self.assertEqual(len(notifications), 1)
         self.assertEqual(notifications[0].message, "Новое сообщение: Test Subject")
+        self.assertIn(
+            reverse("message_detail", args=[messages[0].pk]), notifications[0].html
+        )
 
     def test_get_user_suggestions_by_text(self):
         User.objects.create_user(username="user3", password="password3")
@@ -86,5 +98,151 @@ class MessagingServicesTestCase(TestCase):
         self.assertEqual(messages[1].subject, "Test Subject 1")
 
 
+class MessageListTestCase(QueryBudgetTestMixin, TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username="user1", password="password1")
+        self.user2 = User.objects.create_user(username="user2", password="password2")
+        self.client.force_login(self.user1)
+
+    def _seed(self, count, sender, recipient):
+        Message.objects.bulk_create(
+            Message(
+                sender=sender, recipient=recipient, subject="Тема", body="Текст" * 100
+            )
+            for _ in range(count)
+        )
+
+    def test_list_loads_preview_instead_of_body(self):
+        self._seed(1, self.user2, self.user1)
+        with self.assertNumQueries(1):
+            message = get_messages_for_user(self.user1)[0]
+            self.assertEqual(message.sender.username, "user2")
+        self.assertIn("body", message.get_deferred_fields())
+        self.assertEqual(len(message.body_preview), 201)
+
+        message = get_sent_messages_for_user(self.user2)[0]
+        self.assertEqual(message.recipient.username, "user1")
+        self.assertIn("body", message.get_deferred_fields())
+
+    def test_inbox_query_count_does_not_depend_on_history(self):
+        self.assertQueryCountIndependentOfPageSize(
+            reverse("inbox"),
+            lambda count: self._seed(count, self.user2, self.user1),
+            sizes=(1, 5, 50),
+        )
+
+    def test_sent_messages_query_count_does_not_depend_on_history(self):
+        self.assertQueryCountIndependentOfPageSize(
+            reverse("sent_messages"),
+            lambda count: self._seed(count, self.user1, self.user2),
+            sizes=(1, 5, 50),
+        )
+
+    def test_inbox_page_is_limited_in_database(self):
+        self._seed(20, self.user2, self.user1)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("inbox"), {"page": 2})
+        message_queries = [
+            query["sql"] for query in queries if "messaging_message" in query["sql"]
+        ]
+        self.assertTrue(any("LIMIT 5 OFFSET 5" in sql for sql in message_queries))
+
+    def test_preview_links_to_full_message(self):
+        self._seed(1, self.user2, self.user1)
+        message = Message.objects.get()
+        url = reverse("message_detail", args=[message.pk])
+        self.assertContains(self.client.get(reverse("inbox")), url)
+
+        response = self.client.get(url)
+        self.assertContains(response, message.body)
+        message.refresh_from_db()
+        self.assertTrue(message.read)
+
+        self.client.force_login(self.user2)
+        self.assertContains(self.client.get(reverse("sent_messages")), url)
+        self.assertContains(self.client.get(url), message.body)
+
+    def test_message_is_hidden_from_other_users(self):
+        self._seed(1, self.user2, self.user1)
+        message = Message.objects.get()
+        other = User.objects.create_user(username="user3", password="password3")
+        self.client.force_login(other)
+        response = self.client.get(reverse("message_detail", args=[message.pk]))
+        self.assertEqual(response.status_code, 404)
+
+        # Отправитель видит сообщение, но не отмечает его прочитанным
+        self.assertEqual(get_message_for_user(self.user2, message.pk), message)
+        message.refresh_from_db()
+        self.assertFalse(message.read)
+
+
+class UserSuggestionsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        for username in ["anna", "annabel", "joanna", "hannah", "Anastasia", "bob"]:
+            User.objects.create_user(username=username, password="password")
+
+    def test_prefix_matches_come_first(self):
+        self.assertEqual(
+            get_user_suggestions_by_text("ann"),
+            ["anna", "annabel", "hannah", "joanna"],
+        )
+        self.assertEqual(get_user_suggestions_by_text("ANA"), ["Anastasia"])
+
+    def test_limit(self):
+        self.assertEqual(
+            get_user_suggestions_by_text("a", limit=2), ["Anastasia", "anna"]
+        )
+        with override_settings(USER_SUGGESTIONS_LIMIT=3):
+            self.assertEqual(len(get_user_suggestions_by_text("a")), 3)
+
+    def test_lookup_does_not_query_database(self):
+        get_user_suggestions_by_text("warm up")
+        with CaptureQueriesContext(connection) as queries:
+            get_user_suggestions_by_text("ann")
+            get_user_suggestions_by_text("nna")
+        self.assertEqual(len(queries), 0)
+
+    def test_index_follows_user_changes(self):
+        get_user_suggestions_by_text("warm up")
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username="annette", password="password")
+        self.assertIn("annette", get_user_suggestions_by_text("annet"))
+
+        bob = User.objects.get(username="bob")
+        bob.username = "bobby"
+        with self.captureOnCommitCallbacks(execute=True):
+            bob.save()
+        self.assertEqual(get_user_suggestions_by_text("bob"), ["bobby"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bob.delete()
+        self.assertEqual(get_user_suggestions_by_text("bob"), [])
+
+    def test_user_save_does_not_load_index(self):
+        bob = User.objects.get(username="bob")
+        bob.first_name = "Bob"
+        with mock.patch(
+            "services.user_suggestions._IndexHolder._load_new"
+        ) as load, self.captureOnCommitCallbacks(execute=True) as callbacks:
+            bob.save()
+        load.assert_not_called()
+        self.assertEqual(callbacks, [])
+
+    def test_rolled_back_user_is_not_indexed(self):
+        get_user_suggestions_by_text("warm up")
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            User.objects.create_user(username="ghost", password="password")
+            raise RuntimeError
+        self.assertEqual(get_user_suggestions_by_text("ghost"), [])
+
+    def test_long_substring_uses_trigram_intersection(self):
+        index = UsernameIndex(["maria_ivanova", "ivan", "petr_ivanov", "ivana"])
+        self.assertEqual(index.suggest("ivanov", 5), ["petr_ivanov", "maria_ivanova"])
+        index.remove("petr_ivanov")
+        self.assertEqual(index.suggest("ivanov", 5), ["maria_ivanova"])
+        self.assertEqual(index.suggest("ivan", 5), ["ivan", "ivana", "maria_ivanova"])
+
+
 if __name__ == "__main__":
     unittest.main()
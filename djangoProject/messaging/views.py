@@ -4,6 +4,7 @@ from django.shortcuts import redirect, render
 from authentication.models import Profile
 from services.paginators import GeneralPaginator
 from services.messaging_services import (
+    get_message_for_user,
     get_messages_for_user,
     get_sent_messages_for_user,
     get_user_suggestions_by_text,
@@ -51,3 +52,9 @@ def sent_messages(request):
     paginator = GeneralPaginator(messages)
     page_obj = paginator.get_page(page_number)
     return render(request, "messages/sent_messages.html", {"page_obj": page_obj})
+
+
+@login_required
+def message_detail(request, message_id):
+    message = get_message_for_user(request.user, message_id)
+    return render(request, "messages/message_detail.html", {"message": message})
@@ -0,0 +1,33 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from services.notification_push import get_notifications_group
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Доставляет пользователю события о его уведомлениях.
+
+    Соединение только слушает группу пользователя и не обращается к базе
+    данных, поэтому простаивающий сокет занимает лишь место в группе слоя
+    каналов.
+    """
+
+    async def connect(self):
+        user = self.scope.get("user")
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        self.group_name = get_notifications_group(user.pk)
+
+        # Присоединение к группе пользователя
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    # Получение события от группы пользователя
+    async def notification_event(self, event):
+        await self.send(text_data=json.dumps(event["payload"]))
@@ -0,0 +1,98 @@
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from notifications.routing import websocket_urlpatterns
+from services.notification_push import get_notifications_group
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест WebSocket-уведомлений: открывает в одном процессе "
+        "заданное число простаивающих соединений NotificationConsumer через "
+        "настроенный слой каналов, замеряет память и процессорное время "
+        "на соединение и задержку доставки событий части пользователей. "
+        "База данных не используется."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sockets", type=int, default=10000)
+        parser.add_argument("--deliveries", type=int, default=100)
+        parser.add_argument("--idle", type=float, default=5.0)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        stats = asyncio.run(self._run(**options))
+        self.stdout.write(f"Соединений: {stats['sockets']}")
+        self.stdout.write(f"Открытие всех соединений, с: {stats['connect_s']:.2f}")
+        self.stdout.write(f"Память на соединение, КБ: {stats['memory_kb']:.2f}")
+        self.stdout.write(
+            f"Процессорное время за {options['idle']} с простоя, мс: "
+            f"{stats['idle_cpu_ms']:.2f}"
+        )
+        self.stdout.write(f"Доставка p50, мс: {stats['p50_ms']:.2f}")
+        self.stdout.write(f"Доставка p99, мс: {stats['p99_ms']:.2f}")
+
+    async def _run(self, sockets, deliveries, idle, batch_size, **options):
+        application = URLRouter(websocket_urlpatterns)
+        channel_layer = get_channel_layer()
+
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        communicators = []
+        for offset in range(0, sockets, batch_size):
+            batch = [
+                self._communicator(application, user_id)
+                for user_id in range(offset + 1, min(offset + batch_size, sockets) + 1)
+            ]
+            results = await asyncio.gather(*(c.connect(timeout=30) for c in batch))
+            if not all(connected for connected, _ in results):
+                raise RuntimeError("Не удалось открыть соединение")
+            communicators += batch
+        connect_s = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0] - memory_before
+        tracemalloc.stop()
+
+        cpu_start = time.process_time()
+        await asyncio.sleep(idle)
+        idle_cpu_ms = (time.process_time() - cpu_start) * 1000
+
+        step = max(sockets // max(deliveries, 1), 1)
+        timings = []
+        for communicator in communicators[::step][:deliveries]:
+            start = time.perf_counter()
+            await channel_layer.group_send(
+                get_notifications_group(communicator.scope["user"].pk),
+                {"type": "notification.event", "payload": {"event": "ping"}},
+            )
+            await communicator.receive_from(timeout=5)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        for offset in range(0, len(communicators), batch_size):
+            await asyncio.gather(
+                *(c.disconnect() for c in communicators[offset : offset + batch_size])
+            )
+
+        timings.sort()
+        return {
+            "sockets": len(communicators),
+            "connect_s": connect_s,
+            "memory_kb": memory / max(len(communicators), 1) / 1024,
+            "idle_cpu_ms": idle_cpu_ms,
+            "p50_ms": statistics.median(timings) if timings else 0.0,
+            "p99_ms": timings[int(len(timings) * 0.99)] if timings else 0.0,
+        }
+
+    @staticmethod
+    def _communicator(application, user_id):
+        communicator = WebsocketCommunicator(application, "/ws/notifications/")
+        communicator.scope["user"] = User(pk=user_id, username=f"user{user_id}")
+        return communicator
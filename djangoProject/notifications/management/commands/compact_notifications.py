@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from services.notifications_services import compact_notifications
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет или архивирует просмотренные уведомления старше заданного "
+        "количества дней. Уведомления обрабатываются ограниченными пачками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.NOTIFICATION_RETENTION_DAYS
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.NOTIFICATION_RETENTION_BATCH_SIZE
+        )
+        parser.add_argument("--archive", action="store_true")
+
+    def handle(self, *args, **options):
+        processed = compact_notifications(
+            timedelta(days=options["days"]),
+            batch_size=options["batch_size"],
+            archive=options["archive"],
+        )
+        action = "Архивировано" if options["archive"] else "Удалено"
+        self.stdout.write(self.style.SUCCESS(f"{action} уведомлений: {processed}"))
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from services.notifications_services import reconcile_unread_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Сверяет закэшированные счетчики непросмотренных уведомлений с базой "
+        "и исправляет расхождения. Пользователи обрабатываются диапазонами id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        max_id = User.objects.aggregate(max_id=Max("id"))["max_id"] or 0
+
+        fixed = 0
+        for start_id in range(1, max_id + 1, chunk_size):
+            fixed += reconcile_unread_counts(start_id, start_id + chunk_size)
+        self.stdout.write(self.style.SUCCESS(f"Исправлено счетчиков: {fixed}"))
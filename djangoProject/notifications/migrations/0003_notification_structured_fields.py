@@ -0,0 +1,46 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0002_notification_dedup_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='html',
+            field=models.TextField(blank=True, default='', verbose_name='HTML'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_content_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='target_object_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='text',
+            field=models.CharField(max_length=255, null=True, verbose_name='Текст'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('comment', 'Новый комментарий'), ('post', 'Новый пост'), ('message', 'Новое сообщение'), ('subscription', 'Новый подписчик')], max_length=255, null=True, verbose_name='Тип'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_new', '-id'], name='notification_user_new_idx'),
+        ),
+    ]
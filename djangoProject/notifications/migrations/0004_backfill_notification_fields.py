@@ -0,0 +1,51 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:24
+
+from django.db import migrations
+from django.utils.html import escape, strip_tags
+
+BATCH_SIZE = 1000
+
+
+def parse_message(message):
+    prefix, _, text = message.partition(':')
+    text = text.strip()
+    if prefix == 'Новый комментарий':
+        return 'comment', text, escape(text)
+    if prefix == 'Новый пост':
+        return 'post', strip_tags(text), text
+    if prefix == 'Новое сообщение':
+        return 'message', text, escape(text)
+    if prefix.startswith('Пользователь ') and prefix.endswith('подписался на ваши обновления'):
+        return 'subscription', prefix, escape(prefix)
+    return prefix[:255], text, escape(text)
+
+
+def backfill_notification_fields(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    last_id = 0
+    while True:
+        batch = list(
+            Notification.objects.filter(type__isnull=True, pk__gt=last_id)
+            .only('pk', 'message')
+            .order_by('pk')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for notification in batch:
+            type, text, html = parse_message(notification.message)
+            notification.type = type
+            notification.text = text[:255]
+            notification.html = html
+        Notification.objects.bulk_update(batch, ['type', 'text', 'html'])
+        last_id = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_structured_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_notification_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.3 on 2026-10-18 11:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0004_backfill_notification_fields'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notification_user_new_idx',
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='actors',
+            field=models.JSONField(blank=True, default=list, verbose_name='Последние отправители'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='count',
+            field=models.PositiveIntegerField(default=1, verbose_name='Количество событий'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='group_key',
+            field=models.CharField(blank=True, max_length=64, null=True, verbose_name='Ключ группировки'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('is_new', True)), fields=['user', '-timestamp', '-id'], name='notification_user_new_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('viewed', True)), fields=['timestamp'], name='notification_viewed_ts_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('viewed', False)), fields=('user', 'group_key'), name='notification_user_open_group_uniq'),
+        ),
+    ]
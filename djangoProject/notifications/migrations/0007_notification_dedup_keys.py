@@ -0,0 +1,18 @@
+# Generated by Django 5.0.3 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_notification_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dedup_keys',
+            field=models.JSONField(blank=True, default=list, verbose_name='Объединенные ключи дедупликации'),
+        ),
+    ]
@@ -1,9 +1,18 @@
 from django.db import models
 from django.utils import timezone
+from django.utils.html import escape
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 
 
 class Notification(models.Model):
+    class Type(models.TextChoices):
+        COMMENT = "comment", "Новый комментарий"
+        POST = "post", "Новый пост"
+        MESSAGE = "message", "Новое сообщение"
+        SUBSCRIPTION = "subscription", "Новый подписчик"
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -21,15 +30,75 @@ class Notification(models.Model):
         max_length=255, default="", verbose_name="Имя отправителя"
     )
     message = models.TextField(verbose_name="Сообщение")
-    text = models.CharField(max_length=255, null=True)
-    type = models.CharField(max_length=255, null=True)
+    text = models.CharField(max_length=255, null=True, verbose_name="Текст")
+    type = models.CharField(
+        max_length=255, null=True, choices=Type.choices, verbose_name="Тип"
+    )
+    target_content_type = models.ForeignKey(
+        ContentType, on_delete=models.CASCADE, null=True, blank=True
+    )
+    target_object_id = models.PositiveBigIntegerField(null=True, blank=True)
+    target = GenericForeignKey("target_content_type", "target_object_id")
+    html = models.TextField(blank=True, default="", verbose_name="HTML")
     timestamp = models.DateTimeField(default=timezone.now, verbose_name="Дата и время")
     is_new = models.BooleanField(default=True, verbose_name="Новое уведомление")
     viewed = models.BooleanField(default=False, verbose_name="Просмотрено")
+    dedup_key = models.CharField(
+        max_length=64, null=True, blank=True, verbose_name="Ключ дедупликации"
+    )
+    group_key = models.CharField(
+        max_length=64, null=True, blank=True, verbose_name="Ключ группировки"
+    )
+    count = models.PositiveIntegerField(default=1, verbose_name="Количество событий")
+    actors = models.JSONField(
+        default=list, blank=True, verbose_name="Последние отправители"
+    )
+    dedup_keys = models.JSONField(
+        default=list, blank=True, verbose_name="Объединенные ключи дедупликации"
+    )
 
     class Meta:
         verbose_name = "Уведомление"
         verbose_name_plural = "Уведомления"
+        indexes = [
+            models.Index(
+                fields=["user", "-timestamp", "-id"],
+                name="notification_user_new_ts_idx",
+                condition=models.Q(is_new=True),
+            ),
+            models.Index(
+                fields=["timestamp"],
+                name="notification_viewed_ts_idx",
+                condition=models.Q(viewed=True),
+            ),
+            models.Index(
+                fields=["user"],
+                name="notification_user_unread_idx",
+                condition=models.Q(viewed=False),
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "dedup_key"],
+                name="notification_user_dedup_key_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["user", "group_key"],
+                name="notification_user_open_group_uniq",
+                condition=models.Q(viewed=False),
+            ),
+        ]
 
     def __str__(self):
         return self.message
+
+    @property
+    def other_actors_count(self) -> int:
+        return self.count - len(self.actors)
+
+    def save(self, *args, **kwargs):
+        if self.type is None:
+            self.type, _, text = self.message.partition(":")
+            self.text = text.strip()[:255]
+            self.html = escape(text.strip())
+        super().save(*args, **kwargs)
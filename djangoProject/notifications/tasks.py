@@ -0,0 +1,37 @@
+from celery import shared_task
+from django.db import DatabaseError
+
+from services.notifications_services import (
+    fan_out_post_notifications,
+    get_unfinished_post_fan_outs,
+)
+
+
+@shared_task(
+    autoretry_for=(DatabaseError,),
+    retry_backoff=True,
+    max_retries=5,
+    acks_late=True,
+)
+def fan_out_post_notifications_task(post_id: int) -> int:
+    """
+    Фоновая рассылка уведомлений о новом посте подписчикам автора.
+
+    При ошибке базы данных задача повторяется с нарастающей задержкой
+    и продолжает рассылку с сохраненного прогресса.
+    """
+    return fan_out_post_notifications(post_id)
+
+
+@shared_task(ignore_result=True)
+def sweep_post_notifications_task() -> int:
+    """
+    Периодически ставит в очередь рассылки уведомлений о постах, которые
+    не были поставлены при публикации или прервались.
+
+    Запускается Celery beat по расписанию CELERY_BEAT_SCHEDULE.
+    """
+    post_ids = get_unfinished_post_fan_outs()
+    for post_id in post_ids:
+        fan_out_post_notifications_task.delay(post_id)
+    return len(post_ids)
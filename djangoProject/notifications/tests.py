@@ -1,7 +1,30 @@
+import asyncio
+import importlib
+from datetime import timedelta
+from io import StringIO
 import unittest
-from django.test import TestCase
+from unittest import mock
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
 from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+from blog.context_processors import notifications_count
+from blog.models import Post
 from notifications.models import Notification
+from notifications.routing import websocket_urlpatterns
+from notifications.tasks import (
+    fan_out_post_notifications_task,
+    sweep_post_notifications_task,
+)
+from services.blog_services import create_post_for_user
 from services.notifications_services import (
     get_notifications_for_user,
     get_not_viewed_count_for_user,
@@ -9,11 +32,20 @@ from services.notifications_services import (
     delete_all_notifications_for_user,
     mark_notification_as_viewed,
     mark_all_notifications_as_viewed,
+    fan_out_post_notifications,
+    get_post_fan_out_progress,
+    build_notification,
+    get_unread_count,
+    send_notification,
+    compact_notifications,
 )
+from services.notification_push import get_notifications_group
+from subscriptions.models import Subscription
 
 
 class NotificationServicesTestCase(TestCase):
     def setUp(self):
+        cache.clear()
         self.user1 = User.objects.create_user(username="user1", password="password1")
         self.user2 = User.objects.create_user(username="user2", password="password2")
 
@@ -82,5 +114,492 @@ class NotificationServicesTestCase(TestCase):
             self.assertTrue(notification.viewed)
 
 
+class PostFanOutTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="author")
+        self.subscribers = [
+            User.objects.create_user(username=f"subscriber{number}")
+            for number in range(5)
+        ]
+        Subscription.objects.bulk_create(
+            Subscription(subscriber=subscriber, author=self.author)
+            for subscriber in self.subscribers
+        )
+        self.post = Post.objects.create(title="Post", body="Body", author=self.author)
+
+    def test_fan_out_notifies_every_subscriber_in_batches(self):
+        self.assertEqual(fan_out_post_notifications(self.post.pk, batch_size=2), 5)
+        self.assertEqual(
+            set(Notification.objects.values_list("user_id", flat=True)),
+            {subscriber.pk for subscriber in self.subscribers},
+        )
+        progress = get_post_fan_out_progress(self.post.pk)
+        self.assertEqual(progress["status"], "done")
+        self.assertEqual(progress["processed"], 5)
+
+    def test_retry_resumes_without_duplicates(self):
+        Notification.objects.create(
+            user=self.subscribers[0],
+            sender=self.author,
+            message="Новый пост",
+            dedup_key=f"post:{self.post.pk}",
+        )
+        cache.set(
+            f"fanout:post:{self.post.pk}",
+            {"status": "running", "processed": 2, "last_id": self.subscribers[1].pk},
+        )
+        self.assertEqual(fan_out_post_notifications(self.post.pk, batch_size=2), 3)
+        self.assertEqual(fan_out_post_notifications(self.post.pk), 0)
+        cache.clear()
+        fan_out_post_notifications(self.post.pk)
+        self.assertEqual(Notification.objects.count(), 5)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_create_post_enqueues_fan_out_after_commit(self):
+        request = RequestFactory().post("/", {"title": "New", "body": "Body"})
+        request.user = self.author
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            create_post_for_user(request)
+        self.assertEqual(Notification.objects.count(), 0)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Notification.objects.count(), 5)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True)
+    def test_sweep_fans_out_posts_missed_when_broker_is_down(self):
+        request = RequestFactory().post("/", {"title": "New", "body": "Body"})
+        request.user = self.author
+
+        apply_async = mock.patch.object(
+            fan_out_post_notifications_task,
+            "apply_async",
+            side_effect=OperationalError("broker is down"),
+        )
+        with apply_async, self.assertLogs("services.blog_services", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                create_post_for_user(request)
+        post = Post.objects.get(title="New")
+        self.assertEqual(Notification.objects.filter(text="New").count(), 0)
+
+        # Свежие посты не трогаются, пока их задача может быть в очереди
+        self.assertEqual(sweep_post_notifications_task(), 0)
+        Post.objects.filter(pk=post.pk).update(
+            publish_date=timezone.now() - timedelta(minutes=15)
+        )
+        Post.objects.filter(pk=self.post.pk).update(
+            publish_date=timezone.now() - timedelta(days=2)
+        )
+        self.assertEqual(sweep_post_notifications_task(), 1)
+        self.assertEqual(Notification.objects.filter(text="New").count(), 5)
+        self.assertEqual(sweep_post_notifications_task(), 0)
+
+
+class StructuredNotificationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user")
+        self.sender = User.objects.create_user(username="sender")
+
+    def test_build_notification_stores_structured_fields(self):
+        post = Post.objects.create(title="Post", body="Body", author=self.user)
+        notification = build_notification(
+            self.user.pk,
+            self.sender,
+            Notification.Type.COMMENT,
+            "Время: 12:30 <b>",
+            target=post,
+            url="/post/1/",
+        )
+        notification.save()
+        notification.refresh_from_db()
+        self.assertEqual(notification.type, "comment")
+        self.assertEqual(notification.get_type_display(), "Новый комментарий")
+        self.assertEqual(notification.text, "Время: 12:30 <b>")
+        self.assertEqual(
+            notification.html, '<a href="/post/1/">Время: 12:30 &lt;b&gt;</a>'
+        )
+        self.assertEqual(notification.target, post)
+
+    def test_reading_notifications_is_a_single_query(self):
+        for number in range(3):
+            build_notification(
+                self.user.pk, self.sender, Notification.Type.MESSAGE, f"a:b:{number}"
+            ).save()
+        with self.assertNumQueries(1):
+            notifications = list(get_notifications_for_user(self.user))
+        self.assertEqual(notifications[0].text, "a:b:2")
+
+    def test_backfill_parses_legacy_messages(self):
+        migration = importlib.import_module(
+            "notifications.migrations.0004_backfill_notification_fields"
+        )
+        self.assertEqual(
+            migration.parse_message("Новый комментарий: Время: 12:30"),
+            ("comment", "Время: 12:30", "Время: 12:30"),
+        )
+        self.assertEqual(
+            migration.parse_message("Новый пост: <a href='/post/1/'>Title</a>"),
+            ("post", "Title", "<a href='/post/1/'>Title</a>"),
+        )
+        self.assertEqual(
+            migration.parse_message(
+                "Пользователь bob подписался на ваши обновления: -"
+            )[:2],
+            ("subscription", "Пользователь bob подписался на ваши обновления"),
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
+
+
+class UnreadCountTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user")
+        self.sender = User.objects.create_user(username="sender")
+
+    def _send(self):
+        return send_notification(
+            build_notification(
+                self.user.pk, self.sender, Notification.Type.MESSAGE, "Тема"
+            )
+        )
+
+    def test_warm_counter_needs_no_queries(self):
+        self._send()
+        request = RequestFactory().get("/")
+        request.user = self.user
+        self.assertEqual(notifications_count(request)["notifications_count"], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications_count(request)["notifications_count"], 1)
+
+    def test_counter_follows_send_view_and_delete(self):
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+        first = self._send()
+        second = self._send()
+        third = self._send()
+        self.assertEqual(get_unread_count(self.user.pk), 3)
+
+        mark_notification_as_viewed(self.user, first.pk)
+        mark_notification_as_viewed(self.user, first.pk)
+        self.assertEqual(get_unread_count(self.user.pk), 2)
+
+        delete_notification_for_user(self.user, first.pk)
+        delete_notification_for_user(self.user, second.pk)
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+
+        mark_all_notifications_as_viewed(self.user)
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+        self._send()
+        delete_all_notifications_for_user(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.pk), 0)
+        self.assertFalse(Notification.objects.filter(pk=third.pk).exists())
+
+    def test_missing_counter_is_recounted(self):
+        self._send()
+        Notification.objects.create(user=self.user, sender=self.sender, message="x")
+        self.assertEqual(get_unread_count(self.user.pk), 2)
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_unread_count(self.user.pk), 2)
+
+    def test_fan_out_invalidates_counters(self):
+        Subscription.objects.create(subscriber=self.user, author=self.sender)
+        post = Post.objects.create(title="Post", body="Body", author=self.sender)
+        self.assertEqual(get_unread_count(self.user.pk), 0)
+        fan_out_post_notifications(post.pk)
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+
+    def test_reconcile_fixes_drifted_counters(self):
+        self._send()
+        get_unread_count(self.sender.pk)
+        Notification.objects.create(user=self.user, sender=self.sender, message="x")
+        call_command("reconcile_notification_counters", chunk_size=1, stdout=StringIO())
+        self.assertEqual(get_unread_count(self.user.pk), 2)
+        self.assertEqual(get_unread_count(self.sender.pk), 0)
+
+
+class NotificationPushTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user")
+        self.sender = User.objects.create_user(username="sender")
+        self.layer = get_channel_layer()
+        async_to_sync(self.layer.flush)()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(
+            get_notifications_group(self.user.pk), self.channel
+        )
+        get_unread_count(self.user.pk)
+
+    def _receive(self):
+        async def receive():
+            return await asyncio.wait_for(self.layer.receive(self.channel), 1)
+
+        return async_to_sync(receive)()["payload"]
+
+    def _send(self):
+        return send_notification(
+            build_notification(
+                self.user.pk, self.sender, Notification.Type.MESSAGE, "<Тема>"
+            )
+        )
+
+    def test_send_notification_publishes_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            notification = self._send()
+        self.assertEqual(len(callbacks), 1)
+        with self.assertRaises(asyncio.TimeoutError):
+            self._receive()
+
+        callbacks[0]()
+        payload = self._receive()
+        self.assertEqual(payload["event"], "created")
+        self.assertEqual(payload["unread_count"], 1)
+        self.assertEqual(payload["notification"]["id"], notification.pk)
+        self.assertEqual(payload["notification"]["html"], "&lt;Тема&gt;")
+        self.assertEqual(payload["notification"]["sender_name"], "sender")
+
+    def test_view_and_delete_publish_unread_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self._send()
+            second = self._send()
+        self._receive()
+        self._receive()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_notification_as_viewed(self.user, first.pk)
+        self.assertEqual(
+            self._receive(), {"event": "viewed", "id": first.pk, "unread_count": 1}
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            delete_notification_for_user(self.user, second.pk)
+        self.assertEqual(
+            self._receive(), {"event": "deleted", "id": second.pk, "unread_count": 0}
+        )
+
+    def test_fan_out_publishes_to_each_subscriber(self):
+        Subscription.objects.create(subscriber=self.user, author=self.sender)
+        post = Post.objects.create(title="Пост", body="Текст", author=self.sender)
+        with self.captureOnCommitCallbacks(execute=True):
+            fan_out_post_notifications(post.pk)
+        payload = self._receive()
+        self.assertEqual(payload["event"], "created")
+        self.assertEqual(payload["notification"]["type"], Notification.Type.POST)
+        self.assertIsNone(payload["unread_count"])
+
+    def test_resumed_fan_out_publishes_only_new_rows(self):
+        Subscription.objects.create(subscriber=self.user, author=self.sender)
+        post = Post.objects.create(title="Пост", body="Текст", author=self.sender)
+        with self.captureOnCommitCallbacks(execute=True):
+            fan_out_post_notifications(post.pk)
+        self._receive()
+
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            fan_out_post_notifications(post.pk)
+        with self.assertRaises(asyncio.TimeoutError):
+            self._receive()
+
+    def test_channel_layer_error_does_not_fail_request(self):
+        group_send = mock.patch.object(
+            self.layer, "group_send", side_effect=ConnectionError("redis is down")
+        )
+        with group_send, self.assertLogs("services.notification_push", "ERROR"):
+            with self.captureOnCommitCallbacks(execute=True):
+                notification = self._send()
+        self.assertTrue(Notification.objects.filter(pk=notification.pk).exists())
+
+
+class NotificationConsumerTestCase(SimpleTestCase):
+    def setUp(self):
+        async_to_sync(get_channel_layer().flush)()
+
+    def _communicator(self, user):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), "/ws/notifications/"
+        )
+        communicator.scope["user"] = user
+        return communicator
+
+    async def test_anonymous_connection_is_rejected(self):
+        communicator = self._communicator(AnonymousUser())
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+    async def test_user_receives_events_of_own_group_only(self):
+        own = self._communicator(User(pk=1, username="user1"))
+        other = self._communicator(User(pk=2, username="user2"))
+        self.assertTrue((await own.connect())[0])
+        self.assertTrue((await other.connect())[0])
+
+        await get_channel_layer().group_send(
+            get_notifications_group(1),
+            {"type": "notification.event", "payload": {"event": "viewed", "id": 5}},
+        )
+        self.assertEqual(await own.receive_json_from(), {"event": "viewed", "id": 5})
+        self.assertTrue(await other.receive_nothing())
+
+        await own.disconnect()
+        await other.disconnect()
+
+    async def _connect_with_origin(self, origin):
+        from djangoProject.asgi import application
+
+        # Чат принимает любое соединение, поэтому результат зависит только
+        # от проверки Origin
+        communicator = WebsocketCommunicator(
+            application, "/chat/room/", headers=[(b"origin", origin)]
+        )
+        connected, _ = await communicator.connect()
+        if connected:
+            await communicator.disconnect()
+        return connected
+
+    @override_settings(ALLOWED_HOSTS=["testserver"])
+    async def test_foreign_origin_is_rejected(self):
+        self.assertFalse(await self._connect_with_origin(b"http://evil.example"))
+        self.assertTrue(await self._connect_with_origin(b"http://testserver"))
+
+    def test_socket_benchmark_runs(self):
+        out = StringIO()
+        call_command(
+            "benchmark_notification_sockets",
+            sockets=20,
+            deliveries=5,
+            idle=0,
+            stdout=out,
+        )
+        self.assertIn("Соединений: 20", out.getvalue())
+
+
+class NotificationAggregationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="user", password="password")
+        self.senders = [
+            User.objects.create_user(username=f"sender{number}") for number in range(3)
+        ]
+
+    def _send(self, sender, text="Комментарий", dedup_key=None, group_key="group"):
+        return send_notification(
+            build_notification(
+                self.user.pk,
+                sender,
+                Notification.Type.COMMENT,
+                text,
+                dedup_key=dedup_key,
+                group_key=group_key,
+            )
+        )
+
+    @override_settings(NOTIFICATION_AGGREGATE_ACTORS=2)
+    def test_events_of_one_group_collapse_into_one_row(self):
+        for number, sender in enumerate(self.senders + [self.senders[0]]):
+            self._send(sender, text=f"Комментарий {number}")
+
+        notification = Notification.objects.get(user=self.user)
+        self.assertEqual(notification.count, 4)
+        self.assertEqual(notification.actors, ["sender0", "sender2"])
+        self.assertEqual(notification.text, "Комментарий 3")
+        self.assertEqual(notification.other_actors_count, 2)
+        self.assertEqual(get_unread_count(self.user.pk), 1)
+
+        self._send(self.senders[0], group_key="other")
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(get_unread_count(self.user.pk), 2)
+
+    def test_viewed_row_is_not_reused(self):
+        first = self._send(self.senders[0])
+        mark_notification_as_viewed(self.user, first.pk)
+        second = self._send(self.senders[1])
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertEqual(second.count, 1)
+
+    def test_repeated_event_is_counted_once(self):
+        self._send(self.senders[0], dedup_key="comment:1")
+        self._send(self.senders[0], dedup_key="comment:1")
+        self.assertEqual(Notification.objects.get().count, 1)
+
+        Notification.objects.update(viewed=True)
+        self._send(self.senders[0], dedup_key="comment:1")
+        self.assertEqual(Notification.objects.count(), 1)
+
+    @override_settings(NOTIFICATION_AGGREGATE_DEDUP_KEYS=2)
+    def test_retried_earlier_event_is_counted_once(self):
+        for key in ["comment:1", "comment:2", "comment:1"]:
+            self._send(self.senders[0], dedup_key=key)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.count, 2)
+        self.assertEqual(notification.dedup_keys, ["comment:2", "comment:1"])
+
+        # Ключи старше окна не хранятся
+        self._send(self.senders[0], dedup_key="comment:3")
+        self._send(self.senders[0], dedup_key="comment:1")
+        self.assertEqual(Notification.objects.get().count, 4)
+
+    def test_compact_deletes_old_viewed_notifications_in_batches(self):
+        old = timezone.now() - timedelta(days=100)
+        for number in range(5):
+            Notification.objects.create(
+                user=self.user,
+                sender=self.senders[0],
+                message=f"Старое {number}",
+                viewed=True,
+                timestamp=old,
+            )
+        unviewed = Notification.objects.create(
+            user=self.user, sender=self.senders[0], message="Новое", timestamp=old
+        )
+        recent = Notification.objects.create(
+            user=self.user, sender=self.senders[0], message="Свежее", viewed=True
+        )
+
+        with self.assertNumQueries(6):
+            self.assertEqual(compact_notifications(timedelta(days=90), 2), 5)
+        self.assertEqual(
+            set(Notification.objects.values_list("pk", flat=True)),
+            {unviewed.pk, recent.pk},
+        )
+
+    def test_compact_can_archive_instead_of_deleting(self):
+        notification = Notification.objects.create(
+            user=self.user,
+            sender=self.senders[0],
+            message="Старое",
+            viewed=True,
+            timestamp=timezone.now() - timedelta(days=100),
+        )
+        out = StringIO()
+        call_command("compact_notifications", "--archive", stdout=out)
+        self.assertIn("Архивировано уведомлений: 1", out.getvalue())
+        notification.refresh_from_db()
+        self.assertFalse(notification.is_new)
+        self.assertNotIn(notification, get_notifications_for_user(self.user))
+
+    @override_settings(
+        NOTIFICATIONS_PER_PAGE=2, COMPRESS_ENABLED=False, COMPRESS_OFFLINE=False
+    )
+    def test_notifications_page_uses_cursor_pagination(self):
+        now = timezone.now()
+        for number in range(5):
+            Notification.objects.create(
+                user=self.user,
+                sender=self.senders[0],
+                message=f"Уведомление {number}",
+                timestamp=now - timedelta(minutes=number),
+            )
+        self.client.force_login(self.user)
+
+        texts = []
+        cursor = ""
+        for _ in range(3):
+            response = self.client.get(reverse("notifications"), {"cursor": cursor})
+            page = response.context["page_obj"]
+            texts += [notification.message for notification in page]
+            cursor = page.next_cursor
+        self.assertEqual(texts, [f"Уведомление {number}" for number in range(5)])
+        self.assertIsNone(cursor)
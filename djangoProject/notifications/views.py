@@ -2,7 +2,7 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden
 from django.shortcuts import redirect, render
 from services.notifications_services import (
-    get_notifications_for_user,
+    get_notifications_page,
     get_not_viewed_count_for_user,
     delete_notification_for_user,
     delete_all_notifications_for_user,
@@ -13,13 +13,17 @@ from services.notifications_services import (
 
 @login_required
 def notifications(request):
-    user_notifications = get_notifications_for_user(request.user)
+    page_obj = get_notifications_page(request.user, request.GET.get("cursor"))
     not_viewed_count = get_not_viewed_count_for_user(request.user)
 
     return render(
         request,
         "notification/notifications.html",
-        {"notifications": user_notifications, "notifications_count": not_viewed_count},
+        {
+            "notifications": page_obj,
+            "page_obj": page_obj,
+            "notifications_count": not_viewed_count,
+        },
     )
 
 
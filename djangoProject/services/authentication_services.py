@@ -1,8 +1,8 @@
-from typing import List, Optional
+from typing import Optional
 
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from django.db.models import Q, QuerySet
+from django.db.models import QuerySet
 from django.http import HttpRequest
 from django.shortcuts import get_object_or_404
 
@@ -98,7 +98,7 @@ def get_user_posts(user: User) -> QuerySet[Post]:
     return:
         QuerySet[Post]: Запрос, содержащий посты пользователя.
     """
-    return Post.objects.filter(author=user).order_by("-publish_date")
+    return Post.objects.filter(author=user).for_feed().order_by("-publish_date")
 
 
 def get_user_subscriptions(user: User) -> QuerySet[int]:
@@ -160,20 +160,15 @@ def get_user_profile(user_name: str) -> Profile:
     return get_object_or_404(User, username=user_name).profile
 
 
-def filter_user_posts(
-    user_posts: QuerySet[Post], user: User, subscribed_authors: List[int]
-) -> QuerySet[Post]:
+def filter_user_posts(user_posts: QuerySet[Post], user: User) -> QuerySet[Post]:
     """
     Фильтрует посты пользователя в зависимости от статуса подписки.
 
     args:
         user_posts (QuerySet[Post]): Набор постов пользователя для фильтрации.
         user (User): Пользователь, для которого выполняется фильтрация.
-        subscribed_authors (List[int]): Список ID авторов, на которых подписан пользователь.
 
     return:
         QuerySet[Post]: Отфильтрованный набор постов.
     """
-    return user_posts.filter(
-        Q(for_subscribers=False) | Q(author__id__in=subscribed_authors) | Q(author=user)
-    )
+    return user_posts.visible_to(user)
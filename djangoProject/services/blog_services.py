@@ -1,5 +1,17 @@
-from typing import Any, Dict
-from django.db.models import QuerySet, Q
+import logging
+from typing import Any, Dict, Iterable, Optional, Tuple
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    QuerySet,
+    Q,
+    Subquery,
+)
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.http import Http404
 from django.shortcuts import reverse, get_object_or_404
@@ -7,8 +19,29 @@ from django.shortcuts import reverse, get_object_or_404
 from blog.models import Post, Comment, Category, Favorite
 from blog.forms import CommentForm, PostForm
 from notifications.models import Notification
+from notifications.tasks import fan_out_post_notifications_task
+from services.notifications_services import build_notification, send_notification
 from subscriptions.models import Subscription
+from services.cache_tags import POPULARITY_TAG, bump_tags, post_tag
 from services.paginators import GeneralPaginator
+from services.search_backends import (
+    SEARCH_RANK_ANNOTATION,
+    filter_by_results,
+    get_search_backend,
+)
+from services.search_cache import get_cached_search_results
+from services.search_facets import apply_search_filters
+from services.timeline_services import get_timeline_posts
+from services.write_buffer import (
+    buffer_like_toggle,
+    buffer_post_view,
+    get_like_states,
+    get_pending_like_delta,
+    get_pending_view_delta,
+    is_write_buffer_enabled,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def get_blog_queryset(user: User, ordering: str) -> QuerySet[Post]:
@@ -22,17 +55,7 @@ def get_blog_queryset(user: User, ordering: str) -> QuerySet[Post]:
     return:
             QuerySet[Post]: QuerySet постов.
     """
-    queryset = Post.objects.all()
-    if user.is_authenticated:
-        subscribed_authors = user.subscriptions.values_list("author__id", flat=True)
-        queryset = queryset.filter(
-            Q(for_subscribers=False)
-            | Q(author__id__in=subscribed_authors)
-            | Q(author=user)
-        ).order_by(ordering)
-    else:
-        queryset = queryset.filter(for_subscribers=False).order_by(ordering)
-    return queryset
+    return Post.objects.visible_to(user).for_feed().order_by(ordering, "-publish_date")
 
 
 def get_blog_context(
@@ -51,19 +74,66 @@ def get_blog_context(
             Dict[str, Any]: Контекст данных.
     """
     page_obj = paginator.get_page(page_number)
-    context = {"posts": page_obj}
+    return {"posts": page_obj}
+
+
+def get_viewer_relations(
+    user: User, posts: Iterable[Post]
+) -> Dict[int, Dict[str, bool]]:
+    """
+    Определяет одним запросом отношение пользователя к постам страницы:
+    подписан ли он на автора, лайкнул ли пост и добавил ли его в избранное.
+
+    Результат также записывается в атрибуты viewer_follows_author, viewer_liked
+    и viewer_favorited каждого поста, чтобы шаблоны могли использовать его
+    без дополнительных запросов.
 
-    if user.is_authenticated:
-        authors = {post.author_id: post.author for post in page_obj.object_list}
-        author_subscribers = {
-            author_id: list(
-                User.objects.filter(subscriptions__subscriber=user, id=author_id)
+    args:
+            user (User): Текущий пользователь.
+            posts (Iterable[Post]): Посты страницы.
+
+    return:
+            Dict[int, Dict[str, bool]]: Отношения пользователя по ID поста.
+    """
+    posts = list(posts)
+    relations = {
+        post.pk: {"follows_author": False, "liked": False, "favorited": False}
+        for post in posts
+    }
+    if user.is_authenticated and relations:
+        rows = (
+            Post.objects.filter(pk__in=relations.keys())
+            .annotate(
+                follows_author=Exists(
+                    Subscription.objects.filter(
+                        subscriber=user, author=OuterRef("author_id")
+                    )
+                ),
+                liked=Exists(
+                    Post.likes.through.objects.filter(post=OuterRef("pk"), user=user)
+                ),
+                favorited=Exists(
+                    Favorite.objects.filter(post=OuterRef("pk"), user=user)
+                ),
             )
-            for author_id in authors.keys()
-        }
-        context["author_subscribers"] = author_subscribers
+            .values_list("pk", "follows_author", "liked", "favorited")
+        )
+        for pk, follows_author, liked, favorited in rows:
+            relations[pk] = {
+                "follows_author": follows_author,
+                "liked": liked,
+                "favorited": favorited,
+            }
+
+    if user.is_authenticated and relations and is_write_buffer_enabled():
+        for pk, liked in get_like_states(list(relations), user.pk).items():
+            relations[pk]["liked"] = liked
 
-    return context
+    for post in posts:
+        post.viewer_follows_author = relations[post.pk]["follows_author"]
+        post.viewer_liked = relations[post.pk]["liked"]
+        post.viewer_favorited = relations[post.pk]["favorited"]
+    return relations
 
 
 def get_post_comments(post: Post) -> QuerySet[Comment]:
@@ -95,36 +165,49 @@ def handle_comment_form(request, post: Post) -> CommentForm:
         comment = form.save(commit=False)
         comment.post = post
         comment.author = request.user
-        comment.save()
+        with transaction.atomic():
+            comment.save()
+            if comment.approved_comment:
+                Post.objects.filter(pk=post.pk).update(
+                    comment_count=F("comment_count") + 1
+                )
         categories = request.POST.getlist("categories")
         if categories:
             post.categories.add(*categories)
-        _create_notifications(post, request.user, comment.text)
+        _create_notifications(post, request.user, comment)
     return form
 
 
-def _create_notifications(post: Post, user: User, comment_text: str):
+def _create_notifications(post: Post, user: User, comment: Comment):
     """
-    Создает уведомления для автора поста о новом комментарии.
+    Создает уведомление автора поста о новом комментарии.
+
+    Комментарии к одному посту объединяются в одно непросмотренное
+    уведомление со счетчиком и последними комментаторами, поэтому число
+    строк и запросов не зависит от количества комментариев к посту. Ключ
+    дедупликации по ID комментария не дает учесть тот же комментарий дважды.
+    Автор не получает уведомлений о своих комментариях, а новое уведомление
+    сразу отправляется в его открытые вкладки.
 
     args:
             post (Post): Пост для которого добавлен комментарий.
             user (User): Пользователь, добавивший комментарий.
-            comment_text (str): Текст комментария.
-    """
-    sender_name = user.username
-    comments = Comment.objects.filter(post=post)
-    for com in comments:
-        if not Notification.objects.filter(
-            Q(user=com.post.author) & Q(message=f"Новый комментарий: {com.text}")
-        ).exists():
-            Notification.objects.create(
-                user=com.post.author,
-                sender=user,
-                sender_name=sender_name,
-                message=f"Новый комментарий: {com.text}",
-                is_new=True,
-            )
+            comment (Comment): Новый комментарий.
+    """
+    if user.pk == post.author_id:
+        return
+    send_notification(
+        build_notification(
+            post.author_id,
+            user,
+            Notification.Type.COMMENT,
+            comment.text,
+            target=comment,
+            url=reverse("post_detail", args=[post.pk]),
+            dedup_key=f"comment:{comment.pk}",
+            group_key=f"comment:post:{post.pk}",
+        )
+    )
 
 
 def is_favorite_post(user: User, post: Post) -> bool:
@@ -164,21 +247,29 @@ def create_post_for_user(request) -> PostForm:
 
 def _create_post_notifications(post, user: User):
     """
-    Создает уведомления для подписчиков автора поста о новом посте.
+    Ставит в очередь рассылку уведомлений подписчикам автора о новом посте.
+
+    Задача отправляется после фиксации транзакции, чтобы воркер видел пост,
+    и не задерживает ответ на публикацию при большом числе подписчиков.
+    Если брокер недоступен, ошибка только записывается в журнал: пост
+    уже сохранен, а рассылку подхватит sweep_post_notifications_task.
 
     args:
             post (Post): Новый пост.
             user (User): Автор поста.
     """
-    post_detail_url = reverse("post_detail", args=[post.id])
-    subscribers = Subscription.objects.filter(author=user)
-    for subscriber in subscribers:
-        Notification.objects.create(
-            user=subscriber.subscriber,
-            sender=user,
-            sender_name=user.username,
-            message=f"Новый пост: <a href='{post_detail_url}'>{post.title}</a>",
-            is_new=True,
+    transaction.on_commit(lambda: _enqueue_post_notifications(post.pk))
+
+
+def _enqueue_post_notifications(post_id: int) -> None:
+    try:
+        # Без повторов публикации, чтобы не задерживать ответ при недоступном брокере
+        fan_out_post_notifications_task.apply_async((post_id,), retry=False)
+    except Exception:
+        logger.exception(
+            "Не удалось поставить в очередь рассылку уведомлений о посте %s, "
+            "она будет запущена задачей sweep_post_notifications_task",
+            post_id,
         )
 
 
@@ -192,7 +283,7 @@ def get_user_posts(user: User) -> QuerySet[Post]:
     return:
             QuerySet[Post]: QuerySet постов пользователя.
     """
-    return Post.objects.filter(author=user).order_by("-publish_date")
+    return Post.objects.filter(author=user).for_feed().order_by("-publish_date")
 
 
 def get_all_categories() -> QuerySet[Category]:
@@ -298,149 +389,206 @@ def get_posts_by_category(category: Category, user: User) -> QuerySet[Post]:
     return:
             QuerySet[Post]: QuerySet постов.
     """
-    posts = Post.objects.filter(categories=category).order_by("-publish_date")
-    if user.is_authenticated:
-        subscribed_authors = user.subscriptions.values_list("author__id", flat=True)
-        posts = posts.filter(
-            Q(for_subscribers=False)
-            | Q(author__id__in=subscribed_authors)
-            | Q(author=user)
-        )
-    else:
-        posts = posts.filter(for_subscribers=False)
-    return posts
+    return (
+        Post.objects.filter(categories=category)
+        .visible_to(user)
+        .for_feed()
+        .order_by("-publish_date")
+    )
 
 
-def get_posts_by_query(query: str, user: User) -> QuerySet[Post]:
+def get_posts_by_query(
+    query: str, user: User, filters: Optional[Dict[str, Any]] = None
+) -> QuerySet[Post]:
     """
     Получает посты по запросу с учетом подписки пользователя.
 
+    Поиск выполняется полнотекстовым бэкендом из services.search_backends,
+    найденные посты отсортированы по релевантности. ID найденных постов
+    кэшируются services.search_cache по запросу и классу видимости. Вместо
+    HTML тела загружается его простой текст body_text для сниппетов.
+
     args:
             query (str): Поисковый запрос.
             user (User): Пользователь.
+            filters (Dict[str, Any], optional): Фильтры по категории, автору
+                    и датам из services.search_facets.parse_search_filters.
 
     return:
             QuerySet[Post]: QuerySet постов.
     """
-    if query:
-        posts = (
-            Post.objects.filter(
-                Q(title__icontains=query)
-                | Q(body__icontains=query)
-                | Q(author__username__icontains=query)
-            )
-            .distinct()
-            .order_by("-publish_date")
-        )
-    else:
-        posts = Post.objects.all().order_by("-publish_date")
-
-    if user.is_authenticated:
-        subscribed_authors = user.subscriptions.values_list("author__id", flat=True)
-        posts = posts.filter(
-            Q(for_subscribers=False)
-            | Q(author__id__in=subscribed_authors)
-            | Q(author=user)
-        )
-    else:
-        posts = posts.filter(for_subscribers=False)
-
-    return posts
+    posts = Post.objects.visible_to(user).for_search()
+    if filters:
+        posts = apply_search_filters(posts, filters)
+    if not query:
+        return posts.order_by("-publish_date", "-id")
+    results = get_cached_search_results(posts, query, user, filters)
+    return filter_by_results(posts, results).order_by(
+        f"-{SEARCH_RANK_ANNOTATION}", "-publish_date", "-id"
+    )
 
 
-def get_paginated_posts(request, posts: QuerySet[Post]) -> Dict[str, Any]:
+def get_paginated_posts(
+    request, posts: QuerySet[Post], keep_ordering: bool = False
+) -> Dict[str, Any]:
     """
     Получает пагинированные посты.
 
+    Если в запросе передан параметр cursor, используется курсорная пагинация
+    без COUNT(*) и OFFSET по дате публикации, иначе постраничная по параметру page.
+
     args:
             request: HTTP запрос.
             posts (QuerySet[Post]): QuerySet постов.
+            keep_ordering (bool, optional): Сохранить сортировку posts при
+                    постраничной пагинации, например по релевантности поиска.
 
     return:
             Dict[str, Any]: Пагинированные посты.
     """
-    posts = posts.order_by("-publish_date")
+    if not keep_ordering:
+        posts = posts.order_by("-publish_date", "-id")
     paginator = GeneralPaginator(posts)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    if "cursor" in request.GET:
+        page_obj = paginator.get_cursor_page(request.GET.get("cursor"))
+    else:
+        page_number = request.GET.get("page")
+        page_obj = paginator.get_page(page_number)
     return {"page_obj": page_obj}
 
 
-def toggle_post_like(post_id: int, user: User) -> None:
+def toggle_post_like(post_id: int, user: User) -> Tuple[bool, int]:
     """
     Переключает лайк поста пользователем.
 
+    Лайки не загружаются в память: наличие лайка проверяется удалением строки
+    из промежуточной таблицы по уникальному индексу (post, user), а если
+    удалять было нечего, строка вставляется. При включенном WRITE_BUFFER_ENABLED
+    лайк записывается в буфер и попадает в базу при flush_write_buffer.
+
     args:
             post_id (int): Идентификатор поста.
             user (User): Пользователь.
+
+    return:
+            Tuple[bool, int]: Новое состояние лайка и количество лайков поста.
+
+    raises:
+            Http404: Если пост не найден.
     """
-    post = get_object_or_404(Post, pk=post_id)
-    if user in post.likes.all():
-        post.likes.remove(user)
-    else:
-        post.likes.add(user)
+    if is_write_buffer_enabled():
+        return buffer_like_toggle(post_id, user)
+
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404("Пост не найден")
+
+    likes = Post.likes.through.objects
+    with transaction.atomic():
+        deleted, _ = likes.filter(post_id=post_id, user_id=user.pk).delete()
+        if deleted:
+            liked, delta = False, -1
+        else:
+            try:
+                with transaction.atomic():
+                    likes.create(post_id=post_id, user_id=user.pk)
+                liked, delta = True, 1
+            except IntegrityError:
+                liked, delta = True, 0
+        if delta:
+            Post.objects.filter(pk=post_id).update(like_count=F("like_count") + delta)
+        like_count = Post.objects.values_list("like_count", flat=True).get(pk=post_id)
+    bump_tags([post_tag(post_id), POPULARITY_TAG])
+    return liked, like_count
+
+
+def register_post_view(post: Post) -> None:
+    """
+    Учитывает просмотр поста.
+
+    Без буфера счетчик увеличивается одним UPDATE. При включенном
+    WRITE_BUFFER_ENABLED просмотр копится в буфере, а в view_count переданного
+    поста добавляются еще не сохраненные просмотры и лайки.
+
+    args:
+            post (Post): Просматриваемый пост.
+    """
+    if not is_write_buffer_enabled():
+        Post.objects.filter(pk=post.pk).update(view_count=F("view_count") + 1)
+        post.view_count += 1
+        return
+
+    buffer_post_view(post.pk)
+    post.view_count += get_pending_view_delta(post.pk)
+    post.like_count += get_pending_like_delta(post.pk)
 
 
 def get_subscribed_posts(
-    user: User, query: str = None, page_number: str = None
+    user: User, query: str = None, page_number: str = None, cursor: str = None
 ) -> Dict[str, Any]:
     """
     Получает посты подписанных авторов.
 
+    Лента читается из материализованной ленты пользователя с фильтрацией,
+    сортировкой и пагинацией на стороне базы данных, поэтому объём
+    загружаемых данных не зависит от количества подписок. Посты популярных
+    авторов читаются отдельным запросом и сливаются с лентой.
+
     args:
             user (User): Пользователь.
             query (str, optional): Поисковый запрос.
             page_number (str, optional): Номер страницы для пагинации.
+            cursor (str, optional): Токен курсорной пагинации. Если передан,
+                    вместо постраничной используется курсорная пагинация.
 
     return:
-            Dict[str, Any]: Пагинированные посты и подписчики авторов.
-    """
-    subscriptions = Subscription.objects.filter(subscriber=user)
-    subscribed_authors = [subscription.author for subscription in subscriptions]
-    all_posts = []
-    for author in subscribed_authors:
-        author_posts = Post.objects.filter(author=author)
-        if query:
-            author_posts = author_posts.filter(
-                Q(title__icontains=query)
-                | Q(body__icontains=query)
-                | Q(author__username__icontains=query)
-            )
-        all_posts.extend(author_posts)
-
-    all_posts_sorted = sorted(all_posts, key=lambda x: x.publish_date, reverse=True)
-
-    paginator = GeneralPaginator(all_posts_sorted)
-    page_obj = paginator.get_page(page_number)
+            Dict[str, Any]: Пагинированные посты.
+    """
+    posts = get_timeline_posts(user).for_feed()
+    if query:
+        posts = get_search_backend().search(posts, query)
+    posts = posts.order_by("-feed_date", "-id")
 
-    author_subscribers = {}
-    if user.is_authenticated:
-        authors = {post.author_id: post.author for post in page_obj.object_list}
-        author_subscribers = {
-            author_id: list(
-                User.objects.filter(subscriptions__subscriber=user, id=author_id)
-            )
-            for author_id in authors.keys()
-        }
+    paginator = GeneralPaginator(posts)
+    if cursor is not None:
+        page_obj = paginator.get_cursor_page(cursor, date_field="feed_date")
+    else:
+        page_obj = paginator.get_page(page_number)
 
-    return {
-        "page_obj": page_obj,
-        "author_subscribers": author_subscribers,
-    }
+    return {"page_obj": page_obj}
 
 
 def toggle_favorite_post(post_id: int, user: User) -> None:
     """
     Переключает избранный статус поста пользователем.
 
+    Как и в toggle_post_like, счетчик меняется на число действительно
+    удаленных или вставленных строк, поэтому параллельные запросы
+    не сдвигают favorite_count дважды.
+
     args:
             post_id (int): Идентификатор поста.
             user (User): Пользователь.
+
+    raises:
+            Http404: Если пост не найден.
     """
-    post = Post.objects.get(pk=post_id)
-    favorite, created = Favorite.objects.get_or_create(user=user, post=post)
-    if not created:
-        favorite.delete()
+    post = get_object_or_404(Post, pk=post_id)
+    with transaction.atomic():
+        deleted, _ = Favorite.objects.filter(user=user, post=post).delete()
+        if deleted:
+            delta = -1
+        else:
+            try:
+                with transaction.atomic():
+                    Favorite.objects.create(user=user, post=post)
+                delta = 1
+            except IntegrityError:
+                delta = 0
+        if delta:
+            Post.objects.filter(pk=post.pk).update(
+                favorite_count=F("favorite_count") + delta
+            )
+    bump_tags([post_tag(post.pk), POPULARITY_TAG])
 
 
 def get_favorite_posts(user: User, page_number: str = None) -> Dict[str, Any]:
@@ -454,8 +602,63 @@ def get_favorite_posts(user: User, page_number: str = None) -> Dict[str, Any]:
     return:
             Dict[str, Any]: Пагинированные избранные посты.
     """
-    favorite_posts = Favorite.objects.filter(user=user).select_related("post")
+    favorite_posts = (
+        Favorite.objects.filter(user=user)
+        .select_related("post__author__profile")
+        .prefetch_related("post__categories")
+        .order_by("-id")
+    )
     paginator = GeneralPaginator(favorite_posts)
     page_obj = paginator.get_page(page_number)
 
     return {"page_obj": page_obj}
+
+
+def _related_count(model, **filters) -> Coalesce:
+    """
+    Формирует подзапрос количества связанных с постом строк модели.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(post_id=OuterRef("pk"), **filters)
+            .order_by()
+            .values("post_id")
+            .annotate(total=Count("*"))
+            .values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def reconcile_post_counters(start_id: int, end_id: int) -> int:
+    """
+    Исправляет счетчики лайков, комментариев и избранного у постов
+    с идентификаторами в диапазоне [start_id, end_id).
+
+    args:
+            start_id (int): Начало диапазона идентификаторов.
+            end_id (int): Конец диапазона идентификаторов (не включается).
+
+    return:
+            int: Количество исправленных постов.
+    """
+    counters = {
+        "like_count": _related_count(Post.likes.through),
+        "comment_count": _related_count(Comment, approved_comment=True),
+        "favorite_count": _related_count(Favorite),
+    }
+    chunk = Post.objects.filter(id__gte=start_id, id__lt=end_id)
+    drifted = (
+        chunk.annotate(**{f"actual_{name}": value for name, value in counters.items()})
+        .filter(
+            ~Q(like_count=F("actual_like_count"))
+            | ~Q(comment_count=F("actual_comment_count"))
+            | ~Q(favorite_count=F("actual_favorite_count"))
+        )
+        .values_list("id", flat=True)
+    )
+    drifted_ids = list(drifted)
+    if drifted_ids:
+        Post.objects.filter(id__in=drifted_ids).update(**counters)
+    return len(drifted_ids)
@@ -0,0 +1,198 @@
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+FEED_TAG = "feed"
+CATEGORIES_TAG = "categories"
+# Меняется при изменении лайков и избранного, от которых зависит порядок
+# ленты, отсортированной по популярности.
+POPULARITY_TAG = "popularity"
+
+_MISSING = object()
+
+# Версии тегов, прочитанные внутри record_tag_versions
+_recorded_versions: ContextVar[Optional[Dict[str, int]]] = ContextVar(
+    "recorded_tag_versions", default=None
+)
+
+
+def post_tag(post_id: int) -> str:
+    return f"post:{post_id}"
+
+
+def author_tag(user_id: int) -> str:
+    return f"author:{user_id}"
+
+
+def subscriber_tag(user_id: int) -> str:
+    return f"subscriber:{user_id}"
+
+
+def category_tag(slug: str) -> str:
+    return f"category:{slug}"
+
+
+def _version_key(tag: str) -> str:
+    return f"tagver:{tag}"
+
+
+def get_tag_versions(tags: Iterable[str]) -> Dict[str, int]:
+    """
+    Получает текущие версии тегов одним обращением к кэшу.
+
+    Версия отсутствующего тега создается от текущего времени, а не с нуля,
+    поэтому после вытеснения ключа версии записи со старой версией
+    не становятся снова актуальными.
+
+    args:
+        tags (Iterable[str]): Теги.
+
+    return:
+        Dict[str, int]: Версии по тегу.
+    """
+    tags = set(tags)
+    recorded = _recorded_versions.get()
+    if recorded is not None:
+        versions = {tag: recorded[tag] for tag in tags if tag in recorded}
+        tags -= versions.keys()
+    else:
+        versions = {}
+    keys = {_version_key(tag): tag for tag in tags}
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = tags - found.keys()
+    if missing:
+        initial = time.time_ns()
+        for tag in missing:
+            cache.add(_version_key(tag), initial, None)
+        added = cache.get_many([_version_key(tag) for tag in missing])
+        found.update({keys[key]: value for key, value in added.items()})
+    if recorded is not None:
+        recorded.update(found)
+    versions.update(found)
+    return versions
+
+
+@contextmanager
+def record_tag_versions() -> Iterator[Dict[str, int]]:
+    """
+    Запоминает версии тегов, впервые прочитанные внутри блока.
+
+    Повторное чтение тега в блоке возвращает запомненную версию. Значение,
+    построенное в блоке, сохраняется с версиями на момент чтения данных,
+    поэтому изменение, сделанное во время построения, не попадает в кэш
+    под новой версией.
+
+    return:
+        Dict[str, int]: Запомненные версии по тегу.
+    """
+    recorded: Dict[str, int] = {}
+    token = _recorded_versions.set(recorded)
+    try:
+        yield recorded
+    finally:
+        _recorded_versions.reset(token)
+
+
+def get_tags_version(tags: Iterable[str]) -> str:
+    """
+    Сворачивает версии тегов в короткую строку для ключей фрагментов шаблона.
+
+    args:
+        tags (Iterable[str]): Теги.
+
+    return:
+        str: Строка, меняющаяся при изменении версии любого из тегов.
+    """
+    versions = get_tag_versions(tags)
+    payload = ",".join(f"{tag}={versions.get(tag)}" for tag in sorted(versions))
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+def bump_tags(tags: Iterable[str]) -> None:
+    """
+    Увеличивает версии тегов, делая недействительными все записи с ними.
+
+    args:
+        tags (Iterable[str]): Теги изменившихся данных.
+    """
+    for tag in set(tags):
+        key = _version_key(tag)
+        if cache.add(key, time.time_ns(), None):
+            continue
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def get_tagged(key: str, default: Any = None) -> Any:
+    """
+    Получает значение из кэша, если версии его тегов не изменились.
+
+    args:
+        key (str): Ключ записи.
+        default (Any, optional): Значение при промахе.
+
+    return:
+        Any: Закэшированное значение или default.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return default
+    versions, value = entry
+    if get_tag_versions(versions) != versions:
+        return default
+    return value
+
+
+def set_tagged(
+    key: str, value: Any, tags: Iterable[str], timeout: Optional[int] = None
+) -> None:
+    """
+    Сохраняет значение вместе с текущими версиями его тегов.
+
+    args:
+        key (str): Ключ записи.
+        value (Any): Значение.
+        tags (Iterable[str]): Теги данных, из которых построено значение.
+        timeout (int, optional): Время жизни записи, по умолчанию CACHE_TAGGED_TTL.
+    """
+    if timeout is None:
+        timeout = settings.CACHE_TAGGED_TTL
+    cache.set(key, (get_tag_versions(tags), value), timeout)
+
+
+def get_or_set_tagged(
+    key: str,
+    tags: Iterable[str],
+    default: Callable[[], Any],
+    timeout: Optional[int] = None,
+) -> Any:
+    """
+    Получает значение из кэша или вычисляет и сохраняет его с тегами.
+
+    args:
+        key (str): Ключ записи.
+        tags (Iterable[str]): Теги данных, из которых построено значение.
+        default (Callable[[], Any]): Функция, вычисляющая значение при промахе.
+        timeout (int, optional): Время жизни записи, по умолчанию CACHE_TAGGED_TTL.
+
+    return:
+        Any: Закэшированное или вычисленное значение.
+    """
+    value = get_tagged(key, _MISSING)
+    if value is _MISSING:
+        tags = list(tags)
+        versions_before = get_tag_versions(tags)
+        value = default()
+        cache.set(
+            key,
+            (versions_before, value),
+            settings.CACHE_TAGGED_TTL if timeout is None else timeout,
+        )
+    return value
@@ -1,26 +1,81 @@
 from typing import List, Union
 from django.contrib.auth.models import User
+from django.db.models import Q, QuerySet
+from django.db.models.functions import Substr
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from notifications.models import Notification
 from messaging.models import Message
+from services.notifications_services import build_notification, send_notification
+from services.user_suggestions import suggest_usernames
+
+MESSAGE_PREVIEW_LENGTH = 200
+
+
+def _for_list(messages: QuerySet[Message], related: str) -> QuerySet[Message]:
+    """
+    Готовит сообщения для списка: тело не загружается, вместо него база
+    возвращает начало текста в атрибуте body_preview, собеседник выбирается
+    тем же запросом. Сортировка совпадает с индексами сообщений, поэтому
+    страница читается диапазоном индекса.
+    """
+    return (
+        messages.select_related(related)
+        .defer("body")
+        .annotate(body_preview=Substr("body", 1, MESSAGE_PREVIEW_LENGTH + 1))
+        .order_by("-timestamp", "-id")
+    )
 
 
 def get_messages_for_user(
     user: User, filter_name: Union[str, None] = None
-) -> List[Message]:
+) -> QuerySet[Message]:
     """
     Получает сообщения для конкретного пользователя, при необходимости фильтруя их по имени отправителя.
 
+    Возвращается ленивый QuerySet, поэтому пагинатор выбирает из базы только
+    текущую страницу, а число запросов не зависит от количества сообщений.
+
     args:
         user (User): Пользователь, для которого нужно получить сообщения.
         filter_name (str, optional): Имя отправителя для фильтрации сообщений. По умолчанию None.
 
     return:
-        List[Message]: Список сообщений.
+        QuerySet[Message]: Сообщения от новых к старым с отправителем и началом текста.
     """
-    messages = Message.objects.filter(recipient=user).order_by("-timestamp")
+    messages = Message.objects.filter(recipient=user)
     if filter_name:
         messages = messages.filter(sender__username=filter_name)
-    return list(messages)
+    return _for_list(messages, "sender")
+
+
+def get_message_for_user(user: User, message_id: int) -> Message:
+    """
+    Получает сообщение целиком для отправителя или получателя.
+
+    В списках показывается только начало текста, полный текст загружается
+    здесь. Когда сообщение открывает получатель, оно отмечается прочитанным.
+
+    args:
+        user (User): Отправитель или получатель сообщения.
+        message_id (int): ID сообщения.
+
+    return:
+        Message: Сообщение с отправителем и получателем.
+
+    raises:
+        Http404: Сообщение не найдено или пользователь не участвует в переписке.
+    """
+    message = get_object_or_404(
+        Message.objects.select_related("sender", "recipient").filter(
+            Q(sender=user) | Q(recipient=user)
+        ),
+        pk=message_id,
+    )
+    if message.recipient_id == user.pk and not message.read:
+        message.read = True
+        message.save(update_fields=["read"])
+    return message
 
 
 def send_message_from_user_to_user(
@@ -42,39 +97,50 @@ def send_message_from_user_to_user(
     message = Message(sender=sender, recipient=recipient, subject=subject, body=body)
     message.save()
 
-    sender_name = sender.username
-    Notification.objects.create(
-        user=recipient,
-        sender=sender,
-        sender_name=sender_name,
-        message=f"Новое сообщение: {message.subject}",
-        is_new=True,
+    send_notification(
+        build_notification(
+            recipient.pk,
+            sender,
+            Notification.Type.MESSAGE,
+            message.subject,
+            target=message,
+            url=reverse("message_detail", args=[message.pk]),
+            group_key=f"message:{sender.pk}",
+        )
     )
 
 
-def get_user_suggestions_by_text(input_text: str) -> List[str]:
+def get_user_suggestions_by_text(
+    input_text: str, limit: Union[int, None] = None
+) -> List[str]:
     """
     Получает предложения имен пользователей на основе введенного текста.
 
+    Имена ищутся в индексе services.user_suggestions в памяти процесса,
+    без запроса к базе данных на каждое нажатие клавиши. Имена, начинающиеся
+    с введенного текста, идут первыми.
+
     args:
         input_text (str): Входной текст для сопоставления с именами пользователей.
+        limit (int, optional): Количество подсказок. По умолчанию USER_SUGGESTIONS_LIMIT.
 
     return:
         List[str]: Список предлагаемых имен пользователей.
     """
-    users = User.objects.filter(username__icontains=input_text)[:5]
-    suggestions = [user.username for user in users]
-    return suggestions
+    return suggest_usernames(input_text, limit)
 
 
-def get_sent_messages_for_user(user: User) -> List[Message]:
+def get_sent_messages_for_user(user: User) -> QuerySet[Message]:
     """
     Получает отправленные сообщения для конкретного пользователя.
 
+    Как и get_messages_for_user, возвращает ленивый QuerySet для пагинации
+    в базе данных.
+
     args:
         user (User): Пользователь, для которого нужно получить отправленные сообщения.
 
     return:
-        List[Message]: Список отправленных сообщений.
+        QuerySet[Message]: Сообщения от новых к старым с получателем и началом текста.
     """
-    return list(Message.objects.filter(sender=user).order_by("-timestamp"))
+    return _for_list(Message.objects.filter(sender=user), "recipient")
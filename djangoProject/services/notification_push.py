@@ -0,0 +1,154 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from notifications.models import Notification
+
+CREATED_EVENT = "created"
+VIEWED_EVENT = "viewed"
+DELETED_EVENT = "deleted"
+
+logger = logging.getLogger(__name__)
+
+
+def get_notifications_group(user_id: int) -> str:
+    """
+    Возвращает имя группы каналов WebSocket-соединений пользователя.
+
+    args:
+        user_id (int): ID пользователя.
+
+    return:
+        str: Имя группы.
+    """
+    return f"notifications_{user_id}"
+
+
+def serialize_notification(notification: Notification) -> Dict[str, Any]:
+    """
+    Готовит уведомление для отправки в WebSocket.
+
+    После bulk_create с ignore_conflicts ID уведомления неизвестен, тогда
+    в поле id передается None.
+
+    args:
+        notification (Notification): Уведомление.
+
+    return:
+        Dict[str, Any]: Поля, нужные для строки списка уведомлений.
+    """
+    return {
+        "id": notification.pk,
+        "type": notification.type,
+        "type_display": notification.get_type_display(),
+        "html": notification.html,
+        "sender_name": notification.sender_name,
+        "count": notification.count,
+        "actors": notification.actors,
+        "timestamp": notification.timestamp.isoformat(),
+    }
+
+
+def publish_created(
+    notifications: Iterable[Notification],
+    unread_counts: Optional[Dict[int, Optional[int]]] = None,
+    aggregated: bool = False,
+) -> None:
+    """
+    Сообщает получателям о новых уведомлениях после фиксации транзакции.
+
+    args:
+        notifications (Iterable[Notification]): Созданные уведомления.
+        unread_counts (Dict[int, Optional[int]], optional): Счетчики
+            непросмотренных по ID получателя. Если счетчик неизвестен,
+            клиент увеличивает показанное значение на единицу.
+        aggregated (bool, optional): True, если события объединены
+            с уже показанными уведомлениями и число непросмотренных
+            не изменилось.
+    """
+    unread_counts = unread_counts or {}
+    publish(
+        (
+            notification.user_id,
+            {
+                "event": CREATED_EVENT,
+                "notification": serialize_notification(notification),
+                "unread_count": unread_counts.get(notification.user_id),
+                "aggregated": aggregated,
+            },
+        )
+        for notification in notifications
+    )
+
+
+def publish_changed(
+    user_id: int,
+    event: str,
+    notification_id: Optional[int],
+    unread_count: Optional[int],
+) -> None:
+    """
+    Сообщает пользователю о просмотре или удалении уведомлений, чтобы другие
+    открытые вкладки обновили список и счетчик.
+
+    args:
+        user_id (int): ID пользователя.
+        event (str): VIEWED_EVENT или DELETED_EVENT.
+        notification_id (int, optional): ID уведомления или None для всех.
+        unread_count (int, optional): Счетчик непросмотренных, если известен.
+    """
+    publish(
+        [
+            (
+                user_id,
+                {
+                    "event": event,
+                    "id": notification_id,
+                    "unread_count": unread_count,
+                },
+            )
+        ]
+    )
+
+
+def publish(messages: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+    """
+    Отправляет события в группы пользователей после фиксации транзакции.
+
+    Все события отправляются одним вызовом async_to_sync, поэтому рассылка
+    пачки уведомлений не переключает поток на каждого получателя. Если слой
+    каналов не настроен, ничего не отправляется. Ошибка слоя каналов только
+    записывается в журнал: данные уже сохранены, а открытые вкладки получат
+    изменения при следующей загрузке страницы.
+
+    args:
+        messages (Iterable[Tuple[int, Dict[str, Any]]]): Пары
+            (ID пользователя, событие).
+    """
+    messages = [
+        (
+            get_notifications_group(user_id),
+            {"type": "notification.event", "payload": payload},
+        )
+        for user_id, payload in messages
+    ]
+    if messages:
+        transaction.on_commit(lambda: _send(messages))
+
+
+def _send(messages: List[Tuple[str, Dict[str, Any]]]) -> None:
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(_group_send)(channel_layer, messages)
+    except Exception:
+        logger.exception("Не удалось отправить события уведомлений в WebSocket")
+
+
+async def _group_send(channel_layer, messages: List[Tuple[str, Dict[str, Any]]]):
+    for group, message in messages:
+        await channel_layer.group_send(group, message)
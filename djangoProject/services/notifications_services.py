@@ -1,23 +1,394 @@
-from typing import List
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.shortcuts import get_object_or_404
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Model, QuerySet
+from django.shortcuts import get_object_or_404, reverse
+from django.utils import timezone
+from django.utils.html import escape, format_html
+from django.utils.text import Truncator
+from blog.models import Post
 from notifications.models import Notification
+from services.paginators import CursorPage, GeneralPaginator
+from services.notification_push import (
+    DELETED_EVENT,
+    VIEWED_EVENT,
+    publish_changed,
+    publish_created,
+)
+from subscriptions.models import Subscription
 
+# Поля, которые берутся из последнего события при объединении уведомлений
+AGGREGATED_FIELDS = [
+    "sender",
+    "sender_name",
+    "message",
+    "text",
+    "html",
+    "target_content_type",
+    "target_object_id",
+    "dedup_key",
+    "timestamp",
+    "is_new",
+]
 
-def get_notifications_for_user(user: User) -> List[Notification]:
+
+def build_notification(
+    user_id: int,
+    sender: User,
+    type: str,
+    text: str,
+    target: Optional[Model] = None,
+    url: Optional[str] = None,
+    dedup_key: Optional[str] = None,
+    group_key: Optional[str] = None,
+) -> Notification:
+    """
+    Создает несохраненное уведомление со всеми полями, нужными для показа.
+
+    Тип, текст, ссылка на объект и готовый HTML записываются при создании,
+    поэтому при чтении уведомления ничего не разбирается. Поле message
+    заполняется для совместимости со старыми записями и админкой.
+
+    args:
+        user_id (int): ID получателя.
+        sender (User): Отправитель.
+        type (str): Тип уведомления из Notification.Type.
+        text (str): Текст уведомления.
+        target (Model, optional): Объект, к которому относится уведомление.
+        url (str, optional): Адрес, на который ведет текст уведомления.
+        dedup_key (str, optional): Ключ, уникальный для получателя.
+        group_key (str, optional): Ключ группировки: непросмотренные
+            уведомления с одинаковым ключом объединяются send_notification.
+
+    return:
+        Notification: Уведомление для save() или bulk_create().
+    """
+    html = (
+        escape(text) if url is None else format_html('<a href="{}">{}</a>', url, text)
+    )
+    return Notification(
+        user_id=user_id,
+        sender=sender,
+        sender_name=sender.username,
+        message=f"{Notification.Type(type).label}: {text}",
+        type=type,
+        text=Truncator(text).chars(255),
+        html=html,
+        target_content_type=(
+            ContentType.objects.get_for_model(target) if target is not None else None
+        ),
+        target_object_id=target.pk if target is not None else None,
+        dedup_key=dedup_key,
+        group_key=group_key,
+        actors=[sender.username],
+        is_new=True,
+    )
+
+
+def _unread_count_key(user_id: int) -> str:
+    return f"notifications:unread:{user_id}"
+
+
+def get_unread_count(user_id: int) -> int:
+    """
+    Получает количество непросмотренных уведомлений пользователя из кэша.
+
+    При промахе количество пересчитывается в базе и сохраняется на
+    NOTIFICATIONS_UNREAD_TTL секунд, после чего счетчик меняется сервисами
+    уведомлений без запросов COUNT.
+
+    args:
+        user_id (int): ID пользователя.
+
+    return:
+        int: Количество непросмотренных уведомлений.
+    """
+    key = _unread_count_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, viewed=False).count()
+        cache.add(key, count, settings.NOTIFICATIONS_UNREAD_TTL)
+    return count
+
+
+def _get_cached_unread_count(user_id: int) -> Optional[int]:
+    return cache.get(_unread_count_key(user_id))
+
+
+def change_unread_count(user_id: int, delta: int) -> None:
+    """
+    Изменяет закэшированный счетчик непросмотренных уведомлений.
+
+    Отсутствующий счетчик не создается: он будет пересчитан при чтении.
+    Счетчик, ушедший ниже нуля, удаляется.
+
+    args:
+        user_id (int): ID пользователя.
+        delta (int): Изменение счетчика.
+    """
+    key = _unread_count_key(user_id)
+    try:
+        count = cache.incr(key, delta)
+    except ValueError:
+        return
+    if count < 0:
+        cache.delete(key)
+
+
+def set_unread_count(user_id: int, count: int) -> None:
+    """
+    Записывает точное значение счетчика непросмотренных уведомлений.
+
+    args:
+        user_id (int): ID пользователя.
+        count (int): Количество непросмотренных уведомлений.
+    """
+    cache.set(_unread_count_key(user_id), count, settings.NOTIFICATIONS_UNREAD_TTL)
+
+
+def invalidate_unread_counts(user_ids: Iterable[int]) -> None:
+    """
+    Удаляет счетчики пользователей, для которых число вставленных уведомлений
+    неизвестно, например после bulk_create с ignore_conflicts.
+
+    args:
+        user_ids (Iterable[int]): ID пользователей.
+    """
+    cache.delete_many([_unread_count_key(user_id) for user_id in user_ids])
+
+
+def reconcile_unread_counts(start_id: int, end_id: int) -> int:
+    """
+    Сверяет закэшированные счетчики непросмотренных уведомлений пользователей
+    с ID из диапазона [start_id, end_id) с базой.
+
+    Непросмотренные уведомления диапазона считаются одним запросом с GROUP BY.
+    Исправляются только счетчики, которые есть в кэше и расходятся с базой.
+
+    args:
+        start_id (int): Начало диапазона ID пользователей.
+        end_id (int): Конец диапазона ID пользователей, не включается.
+
+    return:
+        int: Количество исправленных счетчиков.
+    """
+    keys = {_unread_count_key(user_id): user_id for user_id in range(start_id, end_id)}
+    cached = cache.get_many(keys)
+    if not cached:
+        return 0
+    actual = dict(
+        Notification.objects.filter(
+            user_id__gte=start_id, user_id__lt=end_id, viewed=False
+        )
+        .values("user_id")
+        .annotate(count=Count("pk"))
+        .values_list("user_id", "count")
+    )
+    wrong = {}
+    for key, count in cached.items():
+        expected = actual.get(keys[key], 0)
+        if count != expected:
+            wrong[key] = expected
+    cache.set_many(wrong, settings.NOTIFICATIONS_UNREAD_TTL)
+    return len(wrong)
+
+
+def send_notification(notification: Notification) -> Notification:
+    """
+    Сохраняет уведомление, увеличивает счетчик непросмотренных получателя
+    и отправляет уведомление в его открытые вкладки.
+
+    Уведомление с ключом группировки объединяется с непросмотренным
+    уведомлением получателя с тем же ключом: у него растет счетчик событий,
+    обновляются текст, время и список последних отправителей, а счетчик
+    непросмотренных не меняется. Повтор одного из последних
+    NOTIFICATION_AGGREGATE_DEDUP_KEYS объединенных событий пропускается.
+
+    args:
+        notification (Notification): Уведомление из build_notification.
+
+    return:
+        Notification: Сохраненное или обновленное уведомление.
+    """
+    if notification.group_key is None:
+        notification.save()
+        created = True
+    else:
+        notification, created, merged = _save_aggregated(notification)
+        if not created and not merged:
+            return notification
+    if created:
+        change_unread_count(notification.user_id, 1)
+    publish_created(
+        [notification],
+        {notification.user_id: _get_cached_unread_count(notification.user_id)},
+        aggregated=not created,
+    )
+    return notification
+
+
+def _save_aggregated(notification: Notification) -> Tuple[Notification, bool, bool]:
     """
-    Получает все новые уведомления для пользователя и помечает их тип и текст.
+    Вставляет уведомление или объединяет его с открытым уведомлением группы.
+
+    Открытое уведомление блокируется select_for_update. Если его нет,
+    а параллельный запрос успел вставить свое, уникальное ограничение
+    notification_user_open_group_uniq вызывает IntegrityError,
+    и объединение повторяется с уже вставленной строкой.
+
+    Уведомление хранит ключи дедупликации последних
+    NOTIFICATION_AGGREGATE_DEDUP_KEYS событий группы, поэтому повтор
+    более раннего события (A, B, A) не увеличивает счетчик. Повтор
+    события старше этого окна будет посчитан еще раз.
+
+    return:
+        Tuple[Notification, bool, bool]: Уведомление, признак вставки новой
+        строки и признак объединения. Оба признака ложны для повтора события.
+    """
+    for _ in range(2):
+        with transaction.atomic():
+            existing = (
+                Notification.objects.select_for_update()
+                .filter(
+                    user_id=notification.user_id,
+                    group_key=notification.group_key,
+                    viewed=False,
+                )
+                .first()
+            )
+            if existing is None:
+                if notification.dedup_key is not None:
+                    notification.dedup_keys = [notification.dedup_key]
+                try:
+                    with transaction.atomic():
+                        notification.save()
+                    return notification, True, False
+                except IntegrityError:
+                    duplicate = _get_duplicate(notification)
+                    if duplicate is not None:
+                        return duplicate, False, False
+                    continue
+            if notification.dedup_key is not None:
+                if notification.dedup_key in existing.dedup_keys or (
+                    existing.dedup_key == notification.dedup_key
+                ):
+                    return existing, False, False
+                existing.dedup_keys = [notification.dedup_key] + existing.dedup_keys[
+                    : settings.NOTIFICATION_AGGREGATE_DEDUP_KEYS - 1
+                ]
+            existing.count += 1
+            existing.actors = [notification.sender_name] + [
+                actor for actor in existing.actors if actor != notification.sender_name
+            ][: settings.NOTIFICATION_AGGREGATE_ACTORS - 1]
+            for field in AGGREGATED_FIELDS:
+                setattr(existing, field, getattr(notification, field))
+            try:
+                with transaction.atomic():
+                    existing.save(
+                        update_fields=[
+                            "count",
+                            "actors",
+                            "dedup_keys",
+                            *AGGREGATED_FIELDS,
+                        ]
+                    )
+            except IntegrityError:
+                return _get_duplicate(notification), False, False
+            return existing, False, True
+    raise IntegrityError("Не удалось объединить уведомление")
+
+
+def _get_duplicate(notification: Notification) -> Optional[Notification]:
+    if notification.dedup_key is None:
+        return None
+    return Notification.objects.filter(
+        user_id=notification.user_id, dedup_key=notification.dedup_key
+    ).first()
+
+
+def get_notifications_for_user(user: User) -> QuerySet[Notification]:
+    """
+    Получает все новые уведомления для пользователя.
+
+    Тип, текст и HTML уведомлений записаны при создании, поэтому выборка
+    идет по частичному индексу (user, -timestamp, -id) для is_new без
+    обработки строк и сортировки.
+    Объединенные уведомления поднимаются наверх с каждым новым событием.
 
     args:
         user (User): Пользователь, для которого нужно получить уведомления.
 
     return:
-        List[Notification]: Список уведомлений.
+        QuerySet[Notification]: Уведомления от новых к старым.
+    """
+    return Notification.objects.filter(user=user, is_new=True).order_by(
+        "-timestamp", "-id"
+    )
+
+
+def get_notifications_page(user: User, cursor: Optional[str] = None) -> CursorPage:
     """
-    notifications = Notification.objects.filter(user=user, is_new=True).order_by("-id")
-    for notification in notifications:
-        notification.type, notification.text = str(notification).split(":")
-    return notifications
+    Получает страницу уведомлений пользователя курсорной пагинацией.
+
+    args:
+        user (User): Пользователь.
+        cursor (str, optional): Токен страницы, None для первой страницы.
+
+    return:
+        CursorPage: NOTIFICATIONS_PER_PAGE уведомлений и токены соседних страниц.
+    """
+    return GeneralPaginator(
+        get_notifications_for_user(user), settings.NOTIFICATIONS_PER_PAGE
+    ).get_cursor_page(cursor, date_field="timestamp")
+
+
+def compact_notifications(
+    older_than: timedelta,
+    batch_size: Optional[int] = None,
+    archive: bool = False,
+) -> int:
+    """
+    Удаляет или архивирует просмотренные уведомления старше older_than.
+
+    Уведомления обрабатываются пачками по batch_size ID, каждая пачка
+    выбирается по частичному индексу notification_viewed_ts_idx
+    и удаляется или обновляется отдельным запросом, поэтому блокировки
+    и размер транзакций ограничены. Архивированные уведомления остаются
+    в базе, но не показываются на странице уведомлений.
+
+    args:
+        older_than (timedelta): Возраст, старше которого уведомления обрабатываются.
+        batch_size (int, optional): Размер пачки, по умолчанию
+            NOTIFICATION_RETENTION_BATCH_SIZE.
+        archive (bool, optional): Архивировать вместо удаления.
+
+    return:
+        int: Количество удаленных или архивированных уведомлений.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_RETENTION_BATCH_SIZE
+    notifications = Notification.objects.filter(
+        viewed=True, timestamp__lt=timezone.now() - older_than
+    )
+    if archive:
+        notifications = notifications.filter(is_new=True)
+
+    total = 0
+    while True:
+        ids = list(notifications.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return total
+        batch = Notification.objects.filter(pk__in=ids)
+        if archive:
+            total += batch.update(is_new=False)
+        else:
+            deleted, _ = batch.delete()
+            total += deleted
+        if len(ids) < batch_size:
+            return total
 
 
 def get_not_viewed_count_for_user(user: User) -> int:
@@ -30,7 +401,7 @@ def get_not_viewed_count_for_user(user: User) -> int:
     return:
         int: Количество непросмотренных уведомлений.
     """
-    return Notification.objects.filter(user=user, viewed=False).count()
+    return get_unread_count(user.pk)
 
 
 def delete_notification_for_user(user: User, notification_id: int) -> bool:
@@ -47,6 +418,11 @@ def delete_notification_for_user(user: User, notification_id: int) -> bool:
     notification = get_object_or_404(Notification, id=notification_id)
     if user == notification.user:
         notification.delete()
+        if not notification.viewed:
+            change_unread_count(user.pk, -1)
+        publish_changed(
+            user.pk, DELETED_EVENT, notification_id, _get_cached_unread_count(user.pk)
+        )
         return True
     return False
 
@@ -62,6 +438,8 @@ def delete_all_notifications_for_user(user: User) -> None:
         None
     """
     Notification.objects.filter(user=user).delete()
+    set_unread_count(user.pk, 0)
+    publish_changed(user.pk, DELETED_EVENT, None, 0)
 
 
 def mark_notification_as_viewed(user: User, notification_id: int) -> bool:
@@ -77,8 +455,14 @@ def mark_notification_as_viewed(user: User, notification_id: int) -> bool:
     """
     notification = get_object_or_404(Notification, id=notification_id)
     if user == notification.user:
+        if Notification.objects.filter(pk=notification.pk, viewed=False).update(
+            viewed=True
+        ):
+            change_unread_count(user.pk, -1)
         notification.viewed = True
-        notification.save()
+        publish_changed(
+            user.pk, VIEWED_EVENT, notification_id, _get_cached_unread_count(user.pk)
+        )
         return True
     return False
 
@@ -94,3 +478,157 @@ def mark_all_notifications_as_viewed(user: User) -> None:
         None
     """
     Notification.objects.filter(user=user, viewed=False).update(viewed=True)
+    set_unread_count(user.pk, 0)
+    publish_changed(user.pk, VIEWED_EVENT, None, 0)
+
+
+def _fan_out_progress_key(post_id: int) -> str:
+    return f"fanout:post:{post_id}"
+
+
+def get_post_fan_out_progress(post_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Получает прогресс рассылки уведомлений о новом посте.
+
+    args:
+        post_id (int): Идентификатор поста.
+
+    return:
+        Optional[Dict[str, Any]]: Статус ("running" или "done"), количество
+        обработанных подписчиков и ID последнего из них, либо None, если
+        рассылка не запускалась.
+    """
+    return cache.get(_fan_out_progress_key(post_id))
+
+
+def get_unfinished_post_fan_outs() -> List[int]:
+    """
+    Находит посты, рассылка уведомлений о которых не завершена.
+
+    Проверяются посты, опубликованные не раньше NOTIFICATION_FANOUT_PROGRESS_TTL
+    назад, пока их прогресс хранится в кэше, и не позже
+    NOTIFICATION_FANOUT_SWEEP_DELAY назад, чтобы не запускать повторно
+    только что поставленные в очередь рассылки. Рассылка считается
+    незавершенной, если ее прогресс отсутствует или не имеет статуса "done",
+    например когда брокер был недоступен при публикации. Повторный запуск
+    безопасен: уведомления дедуплицируются по посту.
+
+    return:
+        List[int]: ID постов.
+    """
+    now = timezone.now()
+    post_ids = Post.objects.filter(
+        publish_date__gte=now
+        - timedelta(seconds=settings.NOTIFICATION_FANOUT_PROGRESS_TTL),
+        publish_date__lt=now
+        - timedelta(seconds=settings.NOTIFICATION_FANOUT_SWEEP_DELAY),
+    ).values_list("pk", flat=True)
+
+    unfinished = []
+    batch_size = settings.NOTIFICATION_FANOUT_BATCH_SIZE
+    post_ids = list(post_ids)
+    for start in range(0, len(post_ids), batch_size):
+        batch = post_ids[start : start + batch_size]
+        progress = cache.get_many([_fan_out_progress_key(post_id) for post_id in batch])
+        unfinished += [
+            post_id
+            for post_id in batch
+            if progress.get(_fan_out_progress_key(post_id), {}).get("status") != "done"
+        ]
+    return unfinished
+
+
+def fan_out_post_notifications(post_id: int, batch_size: Optional[int] = None) -> int:
+    """
+    Создает уведомления о новом посте для всех подписчиков автора.
+
+    Подписчики читаются потоком по возрастанию ID пачками по batch_size,
+    каждая пачка вставляется одним bulk_create. Уведомления имеют ключ
+    дедупликации поста, а прогресс сохраняется в кэше после каждой пачки,
+    поэтому повторный запуск продолжает рассылку с места сбоя и не создает
+    дубликатов. Каждая пачка сразу отправляется в открытые вкладки получателей.
+
+    args:
+        post_id (int): Идентификатор поста.
+        batch_size (int, optional): Размер пачки, по умолчанию
+            NOTIFICATION_FANOUT_BATCH_SIZE.
+
+    return:
+        int: Количество подписчиков, обработанных этим запуском.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_FANOUT_BATCH_SIZE
+    post = (
+        Post.objects.filter(pk=post_id)
+        .select_related("author")
+        .only("pk", "title", "author__username")
+        .first()
+    )
+    if post is None:
+        return 0
+
+    key = _fan_out_progress_key(post_id)
+    progress = cache.get(key) or {"status": "running", "processed": 0, "last_id": 0}
+    if progress["status"] == "done":
+        return 0
+    url = reverse("post_detail", args=[post.pk])
+    subscriber_ids = (
+        Subscription.objects.filter(
+            author_id=post.author_id, subscriber_id__gt=progress["last_id"]
+        )
+        .order_by("subscriber_id")
+        .values_list("subscriber_id", flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+
+    processed = 0
+    batch = []
+    for subscriber_id in subscriber_ids:
+        batch.append(subscriber_id)
+        if len(batch) >= batch_size:
+            processed += _write_post_notifications(post, url, batch, progress)
+            batch = []
+    if batch:
+        processed += _write_post_notifications(post, url, batch, progress)
+
+    progress["status"] = "done"
+    cache.set(key, progress, settings.NOTIFICATION_FANOUT_PROGRESS_TTL)
+    return processed
+
+
+def _write_post_notifications(
+    post: Post, url: str, user_ids: List[int], progress: Dict[str, Any]
+) -> int:
+    # При повторном запуске часть уведомлений пачки уже есть. Они
+    # пропускаются, чтобы не отправлять во вкладки дубликаты без ID.
+    dedup_key = f"post:{post.pk}"
+    notified = set(
+        Notification.objects.filter(
+            user_id__in=user_ids, dedup_key=dedup_key
+        ).values_list("user_id", flat=True)
+    )
+    notifications = Notification.objects.bulk_create(
+        [
+            build_notification(
+                user_id,
+                post.author,
+                Notification.Type.POST,
+                post.title,
+                target=post,
+                url=url,
+                dedup_key=dedup_key,
+            )
+            for user_id in user_ids
+            if user_id not in notified
+        ],
+        ignore_conflicts=True,
+    )
+    invalidate_unread_counts(user_ids)
+    publish_created(notifications)
+    progress["processed"] += len(user_ids)
+    progress["last_id"] = user_ids[-1]
+    cache.set(
+        _fan_out_progress_key(post.pk),
+        progress,
+        settings.NOTIFICATION_FANOUT_PROGRESS_TTL,
+    )
+    return len(user_ids)
@@ -0,0 +1,220 @@
+import hashlib
+from functools import wraps
+from typing import Callable, Iterable, List, Optional
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+
+from blog.models import Post
+from services.cache_tags import (
+    CATEGORIES_TAG,
+    FEED_TAG,
+    POPULARITY_TAG,
+    author_tag,
+    get_tag_versions,
+    get_tagged,
+    post_tag,
+    record_tag_versions,
+)
+from subscriptions.models import Subscription
+
+ANONYMOUS_VIEWER = "anonymous"
+PUBLIC_VIEWER = "public"
+SUBSCRIBER_VIEWER = "subscriber"
+OWNER_VIEWER = "owner"
+
+POPULAR_SORT = "popular"
+POPULAR_ORDERING = "-like_count"
+
+
+def get_viewer_class(viewer: User, author: Optional[User] = None) -> str:
+    """
+    Определяет класс зрителя, от которого зависит общая часть страницы.
+
+    Зрители одного класса видят одинаковую разметку, поэтому она кэшируется
+    по классу, а не по пользователю. Без автора различаются только анонимные
+    и вошедшие пользователи.
+
+    args:
+        viewer (User): Текущий пользователь.
+        author (User, optional): Автор, чьи посты показываются на странице.
+
+    return:
+        str: Один из ANONYMOUS_VIEWER, PUBLIC_VIEWER, SUBSCRIBER_VIEWER, OWNER_VIEWER.
+    """
+    if not viewer.is_authenticated:
+        return ANONYMOUS_VIEWER
+    if author is None:
+        return PUBLIC_VIEWER
+    if viewer.pk == author.pk:
+        return OWNER_VIEWER
+    if Subscription.objects.filter(subscriber=viewer, author=author).exists():
+        return SUBSCRIBER_VIEWER
+    return PUBLIC_VIEWER
+
+
+def get_page_cache_key(key_prefix: str, viewer_class: str, request: HttpRequest) -> str:
+    """
+    Формирует ключ кэша страницы по классу зрителя и полному пути запроса.
+
+    В отличие от cache_page ключ не зависит от заголовка Cookie, поэтому
+    все анонимные посетители попадают в одну запись.
+
+    args:
+        key_prefix (str): Префикс страницы.
+        viewer_class (str): Класс зрителя.
+        request (HttpRequest): Запрос.
+
+    return:
+        str: Ключ кэша.
+    """
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"page:{key_prefix}:{viewer_class}:{path}"
+
+
+def cache_page_for_anonymous(
+    key_prefix: str,
+    get_tags: Callable[[HttpResponse], Iterable[str]],
+    get_request_tags: Callable[[HttpRequest], Iterable[str]] = lambda request: [],
+    timeout: Optional[int] = None,
+) -> Callable:
+    """
+    Декоратор, кэширующий страницу целиком только для анонимных зрителей.
+
+    Вошедшим пользователям страница отрисовывается заново, а её общие части
+    кэшируются фрагментами. Запись хранится с версиями тегов, которые
+    get_tags собирает по отрисованному ответу, и перестает отдаваться, как
+    только любой из тегов изменится. Версии берутся на момент чтения данных:
+    теги get_request_tags читаются до вызова view, остальные запоминаются
+    при первом чтении внутри view (например, в annotate_cache_versions).
+    Ответы, устанавливающие cookie, не кэшируются, чтобы не раздавать чужие
+    сообщения и токены.
+
+    args:
+        key_prefix (str): Префикс ключа страницы.
+        get_tags (Callable[[HttpResponse], Iterable[str]]): Функция, возвращающая
+            теги данных, из которых построен ответ.
+        get_request_tags (Callable[[HttpRequest], Iterable[str]], optional):
+            Функция, возвращающая теги, известные по запросу до вызова view.
+        timeout (int, optional): Время жизни записи, по умолчанию CACHE_TAGGED_TTL.
+
+    return:
+        Callable: Декоратор view-функции.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            viewer_class = get_viewer_class(request.user)
+            if (
+                request.method not in ("GET", "HEAD")
+                or viewer_class != ANONYMOUS_VIEWER
+            ):
+                return view_func(request, *args, **kwargs)
+
+            key = get_page_cache_key(key_prefix, viewer_class, request)
+            response = get_tagged(key)
+            if response is not None:
+                return response
+
+            with record_tag_versions() as versions:
+                get_tag_versions(get_request_tags(request))
+                response = view_func(request, *args, **kwargs)
+
+            def store(response: HttpResponse) -> None:
+                if response.status_code == 200 and not response.cookies:
+                    tags = set(get_tags(response))
+                    # Теги, не прочитанные до отрисовки, берутся по текущей версии
+                    current = get_tag_versions(tags - versions.keys())
+                    snapshot = {
+                        tag: versions.get(tag, current.get(tag)) for tag in tags
+                    }
+                    cache.set(
+                        key,
+                        (snapshot, response),
+                        settings.CACHE_TAGGED_TTL if timeout is None else timeout,
+                    )
+
+            if hasattr(response, "add_post_render_callback"):
+                response.add_post_render_callback(store)
+            else:
+                store(response)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def get_post_tags(post: Post) -> List[str]:
+    """
+    Возвращает теги данных, из которых строится карточка поста.
+
+    args:
+        post (Post): Пост.
+
+    return:
+        List[str]: Теги поста, его автора и категорий.
+    """
+    return [post_tag(post.pk), author_tag(post.author_id), CATEGORIES_TAG]
+
+
+def get_feed_request_tags(request: HttpRequest) -> List[str]:
+    """
+    Возвращает теги страницы ленты, известные до выборки постов.
+
+    args:
+        request (HttpRequest): Запрос страницы ленты.
+
+    return:
+        List[str]: Теги ленты, категорий и популярности для сортировки
+        по популярности.
+    """
+    tags = [FEED_TAG, CATEGORIES_TAG]
+    if request.GET.get("sort") == POPULAR_SORT:
+        tags.append(POPULARITY_TAG)
+    return tags
+
+
+def get_feed_page_tags(response: HttpResponse) -> List[str]:
+    """
+    Возвращает теги страницы ленты: саму ленту, категории и посты страницы.
+
+    Страница, отсортированная по популярности, также помечается тегом
+    популярности, потому что лайк поста с другой страницы может изменить
+    ее состав.
+
+    args:
+        response (HttpResponse): Отрисованный ответ со списком постов в posts.
+
+    return:
+        List[str]: Теги страницы.
+    """
+    tags = [FEED_TAG, CATEGORIES_TAG]
+    view = response.context_data.get("view")
+    if view is not None and view.get_ordering() == POPULAR_ORDERING:
+        tags.append(POPULARITY_TAG)
+    for post in response.context_data["posts"]:
+        tags += get_post_tags(post)
+    return tags
+
+
+def annotate_cache_versions(posts: Iterable[Post]) -> None:
+    """
+    Записывает в атрибут cache_version каждого поста строку версий его тегов.
+
+    Атрибут используется в ключах фрагментов шаблонов, поэтому карточка
+    перерисовывается сразу после изменения поста, автора или категорий.
+    Версии всех постов читаются одним обращением к кэшу.
+
+    args:
+        posts (Iterable[Post]): Посты страницы.
+    """
+    posts = list(posts)
+    versions = get_tag_versions(tag for post in posts for tag in get_post_tags(post))
+    for post in posts:
+        post.cache_version = ":".join(
+            str(versions.get(tag)) for tag in get_post_tags(post)
+        )
@@ -1,5 +1,177 @@
-from typing import List, Any
+import base64
+import binascii
+import json
+from datetime import datetime
+from functools import cached_property
+from typing import List, Any, Optional, Tuple
+
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Q, QuerySet
+
+
+class CursorPage:
+    """
+    Страница курсорной пагинации.
+
+    В отличие от страниц Paginator не знает общего количества объектов и
+    номера страницы, вместо этого содержит непрозрачные токены соседних страниц.
+    """
+
+    def __init__(
+        self,
+        object_list: List[Any],
+        next_cursor: Optional[str] = None,
+        previous_cursor: Optional[str] = None,
+    ):
+        """
+        Инициализирует экземпляр класса CursorPage.
+
+        args:
+            object_list (List[Any]): Объекты текущей страницы.
+            next_cursor (str, optional): Токен следующей страницы.
+            previous_cursor (str, optional): Токен предыдущей страницы.
+        """
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Класс для курсорной (keyset) пагинации QuerySet по ключу (дата, id).
+
+    Не выполняет COUNT(*) и OFFSET: каждая страница выбирается индексным
+    диапазоном от ключа последнего объекта предыдущей страницы, поэтому
+    время получения страницы не зависит от её глубины, а новые записи
+    не сдвигают уже просмотренные страницы.
+    """
+
+    def __init__(
+        self,
+        queryset: QuerySet,
+        per_page: int = 5,
+        date_field: str = "publish_date",
+    ):
+        """
+        Инициализирует экземпляр класса CursorPaginator.
+
+        args:
+            queryset (QuerySet): QuerySet объектов для разбиения на страницы.
+            per_page (int, optional): Количество объектов на странице. По умолчанию 5.
+            date_field (str, optional): Поле даты, по которому сортируется лента.
+        """
+        self.queryset = queryset
+        self.per_page = per_page
+        self.date_field = date_field
+
+    def get_page(self, cursor: Optional[str] = None) -> CursorPage:
+        """
+        Возвращает страницу, на которую указывает курсор.
+
+        Пустой или повреждённый курсор означает первую страницу.
+
+        args:
+            cursor (str, optional): Непрозрачный токен страницы.
+
+        return:
+            CursorPage: Страница с объектами и токенами соседних страниц.
+        """
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            rows = self._fetch(None, backwards=False)
+            has_next = len(rows) > self.per_page
+            rows = rows[: self.per_page]
+            has_previous = False
+        else:
+            date, pk, backwards = position
+            rows = self._fetch((date, pk), backwards=backwards)
+            has_more = len(rows) > self.per_page
+            rows = rows[: self.per_page]
+            if backwards:
+                rows.reverse()
+                has_next, has_previous = True, has_more
+            else:
+                has_next, has_previous = has_more, True
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_next:
+                next_cursor = self.encode_cursor(rows[-1], backwards=False)
+            if has_previous:
+                previous_cursor = self.encode_cursor(rows[0], backwards=True)
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+    def _fetch(self, key: Optional[Tuple[datetime, int]], backwards: bool) -> List[Any]:
+        """
+        Выбирает на одну запись больше размера страницы, чтобы без COUNT(*)
+        узнать, есть ли записи дальше.
+        """
+        field = self.date_field
+        if backwards:
+            queryset = self.queryset.order_by(field, "id")
+        else:
+            queryset = self.queryset.order_by(f"-{field}", "-id")
+        if key is not None:
+            date, pk = key
+            lookup = "gt" if backwards else "lt"
+            queryset = queryset.filter(
+                Q(**{f"{field}__{lookup}": date})
+                | Q(**{field: date, f"id__{lookup}": pk})
+            )
+        return list(queryset[: self.per_page + 1])
+
+    def encode_cursor(self, obj: Any, backwards: bool) -> str:
+        """
+        Кодирует ключ объекта в непрозрачный токен.
+
+        args:
+            obj (Any): Граничный объект страницы.
+            backwards (bool): True, если токен ведёт на предыдущую страницу.
+
+        return:
+            str: Токен для параметра запроса.
+        """
+        value = obj
+        for attr in self.date_field.split("__"):
+            value = getattr(value, attr)
+        payload = json.dumps([value.isoformat(), obj.pk, int(backwards)])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Optional[Tuple[datetime, int, bool]]:
+        """
+        Декодирует токен, возвращая None для некорректных значений.
+
+        args:
+            cursor (str): Токен из параметра запроса.
+
+        return:
+            Optional[Tuple[datetime, int, bool]]: Дата, id и направление.
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            date, pk, backwards = json.loads(base64.urlsafe_b64decode(padded))
+            return datetime.fromisoformat(date), int(pk), bool(backwards)
+        except (binascii.Error, ValueError, TypeError):
+            return None
 
 
 class GeneralPaginator:
@@ -17,7 +189,14 @@ class GeneralPaginator:
         """
         self.objects = objects
         self.per_page = per_page
-        self.paginator = Paginator(objects, per_page)
+
+    @cached_property
+    def paginator(self) -> Paginator:
+        """
+        Paginator для постраничного режима. Создается при первом обращении,
+        поэтому курсорный режим обходится без него и его проверок.
+        """
+        return Paginator(self.objects, self.per_page)
 
     def get_page(self, page_number: int) -> Paginator:
         """
@@ -36,3 +215,18 @@ class GeneralPaginator:
         except EmptyPage:
             page_obj = self.paginator.page(self.paginator.num_pages)
         return page_obj
+
+    def get_cursor_page(
+        self, cursor: Optional[str], date_field: str = "publish_date"
+    ) -> CursorPage:
+        """
+        Возвращает страницу в курсорном режиме без подсчёта общего количества.
+
+        args:
+            cursor (str, optional): Токен страницы, None для первой страницы.
+            date_field (str, optional): Поле даты, по которому сортируется лента.
+
+        return:
+            CursorPage: Страница с объектами и токенами соседних страниц.
+        """
+        return CursorPaginator(self.objects, self.per_page, date_field).get_page(cursor)
@@ -0,0 +1,302 @@
+import re
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Q, QuerySet, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from blog.models import Post
+from services.search_index import (
+    InvertedIndex,
+    get_log_position,
+    get_post_index,
+    tokenize_post,
+)
+
+SEARCH_RANK_ANNOTATION = "search_rank"
+
+
+def filter_by_results(
+    queryset: QuerySet[Post], results: List[Tuple[int, float]]
+) -> QuerySet[Post]:
+    """
+    Оставляет в QuerySet найденные посты и аннотирует их рангом из результатов.
+
+    args:
+        queryset (QuerySet[Post]): Посты.
+        results (List[Tuple[int, float]]): Пары (ID поста, ранг).
+
+    return:
+        QuerySet[Post]: Посты с аннотацией search_rank.
+    """
+    if not results:
+        return queryset.annotate(
+            **{SEARCH_RANK_ANNOTATION: Value(0.0, output_field=FloatField())}
+        ).none()
+    return queryset.filter(pk__in=[pk for pk, _ in results]).annotate(
+        **{
+            SEARCH_RANK_ANNOTATION: Case(
+                *(When(pk=pk, then=Value(score)) for pk, score in results),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        }
+    )
+
+
+class BaseSearchBackend:
+    """
+    Базовый класс поискового бэкенда постов.
+
+    Бэкенд фильтрует переданный QuerySet по запросу, не меняя остальных
+    условий, поэтому правила видимости постов применяются как обычно.
+    Найденные посты получают аннотацию search_rank.
+    """
+
+    def search(self, queryset: QuerySet[Post], query: str) -> QuerySet[Post]:
+        """
+        Отбирает посты, подходящие под запрос.
+
+        args:
+            queryset (QuerySet[Post]): Посты, среди которых выполняется поиск.
+            query (str): Поисковый запрос.
+
+        return:
+            QuerySet[Post]: Найденные посты с аннотацией search_rank.
+        """
+        raise NotImplementedError
+
+    def index_post(self, post: Post) -> None:
+        """
+        Добавляет пост в индекс или обновляет его запись.
+
+        args:
+            post (Post): Сохраненный пост.
+        """
+
+    def remove_post(self, post_id: int) -> None:
+        """
+        Удаляет пост из индекса.
+
+        args:
+            post_id (int): ID удаленного поста.
+        """
+
+    def rebuild(self) -> int:
+        """
+        Перестраивает индекс по всем постам.
+
+        return:
+            int: Количество проиндексированных постов.
+        """
+        return 0
+
+
+class IcontainsSearchBackend(BaseSearchBackend):
+    """
+    Поиск подстрокой без индекса для баз без полнотекстового поиска.
+    """
+
+    def search(self, queryset: QuerySet[Post], query: str) -> QuerySet[Post]:
+        return queryset.filter(
+            Q(title__icontains=query)
+            | Q(body__icontains=query)
+            | Q(author__username__icontains=query)
+        ).annotate(**{SEARCH_RANK_ANNOTATION: Value(0.0, output_field=FloatField())})
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """
+    Полнотекстовый поиск PostgreSQL по колонке blog_post.search_vector.
+
+    Колонка tsvector с GIN-индексом создается миграцией blog 0029. Заголовок,
+    тело и имя автора индексируются с весами A, B и C; тело разбирается
+    парсером PostgreSQL, который пропускает HTML-теги. Запрос разбирается
+    websearch_to_tsquery, результаты ранжируются ts_rank_cd.
+    """
+
+    VECTOR_SQL = (
+        "setweight(to_tsvector(%(config)s::regconfig, coalesce(title, '')), 'A')"
+        " || setweight(to_tsvector(%(config)s::regconfig, coalesce(body, '')), 'B')"
+        " || setweight(to_tsvector('simple', coalesce((SELECT username FROM auth_user"
+        " WHERE auth_user.id = blog_post.author_id), '')), 'C')"
+    )
+
+    def __init__(self, config: Optional[str] = None):
+        self.config = config or settings.SEARCH_CONFIG
+
+    def search(self, queryset: QuerySet[Post], query: str) -> QuerySet[Post]:
+        tsquery = "websearch_to_tsquery(%s::regconfig, %s)"
+        return queryset.filter(
+            RawSQL(
+                f"blog_post.search_vector @@ {tsquery}",
+                (self.config, query),
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            **{
+                SEARCH_RANK_ANNOTATION: RawSQL(
+                    f"ts_rank_cd(blog_post.search_vector, {tsquery})",
+                    (self.config, query),
+                    output_field=FloatField(),
+                )
+            }
+        )
+
+    def index_post(self, post: Post) -> None:
+        self._update("blog_post.id = %(post_id)s", {"post_id": post.pk})
+
+    def rebuild(self) -> int:
+        return self._update("TRUE", {})
+
+    def _update(self, where: str, params: dict) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE blog_post SET search_vector = {self.VECTOR_SQL} WHERE {where}",
+                {"config": self.config, **params},
+            )
+            return cursor.rowcount
+
+
+class SqliteFTS5SearchBackend(BaseSearchBackend):
+    """
+    Полнотекстовый поиск SQLite через виртуальную таблицу FTS5 blog_post_fts.
+
+    Таблица создается миграцией blog 0029, rowid записи совпадает с id поста.
+    Тело индексируется из простого текста body_text. Слова запроса ищутся
+    все вместе, результаты ранжируются функцией bm25, совпадения в заголовке
+    весят больше.
+    """
+
+    TABLE = "blog_post_fts"
+
+    def search(self, queryset: QuerySet[Post], query: str) -> QuerySet[Post]:
+        match = self.build_match(query)
+        if match is None:
+            return queryset.annotate(
+                **{SEARCH_RANK_ANNOTATION: Value(0.0, output_field=FloatField())}
+            ).none()
+        return queryset.filter(
+            RawSQL(
+                f"blog_post.id IN (SELECT rowid FROM {self.TABLE} "
+                f"WHERE {self.TABLE} MATCH %s)",
+                (match,),
+                output_field=BooleanField(),
+            )
+        ).annotate(
+            **{
+                SEARCH_RANK_ANNOTATION: RawSQL(
+                    f"(SELECT -bm25({self.TABLE}, 10.0, 1.0, 5.0) FROM {self.TABLE} "
+                    f"WHERE {self.TABLE} MATCH %s AND rowid = blog_post.id)",
+                    (match,),
+                    output_field=FloatField(),
+                )
+            }
+        )
+
+    @staticmethod
+    def build_match(query: str) -> Optional[str]:
+        """
+        Превращает пользовательский запрос в выражение FTS5 из слов в кавычках,
+        чтобы операторы FTS5 во вводе не ломали запрос.
+
+        args:
+            query (str): Поисковый запрос.
+
+        return:
+            Optional[str]: Выражение MATCH или None, если в запросе нет слов.
+        """
+        terms = re.findall(r"\w+", query.lower())
+        if not terms:
+            return None
+        return " ".join(f'"{term}"' for term in terms)
+
+    def index_post(self, post: Post) -> None:
+        self._write([(post.pk, post.title, post.body_text, post.author.username)])
+
+    def remove_post(self, post_id: int) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE} WHERE rowid = %s", [post_id])
+
+    def rebuild(self) -> int:
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.TABLE}")
+        rows = list(
+            Post.objects.values_list(
+                "pk", "title", "body_text", "author__username"
+            ).iterator(chunk_size=1000)
+        )
+        self._write(rows)
+        return len(rows)
+
+    def _write(self, rows: List[tuple]) -> None:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT OR REPLACE INTO {self.TABLE} (rowid, title, body, username) "
+                "VALUES (%s, %s, %s, %s)",
+                rows,
+            )
+
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    """
+    Поиск по инвертированному индексу services.search_index без изменений
+    схемы базы данных.
+
+    Индекс возвращает до SEARCH_INDEX_MAX_RESULTS лучших по BM25 постов,
+    последнее слово запроса ищется как префикс. Найденные ID накладываются
+    на QuerySet, поэтому правила видимости применяются в базе. Изменения
+    постов дописываются в общий журнал индекса, который периодически
+    объединяется с файлом задачей merge_search_index_task.
+    """
+
+    def search(self, queryset: QuerySet[Post], query: str) -> QuerySet[Post]:
+        results = get_post_index().search(
+            query, limit=settings.SEARCH_INDEX_MAX_RESULTS, prefix_last=True
+        )
+        return filter_by_results(queryset, results)
+
+    def index_post(self, post: Post) -> None:
+        get_post_index().add(
+            post.pk, tokenize_post(post.title, post.body_text, post.author.username)
+        )
+
+    def remove_post(self, post_id: int) -> None:
+        get_post_index().delete(post_id)
+
+    def rebuild(self) -> int:
+        # Изменения, записанные в журнал после этой позиции, могли не попасть
+        # в выборку из базы и переносятся в новый журнал.
+        log_position = get_log_position(settings.SEARCH_INDEX_PATH)
+        index = InvertedIndex()
+        rows = Post.objects.values_list(
+            "pk", "title", "body_text", "author__username"
+        ).iterator(chunk_size=1000)
+        for pk, title, body, username in rows:
+            index.add(pk, tokenize_post(title, body, username))
+        index.save(settings.SEARCH_INDEX_PATH, log_position)
+        return len(index)
+
+
+VENDOR_BACKENDS = {
+    "postgresql": PostgresSearchBackend,
+    "sqlite": SqliteFTS5SearchBackend,
+}
+
+
+def get_search_backend() -> BaseSearchBackend:
+    """
+    Возвращает поисковый бэкенд для текущей базы данных.
+
+    Бэкенд можно задать явно путем к классу в настройке SEARCH_BACKEND,
+    иначе он выбирается по типу базы данных. Для баз без полнотекстового
+    поиска используется поиск подстрокой.
+
+    return:
+        BaseSearchBackend: Экземпляр поискового бэкенда.
+    """
+    if settings.SEARCH_BACKEND:
+        return import_string(settings.SEARCH_BACKEND)()
+    return VENDOR_BACKENDS.get(connection.vendor, IcontainsSearchBackend)()
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Q, QuerySet
+
+from blog.models import Post
+from services.cache_tags import (
+    FEED_TAG,
+    get_or_set_tagged,
+    get_tag_versions,
+    get_tagged,
+    subscriber_tag,
+)
+from services.page_cache import ANONYMOUS_VIEWER, PUBLIC_VIEWER
+from services.search_backends import SEARCH_RANK_ANNOTATION, get_search_backend
+from subscriptions.models import Subscription
+
+HITS_KEY = "search:stats:hits"
+MISSES_KEY = "search:stats:misses"
+COALESCED_KEY = "search:stats:coalesced"
+
+_MISSING = object()
+
+
+def normalize_query(query: str) -> str:
+    """
+    Приводит запрос к виду, одинаковому для запросов, отличающихся только
+    регистром и пробелами.
+
+    args:
+        query (str): Поисковый запрос.
+
+    return:
+        str: Нормализованный запрос.
+    """
+    return " ".join(query.lower().split())
+
+
+def get_visibility_class(user: User) -> str:
+    """
+    Определяет класс видимости пользователя для кэша поиска.
+
+    Пользователи, которым доступны только публичные посты, попадают в один
+    класс с анонимными. Для остальных класс строится по набору авторов,
+    чьи посты для подписчиков им видны, поэтому подписчики одних и тех же
+    авторов делят записи кэша. Класс кэшируется для пользователя до
+    изменения его подписок или любого поста.
+
+    args:
+        user (User): Пользователь.
+
+    return:
+        str: Класс видимости.
+    """
+    if not user.is_authenticated:
+        return ANONYMOUS_VIEWER
+    return get_or_set_tagged(
+        f"search:visibility:{user.pk}",
+        [FEED_TAG, subscriber_tag(user.pk)],
+        lambda: _compute_visibility_class(user),
+    )
+
+
+def _compute_visibility_class(user: User) -> str:
+    authors = list(
+        Post.objects.filter(for_subscribers=True)
+        .filter(
+            Q(author=user)
+            | Q(
+                author__in=Subscription.objects.filter(subscriber=user).values(
+                    "author_id"
+                )
+            )
+        )
+        .order_by("author_id")
+        .values_list("author_id", flat=True)
+        .distinct()
+    )
+    if not authors:
+        return ANONYMOUS_VIEWER
+    digest = hashlib.md5(",".join(map(str, authors)).encode()).hexdigest()
+    return f"{PUBLIC_VIEWER}:{digest}"
+
+
+def get_search_cache_key(
+    query: str, filters: Optional[Dict[str, Any]], visibility_class: str
+) -> str:
+    """
+    Формирует ключ результатов поиска.
+
+    args:
+        query (str): Нормализованный запрос.
+        filters (Dict[str, Any], optional): Фильтры поиска.
+        visibility_class (str): Класс видимости из get_visibility_class.
+
+    return:
+        str: Ключ кэша.
+    """
+    payload = json.dumps(
+        [query, sorted((filters or {}).items()), settings.SEARCH_BACKEND],
+        default=str,
+    )
+    digest = hashlib.md5(payload.encode()).hexdigest()
+    return f"search:{visibility_class}:{digest}"
+
+
+def get_search_cache_stats() -> Dict[str, int]:
+    """
+    Возвращает счетчики кэша поиска.
+
+    return:
+        Dict[str, int]: Количество попаданий, промахов и запросов, дождавшихся
+        результата другого запроса.
+    """
+    values = cache.get_many([HITS_KEY, MISSES_KEY, COALESCED_KEY])
+    return {
+        "hits": values.get(HITS_KEY, 0),
+        "misses": values.get(MISSES_KEY, 0),
+        "coalesced": values.get(COALESCED_KEY, 0),
+    }
+
+
+def reset_search_cache_stats() -> None:
+    """
+    Обнуляет счетчики кэша поиска.
+    """
+    cache.delete_many([HITS_KEY, MISSES_KEY, COALESCED_KEY])
+
+
+def _count(key: str) -> None:
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def get_cached_search_results(
+    posts: QuerySet[Post], query: str, user: User, filters: Optional[Dict] = None
+) -> List[Tuple[int, float]]:
+    """
+    Получает ID и ранги найденных постов из кэша или выполняет поиск.
+
+    Записи хранятся с версией тега ленты, прочитанной до поиска, которую
+    меняет любое сохранение или удаление поста. При одновременных промахах по одному ключу поиск
+    выполняет только запрос, первым захвативший блокировку, остальные
+    ждут его результата до SEARCH_CACHE_WAIT секунд.
+
+    args:
+        posts (QuerySet[Post]): Посты, видимые пользователю, с фильтрами.
+        query (str): Поисковый запрос.
+        user (User): Пользователь.
+        filters (Dict, optional): Фильтры, уже наложенные на posts.
+
+    return:
+        List[Tuple[int, float]]: Пары (ID поста, ранг) в порядке релевантности,
+        не больше SEARCH_CACHE_MAX_RESULTS.
+    """
+    query = normalize_query(query)
+    key = get_search_cache_key(query, filters, get_visibility_class(user))
+    results = get_tagged(key, _MISSING)
+    if results is not _MISSING:
+        _count(HITS_KEY)
+        return results
+
+    lock_key = f"{key}:lock"
+    locked = cache.add(lock_key, 1, settings.SEARCH_CACHE_LOCK_TIMEOUT)
+    if not locked:
+        results = _wait_for(key)
+        if results is not _MISSING:
+            _count(COALESCED_KEY)
+            return results
+
+    _count(MISSES_KEY)
+    try:
+        versions = get_tag_versions([FEED_TAG])
+        results = _search(posts, query)
+        cache.set(key, (versions, results), settings.SEARCH_CACHE_TTL)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return results
+
+
+def _wait_for(key: str) -> Any:
+    deadline = time.monotonic() + settings.SEARCH_CACHE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(settings.SEARCH_CACHE_POLL_INTERVAL)
+        results = get_tagged(key, _MISSING)
+        if results is not _MISSING:
+            return results
+    return _MISSING
+
+
+def _search(posts: QuerySet[Post], query: str) -> List[Tuple[int, float]]:
+    return list(
+        get_search_backend()
+        .search(posts, query)
+        .order_by(f"-{SEARCH_RANK_ANNOTATION}", "-publish_date", "-id")
+        .values_list("pk", SEARCH_RANK_ANNOTATION)[: settings.SEARCH_CACHE_MAX_RESULTS]
+    )
@@ -0,0 +1,205 @@
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Mapping, Optional
+
+from django.db.models import Count, Exists, OuterRef, QuerySet
+from django.http import QueryDict
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from blog.models import Post
+
+CATEGORY_FILTER = "category"
+AUTHOR_FILTER = "author"
+DATE_FROM_FILTER = "date_from"
+DATE_TO_FILTER = "date_to"
+
+FACET_LIMIT = 20
+
+
+def parse_search_filters(params: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Извлекает фильтры поиска из параметров запроса.
+
+    Пустые значения и даты в неверном формате пропускаются. Крайние даты
+    date.min и date.max тоже пропускаются: граница дня для них выходит
+    за пределы datetime, а фильтр по ним ничего не отсекает.
+
+    args:
+        params (Mapping[str, str]): Параметры GET-запроса.
+
+    return:
+        Dict[str, Any]: Слаг категории, имя автора и границы дат публикации.
+    """
+    filters = {}
+    for name in (CATEGORY_FILTER, AUTHOR_FILTER):
+        value = params.get(name, "").strip()
+        if value:
+            filters[name] = value
+    for name in (DATE_FROM_FILTER, DATE_TO_FILTER):
+        try:
+            value = parse_date(params.get(name, ""))
+        except ValueError:
+            value = None
+        if value is not None and date.min < value < date.max:
+            filters[name] = value
+    return filters
+
+
+def apply_search_filters(
+    posts: QuerySet[Post], filters: Dict[str, Any], exclude: Optional[str] = None
+) -> QuerySet[Post]:
+    """
+    Накладывает фильтры поиска на посты.
+
+    Категория проверяется через EXISTS, поэтому посты не дублируются
+    и сортировка по релевантности сохраняется.
+
+    args:
+        posts (QuerySet[Post]): Посты.
+        filters (Dict[str, Any]): Фильтры из parse_search_filters.
+        exclude (str, optional): Фильтр, который нужно пропустить.
+
+    return:
+        QuerySet[Post]: Отфильтрованные посты.
+    """
+    filters = {name: value for name, value in filters.items() if name != exclude}
+    if CATEGORY_FILTER in filters:
+        posts = posts.filter(
+            Exists(
+                Post.categories.through.objects.filter(
+                    post_id=OuterRef("pk"), category__slug=filters[CATEGORY_FILTER]
+                )
+            )
+        )
+    if AUTHOR_FILTER in filters:
+        posts = posts.filter(author__username=filters[AUTHOR_FILTER])
+    if DATE_FROM_FILTER in filters:
+        posts = posts.filter(publish_date__gte=_day_start(filters[DATE_FROM_FILTER]))
+    if DATE_TO_FILTER in filters:
+        posts = posts.filter(
+            publish_date__lt=_day_start(filters[DATE_TO_FILTER] + timedelta(days=1))
+        )
+    return posts
+
+
+def _day_start(day: date) -> datetime:
+    """
+    Начало дня в текущем часовом поясе. Дата публикации сравнивается
+    с границами дней, а не приводится к дате, чтобы работали индексы
+    по publish_date.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def get_search_facets(
+    posts: QuerySet[Post], filters: Dict[str, Any], params: QueryDict
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Считает количество найденных постов по категориям и авторам.
+
+    Каждый фасет считается одним запросом с GROUP BY по результатам поиска
+    со всеми фильтрами, кроме собственного, поэтому число запросов
+    не зависит от количества категорий и авторов. Для каждого значения
+    формируется строка запроса, выбирающая или снимающая его.
+
+    args:
+        posts (QuerySet[Post]): Результаты поиска без фильтров фасетов.
+        filters (Dict[str, Any]): Фильтры из parse_search_filters.
+        params (QueryDict): Параметры текущего запроса.
+
+    return:
+        Dict[str, List[Dict[str, Any]]]: Значения фасетов categories и authors
+        с полями value, label, count, selected и query_string.
+    """
+    category_rows = _count_by(
+        apply_search_filters(posts, filters, CATEGORY_FILTER),
+        "categories__slug",
+        "categories__name",
+    )
+    author_rows = _count_by(
+        apply_search_filters(posts, filters, AUTHOR_FILTER), "author__username"
+    )
+    return {
+        "categories": [
+            _facet_value(
+                CATEGORY_FILTER,
+                row["categories__slug"],
+                row["categories__name"],
+                row["count"],
+                filters,
+                params,
+            )
+            for row in category_rows
+            if row["categories__slug"] is not None
+        ],
+        "authors": [
+            _facet_value(
+                AUTHOR_FILTER,
+                row["author__username"],
+                row["author__username"],
+                row["count"],
+                filters,
+                params,
+            )
+            for row in author_rows
+        ],
+    }
+
+
+def get_search_query_string(params: QueryDict) -> str:
+    """
+    Возвращает параметры поиска без номера страницы и курсора для ссылок
+    пагинации.
+
+    args:
+        params (QueryDict): Параметры текущего запроса.
+
+    return:
+        str: Закодированная строка параметров.
+    """
+    return _without_paging(params).urlencode()
+
+
+def _without_paging(params: QueryDict) -> QueryDict:
+    params = params.copy()
+    params.pop("page", None)
+    params.pop("cursor", None)
+    return params
+
+
+def _count_by(posts: QuerySet[Post], *fields: str) -> QuerySet:
+    """
+    Группирует найденные посты по полям и считает их количество.
+
+    Группировка выполняется над самим запросом поиска, а не подзапросом,
+    потому что выражения бэкендов ссылаются на таблицу blog_post по имени.
+    """
+    return (
+        posts.order_by()
+        .values(*fields)
+        .annotate(count=Count("pk", distinct=True))
+        .order_by("-count", *fields)[:FACET_LIMIT]
+    )
+
+
+def _facet_value(
+    name: str,
+    value: str,
+    label: str,
+    count: int,
+    filters: Dict[str, Any],
+    params: QueryDict,
+) -> Dict[str, Any]:
+    selected = filters.get(name) == value
+    params = _without_paging(params)
+    if selected:
+        params.pop(name, None)
+    else:
+        params[name] = value
+    return {
+        "value": value,
+        "label": label,
+        "count": count,
+        "selected": selected,
+        "query_string": params.urlencode(),
+    }
@@ -0,0 +1,717 @@
+import array
+import bisect
+import fcntl
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_TERM_RE = re.compile(r"\w+\*?")
+
+MAGIC = b"PSI1"
+HEADER = struct.Struct("<4sIIQQQ")
+TERM_ENTRY = struct.Struct("<HIQI")
+
+# Массивы ID и длин документов хранятся в файле 4-байтными числами
+# little-endian. Размер элементов array зависит от платформы, поэтому код
+# типа выбирается по itemsize.
+UINT32 = next(code for code in "IL" if array.array(code).itemsize == 4)
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+LOG_SUFFIX = ".log"
+LOCK_SUFFIX = ".lock"
+ADD_RECORD = "+"
+DELETE_RECORD = "-"
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_PREFIX_EXPANSIONS = 50
+POSTINGS_CACHE_SIZE = 256
+
+Postings = Tuple[array.array, array.array]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбивает текст на слова в нижнем регистре.
+
+    args:
+        text (str): Текст.
+
+    return:
+        List[str]: Слова текста.
+    """
+    return TOKEN_RE.findall(text.lower())
+
+
+def tokenize_post(title: str, body: str, username: str = "") -> List[str]:
+    """
+    Разбивает на слова заголовок, простой текст тела поста и имя автора.
+
+    args:
+        title (str): Заголовок поста.
+        body (str): Тело поста без разметки (Post.body_text).
+        username (str, optional): Имя автора.
+
+    return:
+        List[str]: Слова поста.
+    """
+    return tokenize(f"{title} {body} {username}")
+
+
+def encode_postings(doc_ids: Iterable[int], freqs: Iterable[int]) -> bytes:
+    """
+    Кодирует список вхождений: разности соседних номеров документов и частоты
+    записываются чередующимися varint.
+
+    args:
+        doc_ids (Iterable[int]): Возрастающие номера документов.
+        freqs (Iterable[int]): Частоты слова в документах.
+
+    return:
+        bytes: Закодированный список вхождений.
+    """
+    out = bytearray()
+    previous = 0
+    for doc_id, freq in zip(doc_ids, freqs):
+        for value in (doc_id - previous, freq):
+            while value >= 0x80:
+                out.append((value & 0x7F) | 0x80)
+                value >>= 7
+            out.append(value)
+        previous = doc_id
+    return bytes(out)
+
+
+def decode_postings(data) -> Postings:
+    """
+    Декодирует список вхождений, закодированный encode_postings.
+
+    args:
+        data: bytes или memoryview с закодированными вхождениями.
+
+    return:
+        Postings: Массивы номеров документов и частот.
+    """
+    doc_ids = array.array(UINT32)
+    freqs = array.array(UINT32)
+    values = []
+    value = shift = 0
+    for byte in bytes(data):
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values.append(value)
+        value = shift = 0
+    previous = 0
+    for i in range(0, len(values), 2):
+        previous += values[i]
+        doc_ids.append(previous)
+        freqs.append(values[i + 1])
+    return doc_ids, freqs
+
+
+def pack_uint32(values: Iterable[int]) -> bytes:
+    """
+    Упаковывает числа в 4-байтные little-endian значения.
+
+    args:
+        values (Iterable[int]): Числа.
+
+    return:
+        bytes: Упакованные числа.
+    """
+    packed = array.array(UINT32, values)
+    if not LITTLE_ENDIAN:
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_uint32(view: memoryview):
+    """
+    Читает 4-байтные little-endian числа. На little-endian платформах
+    возвращается представление без копирования, на остальных копия
+    с переставленными байтами.
+
+    args:
+        view (memoryview): Упакованные числа.
+
+    return:
+        memoryview или array.array с числами.
+    """
+    if LITTLE_ENDIAN:
+        return view.cast(UINT32)
+    values = array.array(UINT32, view.tobytes())
+    values.byteswap()
+    return values
+
+
+class MemorySegment:
+    """
+    Изменяемый сегмент индекса в памяти для добавленных и обновленных документов.
+
+    Вхождения слова хранятся в двух массивах, упорядоченных по ID документа.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Postings] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self.total_length = 0
+
+    def add(self, doc_id: int, tokens: List[str]) -> None:
+        self.remove(doc_id)
+        counts = Counter(tokens)
+        for term, freq in counts.items():
+            doc_ids, freqs = self.postings.setdefault(
+                term, (array.array(UINT32), array.array(UINT32))
+            )
+            position = bisect.bisect_left(doc_ids, doc_id)
+            doc_ids.insert(position, doc_id)
+            freqs.insert(position, freq)
+        self.doc_lengths[doc_id] = len(tokens)
+        self.doc_terms[doc_id] = tuple(counts)
+        self.total_length += len(tokens)
+
+    def remove(self, doc_id: int) -> bool:
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return False
+        for term in terms:
+            doc_ids, freqs = self.postings[term]
+            position = bisect.bisect_left(doc_ids, doc_id)
+            del doc_ids[position]
+            del freqs[position]
+            if not doc_ids:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        return True
+
+
+class FileSegment:
+    """
+    Неизменяемый сегмент индекса, отображенный в память из файла.
+
+    Формат файла: заголовок, массив ID документов, массив длин документов,
+    словарь слов в алфавитном порядке со ссылками на вхождения и сами
+    вхождения, закодированные encode_postings. Вместо ID документа во
+    вхождениях хранится его позиция в массиве документов, чтобы длина
+    документа для BM25 читалась без поиска. Массивы документов читаются
+    из отображения без копирования, вхождения декодируются по запросу,
+    поэтому процессы, открывшие один файл, делят его страницы в памяти.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        stat = os.stat(path)
+        self.inode = stat.st_ino
+        self.mtime = stat.st_mtime_ns
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        (
+            magic,
+            doc_count,
+            term_count,
+            self.total_length,
+            terms_offset,
+            self._postings_offset,
+        ) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} не является файлом поискового индекса")
+
+        offset = HEADER.size
+        self.doc_ids = unpack_uint32(view[offset : offset + doc_count * 4])
+        offset += doc_count * 4
+        self.doc_lengths = unpack_uint32(view[offset : offset + doc_count * 4])
+
+        self.terms: Dict[str, Tuple[int, int]] = {}
+        offset = terms_offset
+        for _ in range(term_count):
+            length, _, postings_offset, size = TERM_ENTRY.unpack_from(
+                self._mmap, offset
+            )
+            offset += TERM_ENTRY.size
+            term = bytes(view[offset : offset + length]).decode()
+            offset += length
+            self.terms[term] = (postings_offset, size)
+        view.release()
+        self.sorted_terms = list(self.terms)
+        self._cache: "OrderedDict[str, Postings]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def postings(self, term: str) -> Optional[Postings]:
+        if term in self._cache:
+            self._cache.move_to_end(term)
+            return self._cache[term]
+        entry = self.terms.get(term)
+        if entry is None:
+            return None
+        start = self._postings_offset + entry[0]
+        postings = decode_postings(memoryview(self._mmap)[start : start + entry[1]])
+        self._cache[term] = postings
+        if len(self._cache) > POSTINGS_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return postings
+
+    def doc_length(self, doc_id: int) -> Optional[int]:
+        position = bisect.bisect_left(self.doc_ids, doc_id)
+        if position < len(self.doc_ids) and self.doc_ids[position] == doc_id:
+            return self.doc_lengths[position]
+        return None
+
+    def close(self) -> None:
+        self._cache.clear()
+        for values in (self.doc_ids, self.doc_lengths):
+            if isinstance(values, memoryview):
+                values.release()
+        self._mmap.close()
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс с ранжированием BM25 и префиксными запросами.
+
+    Индекс состоит из сегмента в файле и журнала изменений рядом с ним,
+    общих для всех процессов, и сегмента в памяти процесса с документами
+    из журнала. add и delete дописывают запись в журнал, а refresh
+    применяет записи, добавленные другими процессами, поэтому изменения
+    видны всем процессам и переживают перезапуск. Документы файла, которые
+    были удалены или обновлены, маскируются. save записывает объединенный
+    индекс в новый файл, атомарно подменяет старый и очищает журнал;
+    остальные процессы подхватывают новый файл в refresh.
+
+    Запись журнала содержит документ целиком, поэтому повторное применение
+    журнала поверх файла, в который он уже объединен, не меняет результат.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Инициализирует экземпляр класса InvertedIndex.
+
+        args:
+            path (str, optional): Файл индекса. Если файл существует, он
+                отображается в память, затем применяется журнал изменений.
+                Без пути индекс хранится только в памяти процесса.
+        """
+        self.path = path
+        self.base: Optional[FileSegment] = None
+        self.memory = MemorySegment()
+        self.masked: set = set()
+        self.deleted: set = set()
+        self._log_inode: Optional[int] = None
+        self._log_offset = 0
+        self._lock = threading.RLock()
+        if path:
+            self._reload()
+
+    def __len__(self) -> int:
+        base_count = len(self.base) - len(self.masked) if self.base else 0
+        return base_count + len(self.memory.doc_lengths)
+
+    def add(self, doc_id: int, tokens: List[str]) -> None:
+        """
+        Добавляет документ или заменяет его прежнюю версию.
+
+        args:
+            doc_id (int): ID документа.
+            tokens (List[str]): Слова документа.
+        """
+        self._write(f"{ADD_RECORD} {doc_id} {' '.join(tokens)}", doc_id, tokens)
+
+    def delete(self, doc_id: int) -> None:
+        """
+        Удаляет документ из индекса.
+
+        args:
+            doc_id (int): ID документа.
+        """
+        self._write(f"{DELETE_RECORD} {doc_id}", doc_id, None)
+
+    def _write(self, record: str, doc_id: int, tokens: Optional[List[str]]) -> None:
+        with self._lock:
+            if not self.path:
+                self._apply(doc_id, tokens)
+                return
+            # Запись применяется при чтении журнала, чтобы изменения всех
+            # процессов применялись в одном порядке.
+            with self._file_lock(self.path):
+                with open(self.path + LOG_SUFFIX, "ab") as log:
+                    log.write(f"{record}\n".encode())
+            self._replay_log()
+
+    def _apply(self, doc_id: int, tokens: Optional[List[str]]) -> None:
+        self._mask_base(doc_id)
+        if tokens is None:
+            self.deleted.add(doc_id)
+            self.memory.remove(doc_id)
+        else:
+            self.deleted.discard(doc_id)
+            self.memory.add(doc_id, tokens)
+
+    def _mask_base(self, doc_id: int) -> None:
+        if self.base is not None and self.base.doc_length(doc_id) is not None:
+            self.masked.add(doc_id)
+
+    def _total_length(self) -> int:
+        total = self.memory.total_length
+        if self.base is not None:
+            total += self.base.total_length
+            total -= sum(self.base.doc_length(doc_id) for doc_id in self.masked)
+        return total
+
+    def _vocabulary(self, prefix: str) -> List[str]:
+        terms = set()
+        if self.base is not None:
+            sorted_terms = self.base.sorted_terms
+            position = bisect.bisect_left(sorted_terms, prefix)
+            while position < len(sorted_terms) and sorted_terms[position].startswith(
+                prefix
+            ):
+                terms.add(sorted_terms[position])
+                position += 1
+                if len(terms) >= MAX_PREFIX_EXPANSIONS:
+                    break
+        terms.update(term for term in self.memory.postings if term.startswith(prefix))
+        return sorted(terms)[:MAX_PREFIX_EXPANSIONS]
+
+    def _live_postings(self, term: str) -> Iterator[Tuple[int, int, int]]:
+        """
+        Перебирает вхождения слова в живых документах: ID, частота, длина.
+        """
+        if self.base is not None:
+            postings = self.base.postings(term)
+            if postings is not None:
+                doc_ids, doc_lengths = self.base.doc_ids, self.base.doc_lengths
+                for position, freq in zip(*postings):
+                    doc_id = doc_ids[position]
+                    if doc_id not in self.masked:
+                        yield doc_id, freq, doc_lengths[position]
+        postings = self.memory.postings.get(term)
+        if postings is not None:
+            for doc_id, freq in zip(*postings):
+                yield doc_id, freq, self.memory.doc_lengths[doc_id]
+
+    def search(
+        self, query: str, limit: int = 100, prefix_last: bool = False
+    ) -> List[Tuple[int, float]]:
+        """
+        Ищет документы, содержащие все слова запроса, и ранжирует их по BM25.
+
+        Слово со звездочкой на конце ищется как префикс. Совпадения с разными
+        словами одного префикса суммируются.
+
+        args:
+            query (str): Поисковый запрос.
+            limit (int, optional): Максимальное количество результатов.
+            prefix_last (bool, optional): Искать последнее слово как префикс,
+                например для поиска по мере ввода.
+
+        return:
+            List[Tuple[int, float]]: ID документов и их оценки по убыванию оценки.
+        """
+        query_terms = QUERY_TERM_RE.findall(query.lower())
+        if not query_terms:
+            return []
+        if prefix_last and not query_terms[-1].endswith("*"):
+            query_terms[-1] += "*"
+
+        with self._lock:
+            doc_count = len(self)
+            if not doc_count:
+                return []
+            average_length = self._total_length() / doc_count
+
+            scores: Optional[Dict[int, float]] = None
+            for query_term in query_terms:
+                if query_term.endswith("*"):
+                    terms = self._vocabulary(query_term[:-1])
+                else:
+                    terms = [query_term]
+                term_scores: Dict[int, float] = {}
+                for term in terms:
+                    entries = list(self._live_postings(term))
+                    if not entries:
+                        continue
+                    idf = math.log(
+                        1 + (doc_count - len(entries) + 0.5) / (len(entries) + 0.5)
+                    )
+                    for doc_id, freq, length in entries:
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                        term_scores[doc_id] = term_scores.get(doc_id, 0.0) + idf * (
+                            freq * (BM25_K1 + 1) / (freq + norm)
+                        )
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {
+                        doc_id: score + term_scores[doc_id]
+                        for doc_id, score in scores.items()
+                        if doc_id in term_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return ranked[:limit]
+
+    def save(
+        self, path: Optional[str] = None, log_position: Optional[Tuple[int, int]] = None
+    ) -> None:
+        """
+        Записывает объединенный индекс в файл и переключается на него.
+
+        Файл пишется во временный файл рядом и подменяется через os.replace,
+        поэтому процессы, читающие старый файл, не видят его частично
+        записанным. Записи журнала, не вошедшие в индекс, переносятся в новый
+        журнал под блокировкой, чтобы не потерять изменения других процессов.
+
+        args:
+            path (str, optional): Файл индекса, по умолчанию path экземпляра.
+            log_position (Tuple[int, int], optional): Позиция журнала path из
+                get_log_position, до которой изменения уже учтены в индексе,
+                например снятая перед перестроением индекса из базы. Журнал
+                собственного файла индекса сначала применяется целиком.
+                Без позиции журнал переносится полностью.
+        """
+        path = path or self.path
+        with self._lock:
+            if path == self.path:
+                self._replay_log()
+                log_position = (self._log_inode, self._log_offset)
+
+            documents = {}
+            if self.base is not None:
+                for doc_id, length in zip(self.base.doc_ids, self.base.doc_lengths):
+                    if doc_id not in self.masked:
+                        documents[doc_id] = length
+            documents.update(self.memory.doc_lengths)
+            doc_ids = sorted(documents)
+            positions = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+
+            terms = set(self.memory.postings)
+            if self.base is not None:
+                terms.update(self.base.terms)
+            entries = []
+            blobs = []
+            postings_size = 0
+            for term in sorted(terms):
+                merged = sorted(
+                    (positions[doc_id], freq)
+                    for doc_id, freq, _ in self._live_postings(term)
+                )
+                if not merged:
+                    continue
+                blob = encode_postings(*zip(*merged))
+                encoded = term.encode()
+                entries.append(
+                    TERM_ENTRY.pack(len(encoded), len(merged), postings_size, len(blob))
+                    + encoded
+                )
+                blobs.append(blob)
+                postings_size += len(blob)
+
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(descriptor, "wb") as file:
+                terms_blob = b"".join(entries)
+                terms_offset = HEADER.size + len(doc_ids) * 8
+                file.write(
+                    HEADER.pack(
+                        MAGIC,
+                        len(doc_ids),
+                        len(entries),
+                        sum(documents.values()),
+                        terms_offset,
+                        terms_offset + len(terms_blob),
+                    )
+                )
+                file.write(pack_uint32(doc_ids))
+                file.write(pack_uint32(documents[i] for i in doc_ids))
+                file.write(terms_blob)
+                for blob in blobs:
+                    file.write(blob)
+
+            with self._file_lock(path):
+                os.replace(temp_path, path)
+                self._truncate_log(path, log_position)
+
+            self.path = path
+            self._reload()
+
+    @staticmethod
+    def _truncate_log(path: str, log_position: Optional[Tuple[int, int]]) -> None:
+        """
+        Заменяет журнал новым файлом с записями после log_position. Если журнал
+        с тех пор заменили, он переносится целиком.
+        """
+        log_path = path + LOG_SUFFIX
+        try:
+            log = open(log_path, "rb")
+        except FileNotFoundError:
+            return
+        with log:
+            if log_position is not None:
+                inode, offset = log_position
+                if inode == os.fstat(log.fileno()).st_ino:
+                    log.seek(offset)
+            rest = log.read()
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp"
+        )
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(rest)
+        os.replace(temp_path, log_path)
+
+    def refresh(self) -> bool:
+        """
+        Применяет изменения, записанные другими процессами.
+
+        Если файл индекса перезаписан, он открывается заново и журнал
+        применяется с начала, иначе применяются только новые записи журнала.
+
+        return:
+            bool: True, если индекс изменился.
+        """
+        if not self.path:
+            return False
+        try:
+            stat = os.stat(self.path)
+            version = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            version = None
+        base_version = (self.base.inode, self.base.mtime) if self.base else None
+        with self._lock:
+            if version != base_version:
+                self._reload()
+                return True
+            return self._replay_log()
+
+    def _reload(self) -> None:
+        old = self.base
+        self.base = FileSegment(self.path) if os.path.exists(self.path) else None
+        if old is not None:
+            old.close()
+        self.memory = MemorySegment()
+        self.masked = set()
+        self.deleted = set()
+        self._log_inode = None
+        self._log_offset = 0
+        self._replay_log()
+
+    def _replay_log(self) -> bool:
+        """
+        Применяет записи журнала, добавленные после последнего чтения.
+
+        Недописанная последняя строка откладывается до следующего чтения.
+        Если журнал заменен другим процессом при сохранении индекса, индекс
+        загружается заново.
+        """
+        try:
+            log = open(self.path + LOG_SUFFIX, "rb")
+        except FileNotFoundError:
+            return False
+        with log:
+            stat = os.fstat(log.fileno())
+            if stat.st_ino == self._log_inode and stat.st_size == self._log_offset:
+                return False
+            replaced = self._log_inode is not None and stat.st_ino != self._log_inode
+            if not replaced:
+                self._log_inode = stat.st_ino
+                log.seek(self._log_offset)
+                data = log.read()
+        if replaced:
+            self._reload()
+            return True
+
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode().splitlines():
+            kind, doc_id, *tokens = line.split()
+            self._apply(int(doc_id), tokens if kind == ADD_RECORD else None)
+        self._log_offset += end
+        return end > 0
+
+    @staticmethod
+    @contextmanager
+    def _file_lock(path: str):
+        """
+        Блокировка файла индекса между процессами на запись в журнал
+        и подмену файлов.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + LOCK_SUFFIX, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def get_log_position(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Возвращает текущую позицию конца журнала изменений файла индекса.
+
+    args:
+        path (str): Файл индекса.
+
+    return:
+        Optional[Tuple[int, int]]: Inode и размер журнала или None, если
+        журнала нет.
+    """
+    try:
+        stat = os.stat(path + LOG_SUFFIX)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size
+
+
+_post_index: Optional[InvertedIndex] = None
+_post_index_lock = threading.Lock()
+
+
+def get_post_index() -> InvertedIndex:
+    """
+    Возвращает индекс постов процесса, открытый из SEARCH_INDEX_PATH.
+
+    При каждом обращении применяются изменения других процессов: новые записи
+    журнала или перезаписанный файл индекса.
+
+    return:
+        InvertedIndex: Индекс постов.
+    """
+    global _post_index
+    with _post_index_lock:
+        if _post_index is None or _post_index.path != settings.SEARCH_INDEX_PATH:
+            _post_index = InvertedIndex(settings.SEARCH_INDEX_PATH)
+        else:
+            _post_index.refresh()
+        return _post_index
+
+
+def merge_post_index() -> bool:
+    """
+    Объединяет журнал изменений индекса постов с файлом индекса, чтобы журнал
+    и сегмент в памяти процессов не росли без ограничений.
+
+    return:
+        bool: True, если в журнале были изменения и индекс перезаписан.
+    """
+    position = get_log_position(settings.SEARCH_INDEX_PATH)
+    if position is None or not position[1]:
+        return False
+    get_post_index().save()
+    return True
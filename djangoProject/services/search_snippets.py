@@ -0,0 +1,148 @@
+import html
+import re
+from typing import Iterable, Optional, Pattern
+
+from django.utils.html import escape, strip_tags
+from django.utils.safestring import SafeString, mark_safe
+
+BLOCK_TAG_RE = re.compile(r"<(?:br|/p|/div|/li|/h[1-6]|/tr|/blockquote)\b[^>]*>", re.I)
+WHITESPACE_RE = re.compile(r"\s+")
+TERM_RE = re.compile(r"\w+")
+
+SNIPPET_LENGTH = 240
+SNIPPET_CONTEXT = 60
+ELLIPSIS = "…"
+
+
+def html_to_text(body: str) -> str:
+    """
+    Превращает HTML тела поста в простой текст для поиска и сниппетов.
+
+    Закрывающие блочные теги заменяются пробелом, чтобы слова соседних
+    абзацев не склеивались, HTML-сущности раскодируются.
+
+    args:
+        body (str): HTML тела поста.
+
+    return:
+        str: Текст без разметки с одиночными пробелами.
+    """
+    text = strip_tags(BLOCK_TAG_RE.sub(" ", body or ""))
+    return WHITESPACE_RE.sub(" ", html.unescape(text)).strip()
+
+
+def compile_highlight_pattern(query: str) -> Optional[Pattern]:
+    """
+    Собирает регулярное выражение для подсветки слов запроса.
+
+    Слова ищутся с начала слова текста, поэтому подсвечиваются и формы
+    с другими окончаниями, которые находит полнотекстовый поиск.
+
+    args:
+        query (str): Поисковый запрос.
+
+    return:
+        Optional[Pattern]: Выражение или None, если в запросе нет слов.
+    """
+    terms = sorted(set(TERM_RE.findall(query.lower())), key=len, reverse=True)
+    if not terms:
+        return None
+    alternatives = "|".join(re.escape(term) for term in terms)
+    return re.compile(rf"\b(?:{alternatives})\w*", re.I)
+
+
+def highlight(text: str, pattern: Optional[Pattern]) -> SafeString:
+    """
+    Экранирует текст и выделяет в нем слова запроса тегом mark.
+
+    args:
+        text (str): Простой текст, например заголовок поста.
+        pattern (Optional[Pattern]): Выражение из compile_highlight_pattern.
+
+    return:
+        SafeString: Безопасный HTML.
+    """
+    if pattern is None:
+        return escape(text)
+    return build_snippet(text, pattern, length=len(text), context=len(text))
+
+
+def build_snippet(
+    text: str,
+    pattern: Optional[Pattern],
+    length: int = SNIPPET_LENGTH,
+    context: int = SNIPPET_CONTEXT,
+) -> SafeString:
+    """
+    Вырезает из текста фрагмент вокруг первого совпадения и подсвечивает в нем
+    слова запроса за один проход по тексту.
+
+    Фрагмент начинается за context символов до первого совпадения и имеет
+    длину до length символов, границы сдвигаются к пробелам, чтобы не резать
+    слова. Если совпадений в тексте нет, берется его начало.
+
+    args:
+        text (str): Простой текст тела поста.
+        pattern (Optional[Pattern]): Выражение из compile_highlight_pattern.
+        length (int, optional): Максимальная длина фрагмента.
+        context (int, optional): Количество символов перед первым совпадением.
+
+    return:
+        SafeString: Безопасный HTML фрагмента с тегами mark.
+    """
+    start = end = None
+    position = 0
+    parts = []
+    matches = pattern.finditer(text) if pattern is not None else ()
+    for match in matches:
+        if start is None:
+            start = min(_word_start(text, match.start() - context), match.start())
+            end = start + length
+            position = start
+        if match.end() > end:
+            break
+        parts.append(escape(text[position : match.start()]))
+        parts.append(f"<mark>{escape(match.group())}</mark>")
+        position = match.end()
+
+    if start is None:
+        start = position = 0
+        end = length
+    if end < len(text):
+        end = max(_word_end(text, end), position)
+    else:
+        end = len(text)
+    parts.append(escape(text[position:end]))
+
+    prefix = ELLIPSIS if start > 0 else ""
+    suffix = ELLIPSIS if end < len(text) else ""
+    return mark_safe(prefix + "".join(parts).strip() + suffix)
+
+
+def _word_start(text: str, index: int) -> int:
+    if index <= 0:
+        return 0
+    return text.find(" ", index) + 1 or index
+
+
+def _word_end(text: str, index: int) -> int:
+    space = text.rfind(" ", 0, index + 1)
+    return space if space > 0 else index
+
+
+def annotate_snippets(posts: Iterable, query: str) -> None:
+    """
+    Записывает в атрибуты highlighted_title и snippet каждого поста
+    подсвеченный заголовок и фрагмент простого текста тела.
+
+    Используется только поле body_text, поэтому HTML тела не нужен
+    и не загружается.
+
+    args:
+        posts (Iterable): Посты страницы результатов поиска.
+        query (str): Поисковый запрос.
+    """
+    pattern = compile_highlight_pattern(query)
+    for post in posts:
+        post.highlighted_title = highlight(post.title, pattern)
+        post.snippet = build_snippet(post.body_text, pattern)
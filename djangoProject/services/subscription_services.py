@@ -7,12 +7,16 @@ from django.urls import reverse
 from notifications.models import Notification
 from blog.models import Post
 from subscriptions.models import Subscription
+from services.notifications_services import build_notification, send_notification
 
 
 def subscribe_user_to_author(subscriber: User, author_id: int) -> HttpResponseRedirect:
     """
     Подписывает пользователя на автора и создает уведомление для автора.
 
+    Повторная подписка на того же автора уведомление не создает, поэтому
+    счетчик событий объединенного уведомления не растет.
+
     args:
         subscriber (User): Пользователь, который подписывается.
         author_id (int): ID автора, на которого подписываются.
@@ -22,14 +26,22 @@ def subscribe_user_to_author(subscriber: User, author_id: int) -> HttpResponseRe
     """
     author = get_object_or_404(User, id=author_id)
     if subscriber != author:
-        Subscription.objects.get_or_create(subscriber=subscriber, author=author)
-        Notification.objects.create(
-            user=author,
-            sender=subscriber,
-            sender_name=subscriber.username,
-            message=f"Пользователь {subscriber.username} подписался на ваши обновления: -",
-            is_new=True,
+        subscription, created = Subscription.objects.get_or_create(
+            subscriber=subscriber, author=author
         )
+        if created:
+            send_notification(
+                build_notification(
+                    author.pk,
+                    subscriber,
+                    Notification.Type.SUBSCRIPTION,
+                    f"Пользователь {subscriber.username} подписался на ваши обновления",
+                    target=subscription,
+                    url=reverse("user_profile", args=[subscriber.username]),
+                    dedup_key=f"subscription:{subscription.pk}",
+                    group_key="subscription",
+                )
+            )
     return HttpResponseRedirect(reverse("user_profile", args=[author.username]))
 
 
@@ -0,0 +1,272 @@
+import heapq
+from itertools import islice
+from typing import Any, Iterable, List, Set, Union
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery
+
+from blog.models import Post, TimelineEntry
+from subscriptions.models import Subscription
+
+PULL_AUTHORS_CACHE_KEY = "timeline:pull_authors"
+FANOUT_BATCH_SIZE = 1000
+
+
+class MergedQuerySet:
+    """
+    Несколько непересекающихся QuerySet с одинаковой сортировкой, которые
+    читаются отдельными запросами и сливаются по ключу сортировки.
+
+    Методы QuerySet, возвращающие QuerySet (filter, annotate, order_by и т.д.),
+    применяются к каждому источнику. Срез [start:stop] выбирает из каждого
+    источника первые stop записей и сливает их, поэтому каждый источник
+    читается своим индексным диапазоном. Объект подходит для Paginator
+    и CursorPaginator.
+    """
+
+    def __init__(self, querysets: Iterable[QuerySet]):
+        """
+        Инициализирует экземпляр класса MergedQuerySet.
+
+        args:
+            querysets (Iterable[QuerySet]): Источники записей.
+        """
+        self.querysets = list(querysets)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        methods = [getattr(queryset, name) for queryset in self.querysets]
+        if not all(callable(method) for method in methods):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return MergedQuerySet(apply(*args, **kwargs) for apply in methods)
+
+        return method
+
+    @property
+    def ordered(self) -> bool:
+        return all(queryset.ordered for queryset in self.querysets)
+
+    def count(self) -> int:
+        return sum(queryset.count() for queryset in self.querysets)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Any, List[Any]]:
+        if isinstance(key, int):
+            return self[key : key + 1][0]
+        start, stop = key.start or 0, key.stop
+        ordering = self.querysets[0].query.order_by if self.querysets else ()
+        fields = [field.lstrip("-") for field in ordering]
+        sources = [
+            queryset if stop is None else queryset[:stop] for queryset in self.querysets
+        ]
+        merged = heapq.merge(
+            *sources,
+            key=lambda obj: tuple(getattr(obj, field) for field in fields),
+            reverse=bool(ordering) and ordering[0].startswith("-"),
+        )
+        return list(islice(merged, start, stop))
+
+
+def get_pull_author_ids() -> Set[int]:
+    """
+    Получает ID авторов, чьи посты не раскладываются по лентам при публикации.
+
+    Это авторы с количеством подписчиков больше TIMELINE_FANOUT_LIMIT. Их посты
+    подтягиваются в ленту при чтении. Набор кэшируется на CACHE_TTL секунд.
+
+    return:
+        Set[int]: Множество ID авторов.
+    """
+    author_ids = cache.get(PULL_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        author_ids = set(
+            Subscription.objects.values("author_id")
+            .annotate(subscribers_count=Count("id"))
+            .filter(subscribers_count__gt=settings.TIMELINE_FANOUT_LIMIT)
+            .values_list("author_id", flat=True)
+        )
+        cache.set(PULL_AUTHORS_CACHE_KEY, author_ids, settings.CACHE_TTL)
+    return author_ids
+
+
+def is_pull_author(author_id: int) -> bool:
+    """
+    Проверяет, превышает ли число подписчиков автора порог рассылки по лентам.
+
+    args:
+        author_id (int): ID автора.
+
+    return:
+        bool: True, если посты автора подтягиваются в ленту при чтении.
+    """
+    limit = settings.TIMELINE_FANOUT_LIMIT
+    return Subscription.objects.filter(author_id=author_id)[limit : limit + 1].exists()
+
+
+def fan_out_post(post: Post) -> None:
+    """
+    Добавляет новый пост в ленты подписчиков автора.
+
+    Подписчики читаются пачками, записи ленты вставляются через bulk_create,
+    после чего ленты затронутых пользователей обрезаются до TIMELINE_MAX_LENGTH.
+    Посты авторов с большим числом подписчиков не раскладываются.
+
+    args:
+        post (Post): Опубликованный пост.
+    """
+    if is_pull_author(post.author_id):
+        cache.delete(PULL_AUTHORS_CACHE_KEY)
+        return
+
+    subscriber_ids = (
+        Subscription.objects.filter(author_id=post.author_id)
+        .values_list("subscriber_id", flat=True)
+        .iterator(chunk_size=FANOUT_BATCH_SIZE)
+    )
+    batch = []
+    for subscriber_id in subscriber_ids:
+        batch.append(subscriber_id)
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            _write_entries(post, batch)
+            batch = []
+    if batch:
+        _write_entries(post, batch)
+
+
+def _write_entries(post: Post, user_ids: list) -> None:
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, publish_date=post.publish_date)
+            for user_id in user_ids
+        ),
+        ignore_conflicts=True,
+    )
+    trim_timelines(user_ids)
+
+
+def trim_timelines(user_ids: Iterable[int]) -> None:
+    """
+    Удаляет записи, выходящие за TIMELINE_MAX_LENGTH, из лент пользователей.
+
+    args:
+        user_ids (Iterable[int]): ID пользователей, чьи ленты нужно обрезать.
+    """
+    limit = settings.TIMELINE_MAX_LENGTH
+    cutoff = (
+        TimelineEntry.objects.filter(user_id=OuterRef("user_id"))
+        .order_by("-publish_date", "-post_id")
+        .values("publish_date")[limit - 1 : limit]
+    )
+    TimelineEntry.objects.filter(user_id__in=list(user_ids)).filter(
+        publish_date__lt=Subquery(cutoff)
+    ).delete()
+
+
+def add_author_to_timeline(user: User, author: User) -> None:
+    """
+    Добавляет в ленту пользователя последние посты автора после подписки.
+
+    args:
+        user (User): Подписчик.
+        author (User): Автор, на которого подписались.
+    """
+    if author.id in get_pull_author_ids():
+        return
+    posts = Post.objects.filter(author=author).order_by("-publish_date", "-id")
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user=user, post_id=post_id, publish_date=publish_date)
+            for post_id, publish_date in posts.values_list("id", "publish_date")[
+                : settings.TIMELINE_MAX_LENGTH
+            ]
+        ),
+        ignore_conflicts=True,
+    )
+    trim_timelines([user.id])
+
+
+def remove_author_from_timeline(user: User, author: User) -> None:
+    """
+    Удаляет посты автора из ленты пользователя после отписки.
+
+    args:
+        user (User): Бывший подписчик.
+        author (User): Автор, от которого отписались.
+    """
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def rebuild_timeline(user: User) -> int:
+    """
+    Перестраивает ленту пользователя по текущим подпискам.
+
+    args:
+        user (User): Пользователь.
+
+    return:
+        int: Количество записей в ленте после перестроения.
+    """
+    pull_authors = get_pull_author_ids()
+    posts = (
+        Post.objects.filter(author__subscribers__subscriber=user)
+        .exclude(author_id__in=pull_authors)
+        .order_by("-publish_date", "-id")
+        .values_list("id", "publish_date")[: settings.TIMELINE_MAX_LENGTH]
+    )
+    entries = [
+        TimelineEntry(user=user, post_id=post_id, publish_date=publish_date)
+        for post_id, publish_date in posts
+    ]
+    TimelineEntry.objects.filter(user=user).delete()
+    TimelineEntry.objects.bulk_create(entries, batch_size=FANOUT_BATCH_SIZE)
+    return len(entries)
+
+
+def get_timeline_posts(user: User) -> Union[QuerySet[Post], MergedQuerySet]:
+    """
+    Получает посты ленты подписок пользователя.
+
+    Посты читаются из материализованной ленты диапазоном по индексу
+    (user, publish_date, post). Если пользователь подписан на авторов с большим
+    числом подписчиков, их посты читаются отдельным запросом по индексу
+    (author, publish_date) и сливаются с лентой по ключу сортировки.
+    Дата, по которой сортируется лента, доступна в аннотации feed_date.
+
+    args:
+        user (User): Пользователь.
+
+    return:
+        Union[QuerySet[Post], MergedQuerySet]: Посты ленты.
+    """
+    timeline = Post.objects.filter(timeline_entries__user=user).annotate(
+        feed_date=F("timeline_entries__publish_date")
+    )
+    pull_authors = get_pull_author_ids()
+    if pull_authors:
+        pull_authors = list(
+            Subscription.objects.filter(
+                subscriber=user, author_id__in=pull_authors
+            ).values_list("author_id", flat=True)
+        )
+    if not pull_authors:
+        return timeline
+    # Записи ленты, оставшиеся с тех пор, когда посты автора раскладывались
+    # по лентам, исключаются, чтобы источники не пересекались.
+    return MergedQuerySet(
+        [
+            timeline.exclude(author_id__in=pull_authors),
+            Post.objects.filter(author_id__in=pull_authors).annotate(
+                feed_date=F("publish_date")
+            ),
+        ]
+    )
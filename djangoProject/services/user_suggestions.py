@@ -0,0 +1,224 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+
+from services.cache_tags import bump_tags, get_tag_versions
+
+USERNAMES_TAG = "usernames"
+NEW_USERNAMES_TAG = "usernames:new"
+
+MAX_GRAM = 3
+
+
+def _grams(text: str) -> Set[str]:
+    return {
+        text[start : start + size]
+        for size in range(1, MAX_GRAM + 1)
+        for start in range(len(text) - size + 1)
+    }
+
+
+class UsernameIndex:
+    """
+    Индекс имен пользователей для подсказок при вводе получателя.
+
+    Имена хранятся в отсортированном списке для поиска по префиксу бисекцией
+    и в словаре n-грамм длиной от 1 до 3 символов для поиска подстроки.
+    Регистр не учитывается.
+    """
+
+    def __init__(self, usernames: Iterable[str] = ()):
+        self._sorted: List[Tuple[str, str]] = []
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        self._lower: Dict[str, str] = {}
+        for username in usernames:
+            self.add(username)
+
+    def __len__(self) -> int:
+        return len(self._lower)
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._lower
+
+    def add(self, username: str) -> None:
+        """
+        Добавляет имя в индекс. Повторное добавление ничего не меняет.
+
+        args:
+            username (str): Имя пользователя.
+        """
+        if username in self._lower:
+            return
+        lower = username.lower()
+        self._lower[username] = lower
+        insort(self._sorted, (lower, username))
+        for gram in _grams(lower):
+            self._grams[gram].add(username)
+
+    def remove(self, username: str) -> None:
+        """
+        Удаляет имя из индекса.
+
+        args:
+            username (str): Имя пользователя.
+        """
+        lower = self._lower.pop(username, None)
+        if lower is None:
+            return
+        position = bisect_left(self._sorted, (lower, username))
+        del self._sorted[position]
+        for gram in _grams(lower):
+            self._grams[gram].discard(username)
+            if not self._grams[gram]:
+                del self._grams[gram]
+
+    def suggest(self, text: str, limit: int) -> List[str]:
+        """
+        Подбирает имена, содержащие введенный текст.
+
+        Сначала идут имена, начинающиеся с текста, в алфавитном порядке,
+        поэтому точное совпадение всегда первое. Оставшиеся места занимают
+        имена с текстом в середине: чем ближе совпадение к началу и короче
+        имя, тем выше.
+
+        args:
+            text (str): Введенный текст.
+            limit (int): Максимальное количество подсказок.
+
+        return:
+            List[str]: Имена пользователей.
+        """
+        text = text.lower()
+        if not text or limit <= 0:
+            return []
+
+        suggestions = []
+        position = bisect_left(self._sorted, (text,))
+        while len(suggestions) < limit and position < len(self._sorted):
+            lower, username = self._sorted[position]
+            if not lower.startswith(text):
+                break
+            suggestions.append(username)
+            position += 1
+        if len(suggestions) == limit:
+            return suggestions
+
+        matches = []
+        for username in self._candidates(text):
+            lower = self._lower[username]
+            offset = lower.find(text)
+            if offset > 0:
+                matches.append((offset, len(lower), lower, username))
+        suggestions += [
+            match[-1] for match in heapq.nsmallest(limit - len(suggestions), matches)
+        ]
+        return suggestions
+
+    def _candidates(self, text: str) -> Set[str]:
+        if len(text) <= MAX_GRAM:
+            return self._grams.get(text, set())
+        postings = []
+        for start in range(len(text) - MAX_GRAM + 1):
+            gram = self._grams.get(text[start : start + MAX_GRAM])
+            if not gram:
+                return set()
+            postings.append(gram)
+        postings.sort(key=len)
+        return postings[0].intersection(*postings[1:])
+
+
+class _IndexHolder:
+    """
+    Индекс процесса и версии тегов, с которыми он был загружен.
+
+    Новые пользователи догружаются по ID, больше последнего загруженного;
+    переименование или удаление пользователя перестраивает индекс целиком.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.index: Optional[UsernameIndex] = None
+        self.versions: Dict[str, int] = {}
+        self.max_id = 0
+
+    def get(self) -> UsernameIndex:
+        versions = get_tag_versions([USERNAMES_TAG, NEW_USERNAMES_TAG])
+        if self.index is not None and versions == self.versions:
+            return self.index
+        with self.lock:
+            if self.index is None or (
+                versions[USERNAMES_TAG] != self.versions.get(USERNAMES_TAG)
+            ):
+                self.index, self.max_id = UsernameIndex(), 0
+            self._load_new()
+            self.versions = versions
+            return self.index
+
+    def _load_new(self) -> None:
+        rows = (
+            User.objects.filter(pk__gt=self.max_id)
+            .order_by("pk")
+            .values_list("pk", "username")
+            .iterator(chunk_size=2000)
+        )
+        for pk, username in rows:
+            self.index.add(username)
+            self.max_id = pk
+
+
+_holder = _IndexHolder()
+
+
+def get_username_index() -> UsernameIndex:
+    """
+    Возвращает индекс имен пользователей текущего процесса.
+
+    Перед ответом сверяется версия индекса в кэше, поэтому пользователи,
+    созданные в других процессах, появляются в подсказках без перезапуска.
+    Если версия не изменилась, база данных не запрашивается.
+
+    return:
+        UsernameIndex: Актуальный индекс.
+    """
+    return _holder.get()
+
+
+def add_username(user: User) -> None:
+    """
+    Добавляет нового пользователя в индекс и сообщает о нем другим процессам.
+
+    args:
+        user (User): Созданный пользователь.
+    """
+    if _holder.index is not None:
+        _holder.index.add(user.username)
+    bump_tags([NEW_USERNAMES_TAG])
+
+
+def invalidate_usernames() -> None:
+    """
+    Помечает индексы всех процессов устаревшими после переименования
+    или удаления пользователя.
+    """
+    bump_tags([USERNAMES_TAG])
+
+
+def suggest_usernames(text: str, limit: Optional[int] = None) -> List[str]:
+    """
+    Подбирает имена пользователей по введенному тексту.
+
+    args:
+        text (str): Введенный текст.
+        limit (int, optional): Количество подсказок, по умолчанию USER_SUGGESTIONS_LIMIT.
+
+    return:
+        List[str]: Имена пользователей, начинающиеся с текста, затем содержащие его.
+    """
+    if limit is None:
+        limit = settings.USER_SUGGESTIONS_LIMIT
+    return get_username_index().suggest(text, limit)
@@ -0,0 +1,384 @@
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.http import Http404
+
+from blog.models import Post
+from services.cache_tags import POPULARITY_TAG, bump_tags, post_tag
+
+SEQUENCE_KEY = "wbuf:seq"
+FLUSHED_KEY = "wbuf:flushed"
+SNAPSHOT_KEY = "wbuf:snapshot"
+FLUSH_LOCK_KEY = "wbuf:flush:lock"
+
+LIKE_EVENT = "like"
+VIEW_EVENT = "view"
+
+
+def _cache():
+    return caches[settings.WRITE_BUFFER_CACHE]
+
+
+def _event_key(number: int) -> str:
+    return f"wbuf:event:{number}"
+
+
+def _like_state_key(post_id: int, user_id: int) -> str:
+    return f"wbuf:like:{post_id}:{user_id}"
+
+
+def _like_lock_key(post_id: int, user_id: int) -> str:
+    return f"wbuf:like:lock:{post_id}:{user_id}"
+
+
+def _like_delta_key(post_id: int) -> str:
+    return f"wbuf:likes:{post_id}"
+
+
+def _view_delta_key(post_id: int) -> str:
+    return f"wbuf:views:{post_id}"
+
+
+def _incr(key: str, delta: int = 1) -> int:
+    cache = _cache()
+    cache.add(key, 0, settings.WRITE_BUFFER_TTL)
+    return cache.incr(key, delta)
+
+
+def _acquire_like_lock(post_id: int, user_id: int, wait: bool = True) -> bool:
+    """
+    Захватывает блокировку лайка пользователя на пост.
+
+    Блокировка снимается сама через WRITE_BUFFER_LOCK_TIMEOUT секунд, поэтому
+    ожидание не зависает, если процесс, захвативший ее, завершился.
+    """
+    key = _like_lock_key(post_id, user_id)
+    while not _cache().add(key, 1, settings.WRITE_BUFFER_LOCK_TIMEOUT):
+        if not wait:
+            return False
+        time.sleep(settings.WRITE_BUFFER_LOCK_POLL_INTERVAL)
+    return True
+
+
+def _release_like_locks(pairs: Iterable[Tuple[int, int]]) -> None:
+    _cache().delete_many([_like_lock_key(*pair) for pair in pairs])
+
+
+def _append_event(event: Tuple) -> None:
+    """
+    Добавляет в журнал буфера ссылку на изменившийся объект.
+
+    Журнал хранит только ссылки, актуальные значения читаются при сбросе
+    из ключей состояния, поэтому повторные ссылки на один объект безопасны.
+    """
+    number = _incr(SEQUENCE_KEY)
+    _cache().set(_event_key(number), event, settings.WRITE_BUFFER_TTL)
+
+
+def is_write_buffer_enabled() -> bool:
+    """
+    Проверяет, включена ли буферизация лайков и просмотров.
+
+    return:
+        bool: Значение настройки WRITE_BUFFER_ENABLED.
+    """
+    return settings.WRITE_BUFFER_ENABLED
+
+
+def get_buffered_like_state(post_id: int, user_id: int) -> Optional[bool]:
+    """
+    Получает еще не сохраненное в базу состояние лайка пользователя.
+
+    args:
+        post_id (int): Идентификатор поста.
+        user_id (int): Идентификатор пользователя.
+
+    return:
+        Optional[bool]: Состояние лайка или None, если в буфере его нет.
+    """
+    return _cache().get(_like_state_key(post_id, user_id))
+
+
+def get_pending_like_delta(post_id: int) -> int:
+    """
+    Получает изменение количества лайков поста, ожидающее сброса в базу.
+
+    args:
+        post_id (int): Идентификатор поста.
+
+    return:
+        int: Разница между буферизованным и сохраненным количеством лайков.
+    """
+    return _cache().get(_like_delta_key(post_id), 0)
+
+
+def get_pending_view_delta(post_id: int) -> int:
+    """
+    Получает количество просмотров поста, ожидающих сброса в базу.
+
+    args:
+        post_id (int): Идентификатор поста.
+
+    return:
+        int: Количество несохраненных просмотров.
+    """
+    return _cache().get(_view_delta_key(post_id), 0)
+
+
+def buffer_like_toggle(post_id: int, user: User) -> Tuple[bool, int]:
+    """
+    Переключает лайк в буфере без записи в базу.
+
+    Текущее состояние берется из буфера, а если его там нет, из промежуточной
+    таблицы лайков. Чтение и запись состояния выполняются под блокировкой
+    пары (пост, пользователь), поэтому одновременные переключения
+    применяются по очереди. Новое состояние сразу видно пользователю через
+    get_buffered_like_state.
+
+    args:
+        post_id (int): Идентификатор поста.
+        user (User): Пользователь.
+
+    return:
+        Tuple[bool, int]: Новое состояние лайка и количество лайков с учетом буфера.
+
+    raises:
+        Http404: Если пост не найден.
+    """
+    like_count = Post.objects.filter(pk=post_id).values_list("like_count", flat=True)
+    if not like_count:
+        raise Http404("Пост не найден")
+
+    _acquire_like_lock(post_id, user.pk)
+    try:
+        liked = get_buffered_like_state(post_id, user.pk)
+        if liked is None:
+            liked = Post.likes.through.objects.filter(
+                post_id=post_id, user_id=user.pk
+            ).exists()
+        liked = not liked
+
+        _cache().set(
+            _like_state_key(post_id, user.pk), liked, settings.WRITE_BUFFER_TTL
+        )
+        delta = _incr(_like_delta_key(post_id), 1 if liked else -1)
+        _append_event((LIKE_EVENT, post_id, user.pk))
+    finally:
+        _release_like_locks([(post_id, user.pk)])
+    return liked, like_count[0] + delta
+
+
+def buffer_post_view(post_id: int) -> None:
+    """
+    Учитывает просмотр поста в буфере.
+
+    Ссылка на пост добавляется в журнал только при первом несохраненном
+    просмотре, поэтому журнал растет с числом постов, а не просмотров.
+
+    args:
+        post_id (int): Идентификатор поста.
+    """
+    if _incr(_view_delta_key(post_id)) == 1:
+        _append_event((VIEW_EVENT, post_id))
+
+
+def flush_write_buffer(batch_size: int = 1000) -> Dict[str, int]:
+    """
+    Сбрасывает накопленные лайки и просмотры в базу пачками.
+
+    Лайки вставляются через bulk_create и удаляются одним DELETE на пачку,
+    счетчики постов обновляются одним UPDATE ... CASE. Ссылки журнала,
+    которые еще не успели записаться, ждут следующего сброса; если их нет
+    и при следующем сбросе, они пропускаются. Одновременно выполняется
+    только один сброс, остальные сразу возвращают нулевую статистику.
+
+    args:
+        batch_size (int, optional): Количество ссылок журнала в одной пачке.
+
+    return:
+        Dict[str, int]: Количество обработанных ссылок, лайков и постов
+        с просмотрами.
+    """
+    cache = _cache()
+    if not cache.add(FLUSH_LOCK_KEY, 1, settings.WRITE_BUFFER_FLUSH_LOCK_TIMEOUT):
+        return {"events": 0, "likes": 0, "views": 0}
+    try:
+        return _flush(batch_size)
+    finally:
+        cache.delete(FLUSH_LOCK_KEY)
+
+
+def _flush(batch_size: int) -> Dict[str, int]:
+    cache = _cache()
+    flushed = cache.get(FLUSHED_KEY, 0)
+    current = cache.get(SEQUENCE_KEY, 0)
+    previous_snapshot = cache.get(SNAPSHOT_KEY, 0)
+    stats = {"events": 0, "likes": 0, "views": 0}
+
+    number = flushed + 1
+    while number <= current:
+        numbers = range(number, min(number + batch_size, current + 1))
+        keys = [_event_key(n) for n in numbers]
+        found = cache.get_many(keys)
+
+        processed, events = [], []
+        for n, key in zip(numbers, keys):
+            if key not in found and n > previous_snapshot:
+                break
+            processed.append(key)
+            if key in found:
+                events.append(found[key])
+
+        like_pairs = {(e[1], e[2]) for e in events if e[0] == LIKE_EVENT}
+        view_posts = {e[1] for e in events if e[0] == VIEW_EVENT}
+        stats["likes"] += _flush_likes(like_pairs)
+        stats["views"] += _flush_views(view_posts)
+        stats["events"] += len(events)
+
+        number += len(processed)
+        cache.delete_many(processed)
+        cache.set(FLUSHED_KEY, number - 1, None)
+        if len(processed) < len(keys):
+            break
+
+    cache.set(SNAPSHOT_KEY, current, None)
+    return stats
+
+
+def _flush_likes(pairs: Iterable[Tuple[int, int]]) -> int:
+    """
+    Записывает в базу состояния лайков и удаляет их из буфера.
+
+    Пары, чью блокировку держит переключение лайка, снова ставятся в журнал
+    и ждут следующего сброса.
+    """
+    locked = []
+    for pair in pairs:
+        if _acquire_like_lock(*pair, wait=False):
+            locked.append(pair)
+        else:
+            _append_event((LIKE_EVENT, *pair))
+    try:
+        return _write_likes(locked)
+    finally:
+        _release_like_locks(locked)
+
+
+def _write_likes(pairs: List[Tuple[int, int]]) -> int:
+    cache = _cache()
+    states = cache.get_many([_like_state_key(*pair) for pair in pairs])
+    desired = {
+        pair: states[_like_state_key(*pair)]
+        for pair in pairs
+        if _like_state_key(*pair) in states
+    }
+    if not desired:
+        return 0
+
+    likes = Post.likes.through.objects
+    condition = Q()
+    for post_id, user_id in desired:
+        condition |= Q(post_id=post_id, user_id=user_id)
+    existing = set(likes.filter(condition).values_list("post_id", "user_id"))
+
+    to_add = [pair for pair, liked in desired.items() if liked and pair not in existing]
+    to_remove = [
+        pair for pair, liked in desired.items() if not liked and pair in existing
+    ]
+    deltas = defaultdict(int)
+    for post_id, _ in to_add:
+        deltas[post_id] += 1
+    for post_id, _ in to_remove:
+        deltas[post_id] -= 1
+
+    with transaction.atomic():
+        likes.bulk_create(
+            [
+                likes.model(post_id=post_id, user_id=user_id)
+                for post_id, user_id in to_add
+            ],
+            ignore_conflicts=True,
+        )
+        if to_remove:
+            condition = Q()
+            for post_id, user_id in to_remove:
+                condition |= Q(post_id=post_id, user_id=user_id)
+            likes.filter(condition).delete()
+        _apply_deltas("like_count", deltas)
+    changed = [post_tag(post_id) for post_id, delta in deltas.items() if delta]
+    if changed:
+        bump_tags(changed + [POPULARITY_TAG])
+
+    # Отложенная разница уменьшается только после записи в базу, как
+    # и в _flush_views: при ошибке базы она остается в буфере
+    for post_id, delta in deltas.items():
+        if delta:
+            _incr(_like_delta_key(post_id), -delta)
+    # Состояние сохранено в базе, дальше оно читается из промежуточной таблицы
+    cache.delete_many([_like_state_key(*pair) for pair in desired])
+    return len(to_add) + len(to_remove)
+
+
+def _flush_views(post_ids: Iterable[int]) -> int:
+    """
+    Записывает в базу накопленные просмотры постов.
+
+    Как и в _write_likes, счетчик в буфере уменьшается на записанное
+    количество только после UPDATE, поэтому при ошибке базы просмотры
+    остаются в буфере и ссылки журнала ждут следующего сброса. Пока
+    счетчик не уменьшен, читатели кратко видят эти просмотры дважды.
+    """
+    cache = _cache()
+    deltas = {}
+    for post_id in post_ids:
+        pending = cache.get(_view_delta_key(post_id), 0)
+        if pending:
+            deltas[post_id] = pending
+    _apply_deltas("view_count", deltas)
+    for post_id, pending in deltas.items():
+        if cache.decr(_view_delta_key(post_id), pending) > 0:
+            _append_event((VIEW_EVENT, post_id))
+    return len(deltas)
+
+
+def _apply_deltas(field: str, deltas: Dict[int, int]) -> None:
+    """
+    Изменяет счетчик у нескольких постов одним UPDATE ... CASE.
+    """
+    deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    Post.objects.filter(pk__in=deltas.keys()).update(
+        **{
+            field: F(field)
+            + Case(
+                *(
+                    When(pk=post_id, then=Value(delta))
+                    for post_id, delta in deltas.items()
+                ),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        }
+    )
+
+
+def get_like_states(post_ids: List[int], user_id: int) -> Dict[int, bool]:
+    """
+    Получает буферизованные состояния лайков пользователя для нескольких постов.
+
+    args:
+        post_ids (List[int]): Идентификаторы постов.
+        user_id (int): Идентификатор пользователя.
+
+    return:
+        Dict[int, bool]: Состояния лайков по ID поста, только для постов в буфере.
+    """
+    keys = {_like_state_key(post_id, user_id): post_id for post_id in post_ids}
+    return {keys[key]: value for key, value in _cache().get_many(keys).items()}
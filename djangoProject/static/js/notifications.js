@@ -9,7 +9,7 @@ function deleteNotification(notificationId) {
         })
             .then(response => {
                 if (response.ok) {
-                    location.reload();
+                    applyNotificationEvent({event: 'deleted', id: notificationId, unread_count: null});
                 } else {
                     console.error('Failed to delete notification');
                 }
@@ -28,7 +28,7 @@ function markAsViewed(notificationId) {
     })
         .then(response => {
             if (response.ok) {
-                location.reload();
+                applyNotificationEvent({event: 'viewed', id: notificationId, unread_count: null});
             } else {
                 console.error('Failed to mark notification as viewed');
             }
@@ -47,7 +47,7 @@ function deleteAllNotifications(event) {
             .then(response => {
                 if (response.ok) {
                     alert('Все уведомления успешно удалены.');
-                    location.reload();
+                    applyNotificationEvent({event: 'deleted', id: null, unread_count: 0});
                 } else {
                     console.error('Failed to delete all notifications');
                 }
@@ -61,6 +61,7 @@ function deleteAllNotifications(event) {
 
 
 function markAllAsViewed(event) {
+    event.preventDefault();
     if (confirm("Вы уверены, что хотите просмотреть все уведомления?")) {
         fetch('/mark_all_as_viewed/', {
             method: 'POST',
@@ -72,14 +73,13 @@ function markAllAsViewed(event) {
             .then(response => {
                 if (response.ok) {
                     alert('Все уведомления отмечены как просмотренные.');
-                    location.reload();
+                    applyNotificationEvent({event: 'viewed', id: null, unread_count: 0});
                 } else {
                     console.error('Failed to mark all notifications as viewed');
                 }
             })
             .catch(error => console.error('Error:', error));
     } else {
-        event.preventDefault();
         console.log('Отменено просмотр всех уведомлений.');
     }
 }
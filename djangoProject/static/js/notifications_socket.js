@@ -0,0 +1,133 @@
+(function () {
+    const badge = document.getElementById('notifications-badge');
+    let retryDelay = 1000;
+
+    function setBadge(count) {
+        if (!badge) {
+            return;
+        }
+        count = Math.max(count, 0);
+        badge.textContent = count;
+        badge.classList.toggle('d-none', count === 0);
+    }
+
+    function changeBadge(delta) {
+        if (badge) {
+            setBadge((parseInt(badge.textContent, 10) || 0) + delta);
+        }
+    }
+
+    function rowsFor(id) {
+        const list = document.getElementById('notifications-list');
+        if (!list) {
+            return [];
+        }
+        const selector = id === null ? 'tr' : `tr[data-notification-id="${id}"]`;
+        return Array.from(list.querySelectorAll(selector));
+    }
+
+    function buildRow(notification) {
+        const row = document.createElement('tr');
+        if (notification.id !== null) {
+            row.dataset.notificationId = notification.id;
+        }
+        const type = document.createElement('strong');
+        type.textContent = notification.type_display;
+        const sender = document.createElement('a');
+        sender.href = `/profile/${encodeURIComponent(notification.sender_name)}/`;
+        sender.textContent = notification.sender_name;
+        const cells = [type, null, sender, new Date(notification.timestamp).toLocaleString(), null];
+        cells.forEach((content, index) => {
+            const cell = row.insertCell();
+            if (index === 1) {
+                cell.innerHTML = notification.html;
+                if (notification.count > 1) {
+                    const summary = document.createElement('div');
+                    summary.className = 'text-muted small';
+                    summary.textContent =
+                        `Событий: ${notification.count}, последние от ${notification.actors.join(', ')}`;
+                    cell.appendChild(summary);
+                }
+            } else if (index === 4) {
+                if (notification.id !== null) {
+                    cell.innerHTML =
+                        `<button type="button" class="btn btn-primary" onclick="markAsViewed(${notification.id})">Просмотреть</button> ` +
+                        `<button type="button" class="btn btn-danger" onclick="deleteNotification(${notification.id})">Удалить</button>`;
+                }
+            } else if (typeof content === 'string') {
+                cell.textContent = content;
+            } else {
+                cell.appendChild(content);
+            }
+        });
+        return row;
+    }
+
+    function markRowViewed(row) {
+        if (row.classList.contains('text-success')) {
+            return false;
+        }
+        row.classList.add('text-success');
+        const button = row.querySelector('.btn-primary');
+        if (button) {
+            const label = document.createElement('span');
+            label.className = 'text-success';
+            label.textContent = 'Просмотрено';
+            button.replaceWith(label);
+        }
+        return true;
+    }
+
+    // Применяет событие к счетчику и списку уведомлений. Повторное применение
+    // того же события ничего не меняет, поэтому событие от сервера после
+    // локального действия не сдвигает счетчик второй раз.
+    window.applyNotificationEvent = function (event) {
+        let changed = 0;
+        if (event.event === 'created') {
+            const list = document.getElementById('notifications-list');
+            if (list) {
+                // Объединенное уведомление переносится наверх с новым счетчиком
+                if (event.notification.id !== null) {
+                    rowsFor(event.notification.id).forEach(row => row.remove());
+                }
+                list.prepend(buildRow(event.notification));
+            }
+            changed = event.aggregated ? 0 : 1;
+        } else if (event.event === 'viewed') {
+            rowsFor(event.id).forEach(row => {
+                if (markRowViewed(row)) {
+                    changed -= 1;
+                }
+            });
+        } else if (event.event === 'deleted') {
+            rowsFor(event.id).forEach(row => {
+                if (!row.classList.contains('text-success')) {
+                    changed -= 1;
+                }
+                row.remove();
+            });
+        }
+        if (event.unread_count !== null && event.unread_count !== undefined) {
+            setBadge(event.unread_count);
+        } else {
+            changeBadge(changed);
+        }
+    };
+
+    function connect() {
+        const scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+        const socket = new WebSocket(scheme + window.location.host + '/ws/notifications/');
+        socket.onopen = function () {
+            retryDelay = 1000;
+        };
+        socket.onmessage = function (message) {
+            window.applyNotificationEvent(JSON.parse(message.data));
+        };
+        socket.onclose = function () {
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 60000);
+        };
+    }
+
+    connect();
+})();
@@ -17,6 +17,12 @@ class Subscription(models.Model):
         verbose_name = "Подписка"
         verbose_name_plural = "Подписки"
         unique_together = ("subscriber", "author")
+        indexes = [
+            models.Index(
+                fields=["author", "subscriber"],
+                name="subscription_author_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.subscriber} подписан на {self.author}"
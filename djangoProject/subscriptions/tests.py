@@ -38,6 +38,12 @@ class SubscriptionServicesTestCase(TestCase):
             Notification.objects.filter(user=self.user2, sender=self.user1).exists()
         )
 
+    def test_repeated_subscribe_does_not_inflate_notification(self):
+        subscribe_user_to_author(self.user1, self.user2.id)
+        subscribe_user_to_author(self.user1, self.user2.id)
+        notification = Notification.objects.get(user=self.user2)
+        self.assertEqual(notification.count, 1)
+
     def test_unsubscribe_user_from_author(self):
         Subscription.objects.create(subscriber=self.user1, author=self.user2)
         response = unsubscribe_user_from_author(self.user1, self.user2.id)